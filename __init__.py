@@ -22,7 +22,9 @@ import bpy
 from . import import_lxo
 from bpy.props import (
     StringProperty,
-    BoolProperty
+    BoolProperty,
+    IntProperty,
+    CollectionProperty
     )
 from bpy_extras.io_utils import (
     orientation_helper
@@ -53,21 +55,8 @@ if "bpy" in locals():
         importlib.reload(import_lxo)
 
 
-@orientation_helper(axis_forward='-Z', axis_up='Y')
-class IMPORT_OT_lxo(bpy.types.Operator):
-    """Import LXO Operator"""
-
-    bl_idname = "import_scene.lxo"
-    bl_label = "Import LXO"
-    bl_description = "Import a Modo Object file"
-    bl_options = {"REGISTER", "UNDO"}
-
-    filepath: StringProperty(
-        name="File Path",
-        description="Filepath used for importing the LXO file",
-        maxlen=1024,
-        default="",
-    )
+class ImportLXOOptions:
+    """Import options shared by the LXO import operators"""
 
     ADD_SUBD_MOD: BoolProperty(
         name="Apply SubD Modifier",
@@ -90,17 +79,107 @@ class IMPORT_OT_lxo(bpy.types.Operator):
         description="Import to empty scene",
         default=False,
     )
+    SHARE_MESHES: BoolProperty(
+        name="Share Identical Meshes",
+        description=("Import layers with identical geometry as linked "
+                     "duplicates of one mesh"),
+        default=True,
+    )
+    PROXY: BoolProperty(
+        name="Bounding Box Proxies",
+        description=("Import meshes as bounding boxes, load the full "
+                     "geometry later with Load LXO Proxies"),
+        default=False,
+    )
+    LOW_MEMORY: BoolProperty(
+        name="Low Memory",
+        description=("Build each mesh right after reading it and free its "
+                     "data, instead of reading the whole file first"),
+        default=False,
+    )
+    MEMORY_BUDGET: IntProperty(
+        name="Memory Budget (MB)",
+        description=("Low Memory: read following meshes ahead while their "
+                     "data fits into this budget, 0 disables read-ahead"),
+        default=0,
+        min=0,
+    )
+    LOAD_ANIMATION: BoolProperty(
+        name="Load Animation",
+        description="Import the keyframes of item transforms as F-curves",
+        default=True,
+    )
+    WRITE_PROFILE: BoolProperty(
+        name="Write Import Profile",
+        description=("Write the import phase timings to a JSON file next "
+                     "to the LXO file"),
+        default=False,
+    )
+    WRITE_TRACE: BoolProperty(
+        name="Write Trace",
+        description=("Write the parse and build events to a Chrome trace "
+                     "JSON file next to the LXO file, for ui.perfetto.dev"),
+        default=False,
+    )
+    ITEM_INCLUDE: StringProperty(
+        name="Include Items",
+        description=("Comma separated name patterns of the items to import, "
+                     "type:<typename> matches item types, root:<name> whole "
+                     "branches of the item tree. Empty imports everything"),
+        default="",
+    )
+    ITEM_EXCLUDE: StringProperty(
+        name="Exclude Items",
+        description="Comma separated patterns of items to leave out",
+        default="",
+    )
     # SKEL_TO_ARM: BoolProperty(
     #     name="Create Armature",
     #     description="Create an armature from an embedded Skelegon rig",
     #     default=True,
     # )
-    # USE_EXISTING_MATERIALS: BoolProperty(
-    #     name="Use Existing Materials",
-    #     description=("Use existing materials if a material by that "
-    #                  "name already exists"),
-    #     default=False,
-    # )
+    USE_EXISTING_MATERIALS: BoolProperty(
+        name="Use Existing Materials",
+        description=("Use existing materials if a material with the same "
+                     "settings or by that name already exists"),
+        default=False,
+    )
+
+    def import_options(self):
+        # keywords = self.as_keywords(ignore=("filepath"))
+        return dict(axis_forward=self.axis_forward,
+                    axis_up=self.axis_up,
+                    ADD_SUBD_MOD=self.ADD_SUBD_MOD,
+                    LOAD_MATERIALS=self.LOAD_MATERIALS,
+                    LOAD_HIDDEN=self.LOAD_HIDDEN,
+                    LOAD_ANIMATION=self.LOAD_ANIMATION,
+                    CLEAN_IMPORT=self.CLEAN_IMPORT,
+                    USE_EXISTING_MATERIALS=self.USE_EXISTING_MATERIALS,
+                    SHARE_MESHES=self.SHARE_MESHES,
+                    WRITE_PROFILE=self.WRITE_PROFILE,
+                    WRITE_TRACE=self.WRITE_TRACE,
+                    PROXY=self.PROXY,
+                    LOW_MEMORY=self.LOW_MEMORY,
+                    MEMORY_BUDGET=self.MEMORY_BUDGET,
+                    ITEM_INCLUDE=self.ITEM_INCLUDE,
+                    ITEM_EXCLUDE=self.ITEM_EXCLUDE)
+
+
+@orientation_helper(axis_forward='-Z', axis_up='Y')
+class IMPORT_OT_lxo(ImportLXOOptions, bpy.types.Operator):
+    """Import LXO Operator"""
+
+    bl_idname = "import_scene.lxo"
+    bl_label = "Import LXO"
+    bl_description = "Import a Modo Object file"
+    bl_options = {"REGISTER", "UNDO"}
+
+    filepath: StringProperty(
+        name="File Path",
+        description="Filepath used for importing the LXO file",
+        maxlen=1024,
+        default="",
+    )
 
     def invoke(self, context, event):  # gui: no cover
         wm = context.window_manager
@@ -108,20 +187,118 @@ class IMPORT_OT_lxo(bpy.types.Operator):
         return {"RUNNING_MODAL"}
 
     def execute(self, context):
-        # keywords = self.as_keywords(ignore=("filepath"))
-        # return import_lxo.load(self, context, filepath=self.filepath,
-        # **keywords)
         return import_lxo.load(self, context, filepath=self.filepath,
-                               axis_forward=self.axis_forward,
-                               axis_up=self.axis_up,
-                               ADD_SUBD_MOD=self.ADD_SUBD_MOD,
-                               LOAD_MATERIALS=self.LOAD_MATERIALS,
-                               LOAD_HIDDEN=self.LOAD_HIDDEN,
-                               CLEAN_IMPORT=self.CLEAN_IMPORT)
+                               **self.import_options())
+
+
+@orientation_helper(axis_forward='-Z', axis_up='Y')
+class IMPORT_OT_lxo_batch(ImportLXOOptions, bpy.types.Operator):
+    """Import many LXO files, parsed in parallel, one collection per file"""
+
+    bl_idname = "import_scene.lxo_batch"
+    bl_label = "Import LXO Batch"
+    bl_description = "Import several Modo Object files"
+    bl_options = {"REGISTER", "UNDO"}
+
+    files: CollectionProperty(
+        name="File Path",
+        type=bpy.types.OperatorFileListElement,
+    )
+    directory: StringProperty(
+        subtype='DIR_PATH',
+    )
+    filter_glob: StringProperty(
+        default="*.lxo",
+        options={'HIDDEN'},
+    )
+    WORKERS: IntProperty(
+        name="Workers",
+        description=("Number of processes parsing files, 0 parses in "
+                     "Blender itself, -1 uses all cores"),
+        default=-1,
+        min=-1,
+    )
+
+    def invoke(self, context, event):  # gui: no cover
+        wm = context.window_manager
+        wm.fileselect_add(self)
+        return {"RUNNING_MODAL"}
+
+    def execute(self, context):
+        filepaths = [os.path.join(self.directory, file.name)
+                     for file in self.files if file.name]
+        if not filepaths:
+            self.report({'ERROR'}, "No files selected")
+            return {"CANCELLED"}
+        workers = None if self.WORKERS == -1 else self.WORKERS
+        return import_lxo.load_many(self, context, filepaths,
+                                    workers=workers,
+                                    **self.import_options())
+
+
+class OBJECT_OT_lxo_load_proxies(bpy.types.Operator):
+    """Replace the selected LXO proxies by their full geometry"""
+
+    bl_idname = "object.lxo_load_proxies"
+    bl_label = "Load LXO Proxies"
+    bl_description = "Load the full mesh of the selected LXO proxies"
+    bl_options = {"REGISTER", "UNDO"}
+
+    ADD_SUBD_MOD: BoolProperty(
+        name="Apply SubD Modifier",
+        description=("Apply the Subdivision Surface modifier to layers with "
+                     "Subpatches"),
+        default=True,
+    )
+    LOAD_MATERIALS: BoolProperty(
+        name="Load materials",
+        description=("Load materials from the LXO file"),
+        default=True,
+    )
+
+    def execute(self, context):
+        return import_lxo.load_proxies(self, context, context.selected_objects,
+                                       LOAD_MATERIALS=self.LOAD_MATERIALS,
+                                       ADD_SUBD_MOD=self.ADD_SUBD_MOD)
+
+
+@orientation_helper(axis_forward='-Z', axis_up='Y')
+class OBJECT_OT_lxo_reimport(ImportLXOOptions, bpy.types.Operator):
+    """Update the LXO files of the selected objects, only changed layers are rebuilt"""
+
+    bl_idname = "object.lxo_reimport"
+    bl_label = "Reimport LXO"
+    bl_description = ("Import the LXO files of the selected objects again, "
+                      "rebuilding only what changed")
+    bl_options = {"REGISTER", "UNDO"}
+
+    WATCH: BoolProperty(
+        name="Watch Files",
+        description="Keep reimporting the files whenever they are saved",
+        default=False,
+    )
+
+    def execute(self, context):
+        filepaths = {ob["lxo_file"] for ob in context.selected_objects
+                     if "lxo_file" in ob}
+        if not filepaths:
+            self.report({'ERROR'}, "No objects imported from LXO files selected")
+            return {"CANCELLED"}
+        options = self.import_options()
+        for filepath in sorted(filepaths):
+            if not os.path.exists(filepath):
+                self.report({'WARNING'}, f"{filepath} not found")
+                continue
+            import_lxo.reimport(self, context, filepath, **options)
+            if self.WATCH:
+                import_lxo.watch(filepath, **options)
+        return {"FINISHED"}
 
 
 def menu_func(self, context):  # gui: no cover
     self.layout.operator(IMPORT_OT_lxo.bl_idname, text="Modo Object (.lxo)")
+    self.layout.operator(IMPORT_OT_lxo_batch.bl_idname,
+                         text="Modo Objects, Batch (.lxo)")
 
 
 # Panel
@@ -148,14 +325,23 @@ class IMPORT_PT_Debug(bpy.types.Panel):
 
 classes = (
     IMPORT_OT_lxo,
+    IMPORT_OT_lxo_batch,
+    OBJECT_OT_lxo_load_proxies,
+    OBJECT_OT_lxo_reimport,
 )
 
 
+def object_menu_func(self, context):  # gui: no cover
+    self.layout.operator(OBJECT_OT_lxo_load_proxies.bl_idname)
+    self.layout.operator(OBJECT_OT_lxo_reimport.bl_idname)
+
+
 def register():
     for cls in classes:
         bpy.utils.register_class(cls)
 
     bpy.types.TOPBAR_MT_file_import.append(menu_func)
+    bpy.types.VIEW3D_MT_object.append(object_menu_func)
 
 
 def unregister():  # pragma: no cover
@@ -163,6 +349,10 @@ def unregister():  # pragma: no cover
         bpy.utils.unregister_class(cls)
 
     bpy.types.TOPBAR_MT_file_import.remove(menu_func)
+    bpy.types.VIEW3D_MT_object.remove(object_menu_func)
+    # drop the reader caches and file watches with the add-on
+    import_lxo.READER = None
+    import_lxo.unwatch()
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -16,19 +16,105 @@
 #
 # ##### END GPL LICENSE BLOCK #####
 
+import os
+import time
 import bpy
 
 # When bpy is already in local, we know this is not the initial import...
 if "bpy" in locals():
     import importlib
+    import sys
     # ...so we need to reload our submodule(s) using importlib
     if "lxo_reader" in locals():
         importlib.reload(lxo_reader)
+    # imported on first use, see build_mesh
+    if __package__ + ".lxo_validate" in sys.modules:
+        importlib.reload(sys.modules[__package__ + ".lxo_validate"])
 
 from . import lxo_reader
-from mathutils import Matrix, Euler
+from mathutils import Matrix
 from math import sqrt
+from array import array
+from itertools import chain
+import hashlib
 import json
+from contextlib import contextmanager
+
+# reader shared by all imports, keeps its caches between operator runs
+READER = None
+
+
+def reader_session() -> lxo_reader.LXOReader:
+    """The LXOReader of this add-on session, created on first use."""
+    global READER
+    if READER is None:
+        READER = lxo_reader.LXOReader()
+    return READER
+
+
+class ImportProfile(object):
+    """Time and element counts of the import phases.
+
+    Phases are summed over the whole import, per layer and per item type
+    timings are kept as well to find the heavy ones. A tracer gets every
+    phase as span and the built objects, see lxo_reader.Tracer.
+    """
+
+    def __init__(self, filepath="", tracer: lxo_reader.Tracer = None):
+        self.filepath = filepath
+        self.tracer = tracer
+        self.phases: dict[str, list] = {}  # name: [seconds, calls, elements]
+        self.layers: dict[str, dict[str, float]] = {}
+
+    @contextmanager
+    def phase(self, name, elements=0, layer=None):
+        if self.tracer is not None:
+            self.tracer.begin(name, 'import', {'elements': elements,
+                                               'layer': layer and layer.name})
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, elements, layer)
+            if self.tracer is not None:
+                self.tracer.end(name, 'import')
+
+    def add(self, name, seconds, elements=0, layer=None):
+        totals = self.phases.setdefault(name, [0.0, 0, 0])
+        totals[0] += seconds
+        totals[1] += 1
+        totals[2] += elements
+        if layer is not None:
+            layer_key = f"{layer.name} ({layer.reference_id})"
+            layer_phases = self.layers.setdefault(layer_key, {})
+            layer_phases[name] = layer_phases.get(name, 0.0) + seconds
+
+    @property
+    def total(self):
+        return sum(totals[0] for totals in self.phases.values())
+
+    def summary(self, count=5) -> str:
+        """One line with the total and the slowest phases."""
+        slowest = sorted(self.phases.items(), key=lambda item: -item[1][0])
+        phases = ", ".join(f"{name} {seconds:.2f}s ({elements})"
+                           for name, (seconds, _, elements) in slowest[:count])
+        return f"Imported {os.path.basename(self.filepath)} in {self.total:.2f}s: {phases}"
+
+    def as_dict(self):
+        return {
+            "file": self.filepath,
+            "total": self.total,
+            "phases": {name: {"seconds": seconds, "calls": calls, "elements": elements}
+                       for name, (seconds, calls, elements) in self.phases.items()},
+            "layers": self.layers,
+        }
+
+    def write_json(self, filepath=None):
+        if filepath is None:
+            filepath = self.filepath + ".profile.json"
+        with open(filepath, 'w') as profile_file:
+            json.dump(self.as_dict(), profile_file, indent=2)
+        return filepath
 
 
 def create_light(lxo_item: lxo_reader.LXOItem, item_name: str, light_materials: dict[str, lxo_reader.LXOItem]):
@@ -149,40 +235,753 @@ def create_normals(lxo_layer: lxo_reader.LXOLayer, mesh: bpy.types.Mesh):
         for vert_index, normal in vertex_normals_disco[poly_index].items():
             for loop_index in mesh.polygons[poly_index].loop_indices:
                 if vert_index == mesh.loops[loop_index].vertex_index:
-                    print(vert_index, loop_index, normal)
                     normals[loop_index] = normal
 
     mesh.normals_split_custom_set(normals)
 
 
-def shade_smooth():
-    # Cache the current selection
-    current_selection = bpy.context.selected_objects
+def map_rows(vmap: lxo_reader.VertexMap, count: int):
+    # point indices and values (one row per index) of a vertex map as NumPy
+    # arrays, without the entries of points past count
+    import numpy as np
+
+    indices = np.frombuffer(vmap.indices, np.int32)
+    rows = np.frombuffer(vmap.values, np.float32).reshape(-1, vmap.dimension)
+    valid = (indices >= 0) & (indices < count)
+    if not valid.all():
+        return indices[valid], rows[valid], valid
+    return indices, rows, valid
+
+
+def corner_loops(mesh: bpy.types.Mesh, poly_indices, vert_indices):
+    """Loop of each (polygon, point) pair, -1 where the polygon has no such corner."""
+    import numpy as np
+
+    loop_count = len(mesh.loops)
+    loop_vertices = np.empty(loop_count, np.int32)
+    mesh.loops.foreach_get('vertex_index', loop_vertices)
+    starts = np.empty(len(mesh.polygons), np.int32)
+    totals = np.empty(len(mesh.polygons), np.int32)
+    mesh.polygons.foreach_get('loop_start', starts)
+    mesh.polygons.foreach_get('loop_total', totals)
+    # polygon of every loop, the loops of a polygon follow its loop_start
+    loop_polygons = np.empty(loop_count, np.int64)
+    firsts = np.cumsum(totals) - totals
+    loop_polygons[np.repeat(starts - firsts, totals) + np.arange(loop_count)] = \
+        np.repeat(np.arange(len(totals)), totals)
+
+    point_count = max(len(mesh.vertices), 1)
+    loop_keys = loop_polygons * point_count + loop_vertices
+    order = np.argsort(loop_keys, kind='stable')
+    sorted_keys = loop_keys[order]
+    keys = np.asarray(poly_indices, np.int64) * point_count + vert_indices
+    found = np.searchsorted(sorted_keys, keys)
+    found = np.minimum(found, max(loop_count - 1, 0))
+    loops = np.full(len(keys), -1, np.int64)
+    if loop_count:
+        match = sorted_keys[found] == keys
+        loops[match] = order[found[match]]
+    return loops, loop_vertices
+
+
+def create_color_attributes(lxo_layer: lxo_reader.LXOLayer, mesh: bpy.types.Mesh):
+    # RGB and RGBA maps as point colors, corner colors if there is a VMAD
+    # of the same name. Points without a value stay white.
+    import numpy as np
+
+    vertex_count = len(mesh.vertices)
+    for map_type in ('RGBA', 'RGB '):
+        for name, vmap in sorted(lxo_layer.vmaps.get(map_type, {}).items()):
+            colors = np.ones((vertex_count, 4), np.float32)
+            indices, rows, _ = map_rows(vmap, vertex_count)
+            width = min(vmap.dimension, 4)
+            colors[indices, :width] = rows[:, :width]
+            disco = lxo_layer.vmads.get(map_type, {}).get(name)
+            if disco is None:
+                attr = mesh.color_attributes.new(name, 'FLOAT_COLOR', 'POINT')
+                attr.data.foreach_set('color', colors.ravel())
+                continue
+            indices, rows, valid = map_rows(disco, vertex_count)
+            poly_indices = np.frombuffer(disco.poly_indices, np.int32)[valid]
+            loops, loop_vertices = corner_loops(mesh, poly_indices, indices)
+            corners = colors[loop_vertices]
+            found = loops >= 0
+            width = min(disco.dimension, 4)
+            corners[loops[found], :width] = rows[found, :width]
+            attr = mesh.color_attributes.new(name, 'FLOAT_COLOR', 'CORNER')
+            attr.data.foreach_set('color', corners.ravel())
+
+
+def create_vertex_groups(lxo_layer: lxo_reader.LXOLayer, ob: bpy.types.Object):
+    # weight maps and point selections (PICK). Blender adds one weight to
+    # many points per call, so the points are grouped by their exact weight,
+    # weight maps usually hold only a few distinct values.
+    import numpy as np
+
+    names = []
+    vertex_count = len(ob.data.vertices)
+    for map_type in ('WGHT', 'PICK'):
+        for name, vmap in sorted(lxo_layer.vmaps.get(map_type, {}).items()):
+            group = ob.vertex_groups.new(name=name)
+            names.append(group.name)
+            indices, rows, _ = map_rows(vmap, vertex_count)
+            if map_type == 'PICK':
+                group.add(indices.tolist(), 1.0, 'REPLACE')
+                continue
+            order = np.argsort(rows[:, 0], kind='stable')
+            weights, starts = np.unique(rows[order, 0], return_index=True)
+            for weight, weight_indices in zip(weights.tolist(),
+                                              np.split(indices[order], starts[1:])):
+                group.add(weight_indices.tolist(), weight, 'REPLACE')
+    return names
+
+
+def create_shape_keys(lxo_layer: lxo_reader.LXOLayer, ob: bpy.types.Object):
+    # relative (MORF) and absolute (SPOT) morphs, z flipped like the points
+    import numpy as np
+
+    morphs = [vmap for map_type in ('MORF', 'SPOT')
+              for _, vmap in sorted(lxo_layer.vmaps.get(map_type, {}).items())]
+    if not morphs:
+        return
+    mesh = ob.data
+    basis = np.empty((len(mesh.vertices), 3), np.float32)
+    mesh.vertices.foreach_get('co', basis.ravel())
+    ob.shape_key_add(name="Basis", from_mix=False)
+    for vmap in morphs:
+        indices, rows, _ = map_rows(vmap, len(basis))
+        values = rows[:, :3] * np.array((1.0, 1.0, -1.0), np.float32)
+        co = basis.copy()
+        if vmap.map_type == 'SPOT':
+            co[indices] = values
+        else:
+            co[indices] += values
+        key = ob.shape_key_add(name=vmap.name, from_mix=False)
+        key.data.foreach_set('co', co.ravel())
+
+
+def create_deform_maps(lxo_layer: lxo_reader.LXOLayer, ob: bpy.types.Object):
+    """Vertex groups and shape keys of a built mesh object."""
+    names = create_vertex_groups(lxo_layer, ob)
+    create_shape_keys(lxo_layer, ob)
+    return names
+
+
+MAT_LXO_BLENDER_MAPPING_VECTOR = {
+    "diffCol": "Base Color",
+    #"subsCol": "Subsurface Color",
+    #"lumiCol": "Emission",
+}
+
+MATERIAL_LXO_BLENDER_MAPPING = {
+    "subsAmt": "Subsurface",
+    "metallic": "Metallic",
+    "specAmt": "Specular",
+    "specTint": "Specular Tint",
+    "rough": "Roughness",
+    "sheen": "Sheen",
+    "sheenTint": "Sheen Tint",
+    "coatAmt": "Clearcoat",
+    "coatRough": "Clearcoat Roughness",
+    "tranAmt": "Transmission",
+    "tranRough": "Transmission Roughness",
+    #"radiance": "Emission",
+}
+
+
+# spline types of the non-face polygon types, the others become poly lines
+CURVE_SPLINE_TYPES = {
+    "CURV": "NURBS",
+    "BEZR": "NURBS",
+}
+
+
+def material_hash(lxo_material: lxo_reader.LXOItem) -> str:
+    """Hash of the channel values that end up in the Blender material."""
+    data = json.dumps([lxo_material.channel, lxo_material.CHNV],
+                      sort_keys=True, default=str)
+    return hashlib.blake2b(data.encode(), digest_size=8).hexdigest()
+
+
+def create_material(material_name: str, lxo_material: lxo_reader.LXOItem):
+    new_material = bpy.data.materials.new(material_name)
+    # TODO: this is only for principled shader
+    new_material.use_nodes = True
+    if lxo_material is None:
+        # TODO handle material errors
+        return new_material
+    inputs = new_material.node_tree.nodes['Principled BSDF'].inputs
+    # adding alpha value
+    # diffColor = [val[1] for val in lxoMaterial.CHNV['diffCol']] + [1, ]
+    # newMaterial.diffuse_color = diffColor
+    for lxo_val, bpy_val in MAT_LXO_BLENDER_MAPPING_VECTOR.items():
+        color = [val[1] for val in lxo_material.CHNV[lxo_val]] + [1, ]
+        inputs[bpy_val].default_value = color
+    emission = lxo_material.channel["radiance"]
+    emission_color = [val[1] * emission for val in lxo_material.CHNV["lumiCol"]] + [1, ]
+    inputs["Emission"].default_value = emission_color
+    for lxo_val, bpy_val in MATERIAL_LXO_BLENDER_MAPPING.items():
+        inputs[bpy_val].default_value = lxo_material.channel[lxo_val]
+    return new_material
+
+
+def get_material(material_name: str, lxo_material: lxo_reader.LXOItem,
+                 material_cache: dict, use_existing: bool = False):
+    """Return the Blender material for a material tag, creating it only once.
+
+    Materials are cached by their advancedMaterial item and channel hash,
+    tags without a resolved material share one plain material per name.
+    """
+    if lxo_material is None:
+        key = (None, material_name)
+        lxo_hash = None
+    else:
+        lxo_hash = material_hash(lxo_material)
+        key = (lxo_material.id, lxo_hash)
+    material = material_cache.get(key)
+    if material is not None:
+        return material
+
+    if use_existing:
+        if lxo_hash is not None:
+            material = next((mat for mat in bpy.data.materials
+                             if mat.get("lxo_hash") == lxo_hash), None)
+        if material is None:
+            material = bpy.data.materials.get(material_name)
+    if material is None:
+        material = create_material(material_name, lxo_material)
+        if lxo_hash is not None:
+            material["lxo_hash"] = lxo_hash
+    material_cache[key] = material
+    return material
+
+
+def create_material_slots(lxo_layer: lxo_reader.LXOLayer, mesh: bpy.types.Mesh):
+    # untagged polygons keep the first slot, but only tagged ones get smoothed
+    # unless the layer has smoothing groups, see create_smoothing
+    import numpy as np
+
+    slots = np.frombuffer(lxo_layer.material_index, np.intc)
+    mesh.polygons.foreach_set('material_index', np.maximum(slots, 0))
+    if 'SMGP' not in lxo_layer.ptags:
+        mesh.polygons.foreach_set('use_smooth', slots >= 0)
+
 
-    # Select no objects
-    bpy.ops.object.select_all(action='DESELECT')
+def create_smoothing(lxo_layer: lxo_reader.LXOLayer, mesh: bpy.types.Mesh):
+    # polygons in a smoothing group are smooth, the others flat
+    import numpy as np
 
-    # Select all meshes
-    for obj in bpy.data.objects:
-        if obj.type == 'MESH':
-            obj.select_set(True)
+    groups = np.frombuffer(lxo_layer.ptags['SMGP'], np.intc)
+    smooth = np.zeros(len(mesh.polygons), bool)
+    count = min(len(groups), len(smooth))
+    smooth[:count] = groups[:count] >= 0
+    mesh.polygons.foreach_set('use_smooth', smooth)
 
-    # Shade smooth
-    bpy.ops.object.shade_smooth()
 
-    # Restore the previous selection
-    bpy.ops.object.select_all(action='DESELECT')
-    for obj in current_selection:
-        obj.select_set(True)
+def create_ptag_attributes(lxo_layer: lxo_reader.LXOLayer, mesh: bpy.types.Mesh):
+    # parts and selection sets as integer face attributes, the attribute value
+    # indexes the tag names stored on the mesh, -1 for untagged polygons
+    for tag_type, attr_name in (('PART', 'lxo_part'), ('PICK', 'lxo_pick')):
+        if tag_type not in lxo_layer.ptags:
+            continue
+        names, indices = lxo_layer.ptag_table(tag_type)
+        attr = mesh.attributes.new(attr_name, 'INT', 'FACE')
+        attr.data.foreach_set('value', indices)
+        mesh[attr_name + "_names"] = names
+
+
+def shade_smooth(meshes):
+    # data level, only touches the given meshes and needs no selection
+    for mesh in meshes:
+        mesh.polygons.foreach_set('use_smooth', [True] * len(mesh.polygons))
+
+
+def finalize_objects(subd_objects, add_subd_mod: bool):
+    """Smooth the SubD meshes and add their modifiers in one pass."""
+    # TODO: clean up the smoothing mess
+    shade_smooth({ob.data for ob in subd_objects})
+    if not add_subd_mod:
+        return
+    for ob in subd_objects:
+        if not any(modifier.type == 'SUBSURF' for modifier in ob.modifiers):
+            ob.modifiers.new(name="Subsurf", type="SUBSURF")
+
+
+def resolve_materials(lxo: lxo_reader.LXOFile) -> dict[str, lxo_reader.LXOItem]:
+    """Map material tags to their advancedMaterial item, see lxo_reader.ShaderTree."""
+    return lxo.shader_tree().materials()
+
+
+def build_mesh(lxo_layer: lxo_reader.LXOLayer, mesh: bpy.types.Mesh,
+               materials: dict[str, lxo_reader.LXOItem], material_cache: dict,
+               use_existing_materials: bool = False, profile: ImportProfile = None):
+    """Fill the mesh with the layer geometry, materials=None skips materials."""
+    if profile is None:
+        profile = ImportProfile()
+    # bad indices crash from_pydata, fix the layer first. Valid layers
+    # don't pay for the repair, it loads NumPy and sorts all corners
+    from . import lxo_validate
+    report = None
+    with profile.phase("validate", len(lxo_layer.polygons), lxo_layer):
+        if lxo_validate.needs_repair(lxo_layer):
+            report = lxo_validate.repair_layer(lxo_layer)
+    if report:
+        print(f"Repaired layer {lxo_layer.name}: {report.summary()}")
+    with profile.phase("from_pydata", len(lxo_layer.polygons), lxo_layer):
+        # adapt to blender coord system and right up axis
+        points = [[p[0], p[1], -p[2]] for p in lxo_layer.points]
+        # correcting default polygon normals
+        for point_list in lxo_layer.polygons:
+            point_list.reverse()
+        mesh.from_pydata(points, [], lxo_layer.polygons)
+
+    # create uvmaps
+    if len(lxo_layer.uv_maps_disco) > 0 or len(lxo_layer.uv_maps) > 0:
+        with profile.phase("create_uvmaps", len(mesh.loops), lxo_layer):
+            create_uvmaps(lxo_layer, mesh)
+
+    if 'RGB ' in lxo_layer.vmaps or 'RGBA' in lxo_layer.vmaps:
+        with profile.phase("color_attributes", len(mesh.vertices), lxo_layer):
+            create_color_attributes(lxo_layer, mesh)
+
+    # add materials and tags
+    layer_start = time.perf_counter()
+    if materials is not None:
+        lxo_layer.generate_materials()
+        for material_name in lxo_layer.materials:
+            mesh.materials.append(get_material(material_name,
+                                               materials.get(material_name),
+                                               material_cache,
+                                               use_existing_materials))
+            # ok-ish for now
+            #mesh.use_auto_smooth = True
+            # not perfect, in Modo smoothing is part of the material
+            # in blender it's part of the mesh
+            #mesh.auto_smooth_angle = lxo_material.channel['smAngle']
+
+        if lxo_layer.materials:
+            create_material_slots(lxo_layer, mesh)
+
+    if 'SMGP' in lxo_layer.ptags:
+        create_smoothing(lxo_layer, mesh)
+    create_ptag_attributes(lxo_layer, mesh)
+    profile.add("materials", time.perf_counter() - layer_start,
+                len(lxo_layer.materials), lxo_layer)
+
+    # vertex normal maps
+    if (len(lxo_layer.vertex_normals) > 0 or
+            len(lxo_layer.vertex_normals_disco) > 0):
+        with profile.phase("create_normals", len(mesh.loops), lxo_layer):
+            create_normals(lxo_layer, mesh)
 
 
-def build_objects(lxo: lxo_reader.LXOFile, load_materials: bool, clean_import: bool, global_matrix):
-    """Using the gathered data, create the objects."""
+def clear_mesh(mesh: bpy.types.Mesh, ob: bpy.types.Object = None):
+    """Empty a mesh for building it again, with the groups and keys of ob."""
+    if ob is not None:
+        ob.vertex_groups.clear()
+        if mesh.shape_keys is not None:
+            ob.shape_key_clear()
+    mesh.clear_geometry()
+    mesh.materials.clear()
+
+
+def create_curves(lxo_layer: lxo_reader.LXOLayer, name: str) -> bpy.types.Curve:
+    """Curve with a spline for every curve of the layer, see CurveSet.
+
+    CURV curves become NURBS through their end points, BEZR ones NURBS
+    with Bezier knots. The points of all curves are converted at once and
+    each spline gets them with a single foreach_set.
+    """
+    import numpy as np
+
+    curve = bpy.data.curves.new(name, 'CURVE')
+    curve.dimensions = '3D'
+    coords = np.array(lxo_layer.points, np.float32).reshape(-1, 3)
+    # adapt to blender coord system, see build_mesh
+    coords[:, 2] *= -1
+    for poly_type, curves in lxo_layer.curves.items():
+        spline_type = CURVE_SPLINE_TYPES.get(poly_type, 'POLY')
+        indices = np.frombuffer(curves.indices, np.int32)
+        # x, y, z, w of the spline points
+        points = np.ones((len(indices), 4), np.float32)
+        points[:, :3] = coords[indices]
+        offsets = curves.offsets.tolist()
+        for start, end in zip(offsets, offsets[1:]):
+            spline = curve.splines.new(spline_type)
+            spline.points.add(end - start - 1)
+            spline.points.foreach_set('co', points[start:end].ravel())
+            if spline_type == 'NURBS':
+                spline.order_u = min(4, end - start)
+                spline.use_endpoint_u = True
+                spline.use_bezier_u = poly_type == "BEZR" and (end - start) % 3 == 1
+    return curve
+
+
+def add_curve_object(ob: bpy.types.Object, curve: bpy.types.Curve,
+                     collection: bpy.types.Collection):
+    # the curves of a layer live in a child of its object
+    curve_ob = bpy.data.objects.new(f"{ob.name} Curves", curve)
+    curve_ob["lxo_curves"] = ob.get("lxo_item", "")
+    collection.objects.link(curve_ob)
+    curve_ob.parent = ob
+
+
+def remove_children(ob: bpy.types.Object, key: str):
+    """Remove the children an import created for ob, marked by key."""
+    for child in ob.children:
+        if key in child:
+            bpy.data.objects.remove(child)
+
+
+def create_proxy(lxo_layer: lxo_reader.LXOLayer, ob: bpy.types.Object):
+    """Bounding box stand-in, the full mesh is loaded by load_proxies."""
+    if lxo_layer.bbox is not None:
+        (x0, y0, z0), (x1, y1, z1) = lxo_layer.bbox
+        # adapt to blender coord system, see build_mesh
+        points = [(x, y, -z) for x in (x0, x1) for y in (y0, y1) for z in (z0, z1)]
+        faces = [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1),
+                 (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)]
+        ob.data.from_pydata(points, [], faces)
+    ob.display_type = 'BOUNDS'
+    ob["lxo_source"] = lxo_layer.parent.filepath
+    # item ids are U4, too big for int properties
+    ob["lxo_layer"] = str(lxo_layer.reference_id)
+    ob["lxo_geometry_span"] = json.dumps(lxo_layer.geometry_span)
+
+
+def instanced_mesh(source_id: int, lxo_items: dict, ob_dict: dict,
+                   mesh_dict: dict, existing: dict, shared_meshes: dict,
+                   layer_fingerprints: dict) -> bpy.types.Mesh:
+    """Mesh of a source mesh item, for the items instancing it.
+
+    Sources coming later in the file get their mesh created here, it is
+    built with the layer like any other and shared like the meshes of
+    build_objects.
+    """
+    ob = ob_dict.get(source_id, existing.get(source_id))
+    if ob is not None and ob.type == 'MESH':
+        return ob.data
+    mesh = mesh_dict.get(source_id)
+    fingerprint = layer_fingerprints.get(source_id)
+    if mesh is None:
+        mesh = shared_meshes.get(fingerprint)
+    if mesh is None:
+        source = lxo_items[source_id]
+        mesh = bpy.data.meshes.new(source.vname or source.name or source.typename)
+        mesh_dict[source_id] = mesh
+        if fingerprint is not None:
+            shared_meshes[fingerprint] = mesh
+    return mesh
+
+
+def create_instancers(lxo: lxo_reader.LXOFile, replicators: dict, ob_dict: dict,
+                      global_matrix, collection: bpy.types.Collection):
+    """Make replicator objects instance their prototypes on the points.
+
+    A replicator object shares the mesh of its point source and takes over
+    its placement, each prototype with object data becomes a child sharing
+    that data. Blender then draws one instance of the children per point,
+    nothing is copied.
+    """
+    # matrix_world of the objects is not updated yet, see apply_transforms
+    _, world_matrices = lxo.resolve_matrices()
+    parents = dict(lxo.hierarchy())
+    for replicator_id, (point_source, prototypes) in replicators.items():
+        ob = ob_dict.get(replicator_id)
+        if ob is None or ob.type != 'MESH':
+            continue
+        # from an earlier import
+        remove_children(ob, "lxo_prototype")
+        if point_source in ob_dict and point_source in world_matrices:
+            matrix = to_matrix(world_matrices[point_source])
+            parent_id = parents.get(replicator_id)
+            if parent_id in ob_dict:
+                # parented by apply_transforms, relative to the parent
+                parent_matrix = to_matrix(world_matrices[parent_id])
+                ob.matrix_basis = parent_matrix.inverted_safe() @ matrix
+            else:
+                ob.matrix_basis = global_matrix @ matrix
+        for prototype_id in prototypes:
+            prototype = ob_dict.get(prototype_id)
+            if prototype is None or prototype.data is None:
+                print(f"replicator {ob.name}: prototype {prototype_id} not supported")
+                continue
+            child = bpy.data.objects.new(prototype.name, prototype.data)
+            child["lxo_prototype"] = str(prototype_id)
+            collection.objects.link(child)
+            child.parent = ob
+        ob.instance_type = 'VERTS'
+        ob.show_instancer_for_viewport = False
+        ob.show_instancer_for_render = False
+
+
+def load_proxies(operator, context, objects,
+                 LOAD_MATERIALS=True,
+                 ADD_SUBD_MOD=True,
+                 USE_EXISTING_MATERIALS=True):
+    """Replace proxy meshes by the full layer geometry."""
+    proxies_by_source = {}
+    for ob in objects:
+        if ob.type == 'MESH' and "lxo_source" in ob:
+            proxies_by_source.setdefault(ob["lxo_source"], []).append(ob)
+    if not proxies_by_source:
+        if operator is not None:
+            operator.report({'WARNING'}, "No LXO proxies selected")
+        return {"CANCELLED"}
+
+    material_cache = {}
+    for filepath, proxies in proxies_by_source.items():
+        reader = reader_session()
+        # items and tags only, each layer is read on its own below
+        lxo = reader.read_from_file(filepath, load_geometry=False)
+        layers = {str(lxo_layer.reference_id): lxo_layer for lxo_layer in lxo.layers}
+        materials = resolve_materials(lxo) if LOAD_MATERIALS else None
+        for ob in proxies:
+            # the spans of this read, the file may have been saved since
+            # the proxies were imported
+            lxo_layer = layers.get(ob["lxo_layer"])
+            if lxo_layer is None:
+                print(f"layer {ob['lxo_layer']} not found in {filepath}, "
+                      f"trying the span stored with the proxy")
+                lxo_layer = lxo_reader.LXOLayer(lxo, ob.name, 0, 0,
+                                                int(ob["lxo_layer"]))
+                lxo_layer.geometry_span = json.loads(ob["lxo_geometry_span"])
+            try:
+                reader.read_layer_geometry(filepath, lxo_layer)
+            except lxo_reader.PARSE_ERRORS as error:
+                print(f"failed to read layer {ob['lxo_layer']} of {filepath}: {error}")
+                continue
+            proxy_mesh = ob.data
+            mesh = bpy.data.meshes.new(proxy_mesh.name)
+            build_mesh(lxo_layer, mesh, materials, material_cache,
+                       USE_EXISTING_MATERIALS)
+            # instances of the proxy get the full mesh as well
+            proxy_mesh.user_remap(mesh)
+            create_deform_maps(lxo_layer, ob)
+            if any(lxo_layer.curves.values()):
+                remove_children(ob, "lxo_curves")
+                add_curve_object(ob, create_curves(lxo_layer, mesh.name),
+                                 ob.users_collection[0])
+            if proxy_mesh.users == 0:
+                bpy.data.meshes.remove(proxy_mesh)
+            ob.display_type = 'TEXTURED'
+            for key in ("lxo_source", "lxo_layer", "lxo_geometry_span"):
+                del ob[key]
+            if lxo_layer.is_subd:
+                finalize_objects([ob], ADD_SUBD_MOD)
+    return {"FINISHED"}
+
+
+def mesh_hashes(lxo: lxo_reader.LXOFile, item_hashes: dict, layer_hashes: dict,
+                load_materials: bool) -> dict:
+    """Layer content hashes including what else ends up in their meshes.
+
+    Polygon tags refer to the TAGS chunk by index, with materials the
+    shader tree items count as well.
+    """
+    shared = hashlib.blake2b(digest_size=16)
+    shared.update('\0'.join(lxo.tagnames or ()).encode())
+    if load_materials:
+        for lxo_item in lxo.items:
+            if lxo_item.typename in ("advancedMaterial", "mask", "polyRender"):
+                shared.update(item_hashes.get(lxo_item.id, "").encode())
+    shared = shared.hexdigest()
+    return {reference_id: hashlib.blake2b((layer_hash + shared).encode(),
+                                          digest_size=16).hexdigest()
+            for reference_id, layer_hash in layer_hashes.items()}
+
+
+def apply_transforms(lxo: lxo_reader.LXOFile, ob_dict: dict, global_matrix):
+    """Parent the objects and write their matrices, parents first.
+
+    Matrices are resolved by the reader in one pass, so no view layer
+    update is needed. Root items and items whose parent was not created
+    get the global_matrix.
+    """
+    local_matrices, world_matrices = lxo.resolve_matrices()
+    rotated = {item_index for item_index, stack in lxo.transform_stacks().items()
+               if any(item.typename == "rotation" for item in stack)}
+    for item_id, parent_id in lxo.hierarchy():
+        ob = ob_dict.get(item_id)
+        if ob is None:
+            continue
+        if item_id in rotated:
+            # TODO read euler order from item
+            ob.rotation_mode = 'ZXY'
+        parent_ob = ob_dict.get(parent_id)
+        if parent_ob is not None:
+            ob.parent = parent_ob
+            ob.matrix_parent_inverse = Matrix.Identity(4)
+            ob.matrix_basis = to_matrix(local_matrices[item_id])
+        else:
+            ob.matrix_basis = global_matrix @ to_matrix(world_matrices[item_id])
+
+
+def to_matrix(matrix: tuple) -> Matrix:
+    return Matrix((matrix[0:4], matrix[4:8], matrix[8:12], matrix[12:16]))
+
+
+# transform item channel prefixes and the object properties they animate
+TRANSFORM_CHANNELS = {'pos': 'location', 'rot': 'rotation_euler', 'scl': 'scale'}
+
+
+def axis_mapping(matrix: Matrix):
+    # Blender axis, sign and scale for each Modo axis of an axis conversion
+    mapping = []
+    for column in range(3):
+        values = [matrix[row][column] for row in range(3)]
+        row = max(range(3), key=lambda r: abs(values[r]))
+        mapping.append((row, 1.0 if values[row] > 0 else -1.0, abs(values[row])))
+    return mapping
+
+
+def fill_fcurve(fcurve: bpy.types.FCurve, envelope: lxo_reader.Envelope, fps,
+                factor=1.0):
+    """Write all keys of an envelope at once, no keyframe_insert."""
+    count = len(envelope.times)
+    frames = [time * fps for time in envelope.times]
+    values = [value * factor for value in envelope.values]
+    points = fcurve.keyframe_points
+    points.add(count)
+    points.foreach_set('co', array('f', chain.from_iterable(zip(frames, values))))
+    if envelope.type == 1:
+        # integer channels step
+        points.foreach_set('interpolation', array('i', [0]) * count)
+    elif envelope.has_tangents:
+        # slopes to handles a third of the way to the neighbour keys
+        gaps = [b - a for a, b in zip(frames, frames[1:])] or [1.0]
+        before = gaps[:1] + gaps
+        after = gaps + gaps[-1:]
+        points.foreach_set('handle_left', array('f', chain.from_iterable(
+            (frame - gap / 3, value - slope * factor * gap / (3 * fps))
+            for frame, value, slope, gap in zip(frames, values,
+                                                envelope.slope_in, before))))
+        points.foreach_set('handle_right', array('f', chain.from_iterable(
+            (frame + gap / 3, value + slope * factor * gap / (3 * fps))
+            for frame, value, slope, gap in zip(frames, values,
+                                                envelope.slope_out, after))))
+        free = array('i', [0]) * count
+        points.foreach_set('handle_left_type', free)
+        points.foreach_set('handle_right_type', free)
+
+    if 5 in (envelope.pre, envelope.post):
+        fcurve.extrapolation = 'LINEAR'
+    cycles = {2: 'REPEAT', 3: 'MIRROR', 4: 'REPEAT_OFFSET'}
+    if envelope.pre in cycles or envelope.post in cycles:
+        modifier = fcurve.modifiers.new('CYCLES')
+        modifier.mode_before = cycles.get(envelope.pre, 'NONE')
+        modifier.mode_after = cycles.get(envelope.post, 'NONE')
+    fcurve.update()
+
+
+def create_animation(lxo: lxo_reader.LXOFile, ob_dict: dict, global_matrix,
+                     fps) -> int:
+    """F-curves for the envelopes of the transform item channels.
+
+    Root objects get location keys converted by global_matrix, their
+    rotation keys stay in Modo space with the axis conversion as delta
+    rotation. Returns the number of F-curves.
+    """
+    items = {item.id: item for item in lxo.items}
+    root_axes = axis_mapping(global_matrix)
+    global_scale = global_matrix.to_scale()[0]
+    conversion = global_matrix.to_3x3().normalized()
+    rotated_roots = set()
+    count = 0
+    for _, item_id, channel_name, envelope in lxo.animated_channels():
+        item = items.get(item_id)
+        prop, _, axis_name = channel_name.partition('.')
+        data_path = TRANSFORM_CHANNELS.get(prop)
+        if item is None or data_path is None or axis_name not in ('X', 'Y', 'Z'):
+            continue
+        # TODO: stacks with more than one item per type, e.g. pivots
+        ob = ob_dict.get(item.graph_links.get('xfrmCore', (None, None))[0])
+        if ob is None:
+            continue
+        axis = 'XYZ'.index(axis_name)
+        factor = 1.0
+        if ob.parent is None:
+            if data_path == 'location':
+                axis, factor, scale = root_axes[axis]
+                factor *= scale
+            elif data_path == 'scale':
+                factor = global_scale
+            elif ob not in rotated_roots:
+                rotated_roots.add(ob)
+                ob.rotation_mode = 'ZXY'
+                ob.delta_rotation_euler = conversion.to_euler('ZXY')
+                ob.rotation_euler = lxo_reader.channel_vector(item, 'rot',
+                                                              (0.0, 0.0, 0.0))
+        if ob.animation_data is None:
+            ob.animation_data_create()
+        action = ob.animation_data.action
+        if action is None:
+            action = bpy.data.actions.new(ob.name + "Action")
+            ob.animation_data.action = action
+        fcurve = (action.fcurves.find(data_path, index=axis) or
+                  action.fcurves.new(data_path, index=axis))
+        fill_fcurve(fcurve, envelope, fps, factor)
+        count += 1
+    return count
+
+
+def build_objects(lxo: lxo_reader.LXOFile, load_materials: bool, clean_import: bool, global_matrix,
+                  use_existing_materials: bool = False, material_cache: dict = None,
+                  add_subd_mod: bool = True, share_meshes: bool = False,
+                  collection: bpy.types.Collection = None,
+                  profile: ImportProfile = None,
+                  stream_geometry: bool = False, memory_budget: int = None,
+                  load_animation: bool = True, existing: dict = None):
+    """Using the gathered data, create the objects.
+
+    With stream_geometry, layers read without geometry are read and built
+    one at a time and freed right after, see iter_layer_geometry.
+    existing maps item ids to the objects of an earlier import of the
+    file, those are updated instead of created, see reimport.
+    """
+    if material_cache is None:
+        material_cache = {}  # shared materials, see get_material
+    if profile is None:
+        profile = ImportProfile()
     ob_dict = {}  # Used for the parenting setup.
     mesh_dict = {}  # used to match layers to items
-    transforms_dict: dict[int, dict[int, lxo_reader.LXOItem]] = {}  # used to match transforms to items
     light_materials = {}  # used to match lightmaterial to light for color
-    shadertree_items: dict[str, lxo_reader.LXOItem] = {}  # collect all items for materials
+    subd_objects = []  # smoothed and subdivided after all meshes are built
+    shared_meshes = {}  # layer fingerprint to mesh, for linked duplicates
+    layer_fingerprints = {}  # layer reference id to fingerprint
+    group_names = {}  # mesh to the vertex group names of its weight maps
+    built_meshes = set()  # their objects get the curves of the layer again
+    layer_curves = {}  # mesh to the curve of the layer's non-face polygons
+    proxies = set()  # existing proxies, they stay proxies
+    instances = {}  # meshInst id to source mesh id, sharing its mesh
+    instance_sources = lxo.instance_sources()
+    replicators = lxo.replicators()
+    lxo_items = {lxo_item.id: lxo_item for lxo_item in lxo.items}
+    if existing is None:
+        existing = {}
+    item_hashes, layer_hashes = {}, {}  # stored on the datablocks for reimport
+    source = os.path.abspath(lxo.filepath) if lxo.filepath else None
+    if source is not None:
+        # the layers of the meshes of an earlier import, to tell
+        # which changed. The others are hashed once they are built
+        compared = [item_id for item_id, ob in existing.items()
+                    if ob.type == 'MESH' and "lxo_geometry_span" not in ob and
+                    item_id not in lxo.skipped_items]
+        with profile.phase("hashes", len(compared)):
+            item_hashes, layer_hashes = reader_session().content_hashes(
+                lxo, layer_ids=compared)
+            layer_hashes = mesh_hashes(lxo, item_hashes, layer_hashes, load_materials)
+    if share_meshes and all(lxo_layer.geometry_loaded for lxo_layer in lxo.layers):
+        with profile.phase("fingerprints"):
+            layer_fingerprints = {lxo_layer.reference_id: lxo_layer.fingerprint()
+                                  for lxo_layer in lxo.layers}
+
+    # layer objects of an earlier import by mesh, a changed layer of a
+    # shared mesh gets a mesh of its own
+    layer_users = {}
+    for ob in existing.values():
+        if "lxo_layer_hash" in ob:
+            layer_users[ob.data] = layer_users.get(ob.data, 0) + 1
 
     # Before adding any meshes or armatures go into Object mode.
     # TODO: is this needed?
@@ -191,34 +990,75 @@ def build_objects(lxo: lxo_reader.LXOFile, load_materials: bool, clean_import: b
 
     if clean_import:
         bpy.ops.wm.read_homefile(use_empty=True)
+    if collection is None:
+        collection = bpy.context.collection
 
     # create all items
     for lxo_item in lxo.items:
+        if lxo_item.id in lxo.skipped_items:
+            # left out by a read filter
+            continue
+        item_start = time.perf_counter()
         item_name = lxo_item.vname if lxo_item.vname else lxo_item.name
         if item_name is None:
             item_name = lxo_item.typename
         object_data = None
+        ob = existing.get(lxo_item.id)
+        unchanged = ob is not None and ob.get("lxo_hash") == item_hashes.get(lxo_item.id)
 
         if lxo_item.typename in ['translation', 'rotation', 'scale']:
-            item_index, link_index = lxo_item.graph_links['xfrmCore'] if 'xfrmCore' in lxo_item.graph_links else (-1, -1)
-            print(item_index, link_index, item_name)
-            if item_index == -1:
-                # seems to be some issue with texture locators
-                continue
-            if item_index in transforms_dict:
-                transforms_dict[item_index][link_index] = lxo_item
-            else:
-                transforms_dict[item_index] = {link_index: lxo_item}
+            # resolved with the hierarchy, see apply_transforms
+            pass
         elif lxo_item.typename == "lightMaterial":
             item_index, link_index = lxo_item.graph_links['parent']
             # assuming just one lightmaterial per light right now
             light_materials[item_index] = lxo_item
         elif lxo_item.typename in ["advancedMaterial", "mask", "polyRender"]:
-            # TODO: improve this mapping
-            shadertree_items[lxo_item.id] = lxo_item
+            # see resolve_materials
+            pass
+        elif lxo_item.typename == "mesh" and ob is not None and ob.type == 'MESH':
+            # updated in place, rebuilt only if the layer changed
+            object_data = ob.data
+            if "lxo_geometry_span" in ob:
+                proxies.add(lxo_item.id)
+            elif ob.get("lxo_layer_hash") != layer_hashes.get(lxo_item.id):
+                if layer_users.get(object_data, 0) > 1:
+                    # the other layers keep the old mesh
+                    layer_users[object_data] -= 1
+                    object_data = ob.data = bpy.data.meshes.new(item_name)
+                    ob.vertex_groups.clear()
+                mesh_dict[lxo_item.id] = object_data
         elif lxo_item.typename == "mesh":
-            object_data = bpy.data.meshes.new(item_name)
-            mesh_dict[lxo_item.id] = object_data
+            # layers with identical geometry share one mesh, only the first
+            # one ends up in mesh_dict and gets built
+            fingerprint = layer_fingerprints.get(lxo_item.id)
+            # created ahead for an instance of it, see instanced_mesh
+            object_data = mesh_dict.get(lxo_item.id)
+            if object_data is None:
+                object_data = shared_meshes.get(fingerprint)
+            if object_data is None:
+                object_data = bpy.data.meshes.new(item_name)
+                mesh_dict[lxo_item.id] = object_data
+                if fingerprint is not None:
+                    shared_meshes[fingerprint] = object_data
+        elif lxo_item.typename == "meshInst":
+            source_id = instance_sources.get(lxo_item.id)
+            if source_id is not None and source_id not in lxo.skipped_items:
+                object_data = instanced_mesh(source_id, lxo_items, ob_dict,
+                                             mesh_dict, existing, shared_meshes,
+                                             layer_fingerprints)
+                instances[lxo_item.id] = source_id
+        elif lxo_item.typename == "replicator":
+            # the point source mesh, see create_instancers
+            point_source = lxo_items.get(replicators[lxo_item.id][0])
+            if (point_source is not None and point_source.typename == "mesh" and
+                    point_source.id not in lxo.skipped_items):
+                object_data = instanced_mesh(point_source.id, lxo_items, ob_dict,
+                                             mesh_dict, existing, shared_meshes,
+                                             layer_fingerprints)
+        elif unchanged and (lxo_item.typename == "camera" or
+                            lxo_item.typename[-5:] == "Light"):
+            object_data = ob.data
         elif lxo_item.typename == "camera":
             object_data = bpy.data.cameras.new(item_name)
             # saved as float in meters, we want mm
@@ -231,166 +1071,118 @@ def build_objects(lxo: lxo_reader.LXOFile, load_materials: bool, clean_import: b
             # only locator type items should have a LAYR chunk
             # (= anything in item tree)
             # create empty for object data and add to scene
-            ob = bpy.data.objects.new(name=item_name, object_data=object_data)
-            scn = bpy.context.collection
-            scn.objects.link(ob)
-
-            parent_index = None
-            if "parent" in lxo_item.graph_links:
-                # 0 is itemIndex, 1 is linkIndex
-                # TODO: handle linkIndex, not sure if super important
-                parent_index = lxo_item.graph_links["parent"][0]
-            ob_dict[lxo_item.id] = [ob, parent_index]
-
-    # figure out materials
-    materials: dict[str, lxo_reader.LXOItem] = {}
-    for lxo_item in shadertree_items.values():
-        if lxo_item.typename == "advancedMaterial":
-            parent_index = lxo_item.graph_links['parent'][0]
-            parent_item = shadertree_items[parent_index]
-            if parent_item.typename == 'polyRender':
-                continue
-            material_name = parent_item.channel['ptag']
-            materials[material_name] = lxo_item
-
-    # TODO: OOO transforms from Modo...
-    for item_index, transforms in transforms_dict.items():
-        blender_object = ob_dict[item_index][0]
-        for _, lxo_item in sorted(transforms.items()):
-            if lxo_item.typename == "scale":
-                try:
-                    data = lxo_item.CHNV['scl']
-                except KeyError:
-                    # TODO: verify this fix
-                    data = ((0, 1), (1, 1), (2, 1))
-                scl = (data[0][1], data[1][1], data[2][1])
-                blender_object.scale = scl
-            elif lxo_item.typename == "rotation":
-                try:
-                    data = lxo_item.CHNV['rot']
-                except KeyError:
-                    # TODO: verify this fix
-                    data = ((0, 0), (1, 0), (2, 0))
-                rot = Euler((data[0][1], data[1][1], data[2][1]), 'ZXY')
-                blender_object.rotation_euler = rot
-                # TODO read euler order from item
-                blender_object.rotation_mode = 'ZXY'
-            elif lxo_item.typename == "translation":
-                try:
-                    data = lxo_item.CHNV['pos']
-                except KeyError:
-                    # TODO: verify this fix
-                    data = ((0, 0), (1, 0), (2, 0))
-                pos = (data[0][1], data[1][1], data[2][1])
-                blender_object.location = pos
-
-
-    mat_lxo_blender_mapping_vector = {
-        "diffCol": "Base Color",
-        #"subsCol": "Subsurface Color",
-        #"lumiCol": "Emission",
-    }
-
-    material_lxo_blender_mapping = {
-        "subsAmt": "Subsurface",
-        "metallic": "Metallic",
-        "specAmt": "Specular",
-        "specTint": "Specular Tint",
-        "rough": "Roughness",
-        "sheen": "Sheen",
-        "sheenTint": "Sheen Tint",
-        "coatAmt": "Clearcoat",
-        "coatRough": "Clearcoat Roughness",
-        "tranAmt": "Transmission",
-        "tranRough": "Transmission Roughness",
-        #"radiance": "Emission",
-    }
+            object_type = object_data.id_type if object_data is not None else 'EMPTY'
+            if ob is not None and ob.type != object_type:
+                # the item changed its type, objects can't
+                bpy.data.objects.remove(ob)
+                ob = None
+            if ob is None:
+                ob = bpy.data.objects.new(name=item_name, object_data=object_data)
+                collection.objects.link(ob)
+            elif not unchanged:
+                ob.name = item_name
+                ob.data = object_data
+            if source is not None:
+                ob["lxo_file"] = source
+                # item ids are U4, too big for int properties
+                ob["lxo_item"] = str(lxo_item.id)
+                ob["lxo_hash"] = item_hashes.get(lxo_item.id, "")
+            ob_dict[lxo_item.id] = ob
+        item_seconds = time.perf_counter() - item_start
+        profile.add(f"items/{lxo_item.typename}", item_seconds, 1)
+        if profile.tracer is not None and lxo_item.LAYR is not None:
+            profile.tracer.object_built(item_name, lxo_item.typename, item_seconds)
 
-    # match mesh layers to items
+    materials = resolve_materials(lxo) if load_materials else None
+
+    # proxies stay proxies, the offsets move with any change before the layer
     for lxo_layer in lxo.layers:
+        if lxo_layer.reference_id in proxies:
+            ob_dict[lxo_layer.reference_id]["lxo_geometry_span"] = json.dumps(
+                lxo_layer.geometry_span)
+
+    # match mesh layers to items
+    layers = lxo.layers
+    if stream_geometry:
+        streamed = [lxo_layer for lxo_layer in lxo.layers
+                    if lxo_layer.reference_id in mesh_dict and
+                    lxo_layer.reference_id not in lxo.skipped_items and
+                    lxo_layer.reference_id not in proxies and
+                    not lxo_layer.geometry_loaded]
+        reader = reader_session().traced(profile.tracer)
+        layers = reader.iter_layer_geometry(lxo.filepath, streamed, memory_budget)
+    for lxo_layer in layers:
+        if lxo_layer.reference_id in lxo.skipped_items:
+            continue
+        # add subd modifier is _any_ subD in mesh
+        # TODO: figure out how to deal with partial SubD and PSubs
+        if lxo_layer.is_subd and lxo_layer.reference_id in ob_dict:
+            subd_objects.append(ob_dict[lxo_layer.reference_id])
         try:
             mesh = mesh_dict[lxo_layer.reference_id]
         except KeyError:
-            print(f"error with {lxo_layer.reference_id} {lxo_layer.name}")
+            if lxo_layer.reference_id not in ob_dict:
+                print(f"error with {lxo_layer.reference_id} {lxo_layer.name}")
             continue
-        # adapt to blender coord system and right up axis
-        points = [[p[0], p[1], -p[2]] for p in lxo_layer.points]
-        # correcting default polygon normals
-        for point_list in lxo_layer.polygons:
-            point_list.reverse()
-        mesh.from_pydata(points, [], lxo_layer.polygons)
+        if len(mesh.vertices):
+            # built by an earlier import, filled again in place
+            clear_mesh(mesh, ob_dict.get(lxo_layer.reference_id))
+        if not lxo_layer.geometry_loaded:
+            create_proxy(lxo_layer, ob_dict[lxo_layer.reference_id])
+            continue
+        build_mesh(lxo_layer, mesh, materials, material_cache,
+                   use_existing_materials, profile)
+        built_meshes.add(mesh)
+        curve_count = sum(map(len, lxo_layer.curves.values()))
+        if curve_count:
+            with profile.phase("curves", curve_count, lxo_layer):
+                layer_curves[mesh] = create_curves(lxo_layer, mesh.name)
+        if lxo_layer.vmaps and lxo_layer.reference_id in ob_dict:
+            with profile.phase("deform_maps", len(mesh.vertices), lxo_layer):
+                group_names[mesh] = create_deform_maps(
+                    lxo_layer, ob_dict[lxo_layer.reference_id])
 
-        # create uvmaps
-        if len(lxo_layer.uv_maps_disco) > 0 or len(lxo_layer.uv_maps) > 0:
-            create_uvmaps(lxo_layer, mesh)
+    if source is not None and built_meshes:
+        # on the objects, layers sharing a mesh can change on their own
+        stamped = [item_id for item_id, ob in ob_dict.items()
+                   if ob.data in built_meshes and lxo_items[item_id].typename == "mesh"]
+        hashed = [item_id for item_id in stamped if item_id not in layer_hashes]
+        with profile.phase("hashes", len(hashed)):
+            _, new_hashes = reader_session().content_hashes(lxo, (), hashed)
+            layer_hashes.update(mesh_hashes(lxo, item_hashes, new_hashes,
+                                            load_materials))
+        for item_id in stamped:
+            if item_id in layer_hashes:
+                ob_dict[item_id]["lxo_layer_hash"] = layer_hashes[item_id]
 
-        # add materials and tags
-        if load_materials:
-            lxo_layer.generate_materials()
-            mat_slot = 0
-            for material_name, polygons in lxo_layer.materials.items():
-                new_material = bpy.data.materials.new(material_name)
-                # TODO: this is only for principled shader
-                new_material.use_nodes = True
-                # adding alpha value
-                try:
-                    lxo_material = materials[material_name]
-                except KeyError:
-                    # TODO handle material errors
-                    continue
-                # diffColor = [val[1] for val in lxoMaterial.CHNV['diffCol']] + [1, ]
-                # newMaterial.diffuse_color = diffColor
-                for lxo_val, bpy_val in mat_lxo_blender_mapping_vector.items():
-                    print(lxo_val, bpy_val)
-                    color = [val[1] for val in lxo_material.CHNV[lxo_val]] + [1, ]
-                    new_material.node_tree.nodes['Principled BSDF'].inputs[bpy_val].default_value = color
-                emission = lxo_material.channel["radiance"]
-                emission_color = [val[1] * emission for val in lxo_material.CHNV["lumiCol"]] + [1, ]
-                new_material.node_tree.nodes['Principled BSDF'].inputs["Emission"].default_value = emission_color
-                for lxo_val, bpy_val in material_lxo_blender_mapping.items():
-                    print(lxo_val, bpy_val)
-                    new_material.node_tree.nodes['Principled BSDF'].inputs[bpy_val].default_value = lxo_material.channel[lxo_val]
-
-                mesh.materials.append(new_material)
-                for index in polygons:
-                    mesh.polygons[index].material_index = mat_slot
-                    mesh.polygons[index].use_smooth = True
-                # ok-ish for now
-                #mesh.use_auto_smooth = True
-                # not perfect, in Modo smoothing is part of the material
-                # in blender it's part of the mesh
-                #mesh.auto_smooth_angle = lxo_material.channel['smAngle']
-
-                mat_slot += 1
-
-        # vertex normal maps
-        if (len(lxo_layer.vertex_normals) > 0 or
-                len(lxo_layer.vertex_normals_disco) > 0):
-            create_normals(lxo_layer, mesh)
+    subd_objects.extend(ob_dict[instance_id] for instance_id, source_id in instances.items()
+                        if instance_id in ob_dict and ob_dict.get(source_id) in subd_objects)
 
-        # add subd modifier is _any_ subD in mesh
-        # TODO: figure out how to deal with partial SubD and PSubs
-        if lxo_layer.is_subd:
-            ob = ob_dict[lxo_layer.reference_id][0]
-            ob.modifiers.new(name="Subsurf", type="SUBSURF")
-            # TODO: clean up the smoothing mess
-            for poly in ob.data.polygons:
-                poly.use_smooth = True
-
-    # update view layer for recalc of world matrices
-    bpy.context.view_layer.update()
-
-    # parent objects and transform to world orientation
-    for ob_key in ob_dict:
-        if ob_dict[ob_key][1] is not None and ob_dict[ob_key][1] in ob_dict:
-            parent_ob = ob_dict[ob_dict[ob_key][1]]
-            ob_dict[ob_key][0].parent = parent_ob[0]
-            # ob_dict[ob_key][0].location -= parent_ob[0].location
-            print("parenting %s to %s" % (ob_dict[ob_key][0], parent_ob))
-        elif ob_dict[ob_key][1] is None:
-            # transform root level items with global_matrix
-            obj = ob_dict[ob_key][0]
-            obj.matrix_world = global_matrix @ obj.matrix_world
+    # objects sharing a mesh need the vertex groups of the one it was built for
+    for ob in ob_dict.values():
+        if ob.data in group_names and not ob.vertex_groups:
+            for name in group_names[ob.data]:
+                ob.vertex_groups.new(name=name)
+        if ob.data in built_meshes:
+            remove_children(ob, "lxo_curves")
+            if ob.data in layer_curves:
+                add_curve_object(ob, layer_curves[ob.data], collection)
+
+    with profile.phase("finalize", len(subd_objects)):
+        finalize_objects(subd_objects, add_subd_mod)
+
+    with profile.phase("transforms", len(ob_dict)):
+        apply_transforms(lxo, ob_dict, global_matrix)
+
+    if replicators:
+        with profile.phase("instancers", len(replicators)):
+            create_instancers(lxo, replicators, ob_dict, global_matrix, collection)
+
+    if load_animation and lxo.envelopes:
+        render = bpy.context.scene.render
+        with profile.phase("animation", len(lxo.envelopes)):
+            create_animation(lxo, ob_dict, global_matrix,
+                             render.fps / render.fps_base)
 
 
 def load(operator, context, filepath="",
@@ -400,21 +1192,324 @@ def load(operator, context, filepath="",
          ADD_SUBD_MOD=False,
          LOAD_MATERIALS=False,
          LOAD_HIDDEN=False,
-         CLEAN_IMPORT=False):
+         CLEAN_IMPORT=False,
+         USE_EXISTING_MATERIALS=False,
+         SHARE_MESHES=True,
+         WRITE_PROFILE=False,
+         WRITE_TRACE=False,
+         PROXY=False,
+         REGION=None,
+         ITEM_INCLUDE="",
+         ITEM_EXCLUDE="",
+         LOW_MEMORY=False,
+         MEMORY_BUDGET=0,
+         LOAD_ANIMATION=True):
+    """Import a LXO file.
+
+    REGION, a lxo_reader.BoxRegion or PlanesRegion in Modo world space,
+    imports only the mesh layers intersecting it. ITEM_INCLUDE and
+    ITEM_EXCLUDE are comma separated patterns, see lxo_reader.ItemFilter.
+    LOW_MEMORY builds and frees the layers one by one, MEMORY_BUDGET (MB)
+    lets it read ahead while the decoded layers fit into the budget.
+    WRITE_TRACE writes the parse and build events as Chrome trace JSON
+    next to the file.
+    """
 
     from bpy_extras.io_utils import axis_conversion
     global_matrix = (Matrix.Scale(global_scale, 4) @
                      axis_conversion(from_forward=axis_forward,
                                      from_up=axis_up).to_4x4())
+    tracer = lxo_reader.ChromeTracer() if WRITE_TRACE else None
+    profile = ImportProfile(filepath, tracer)
 
-    importlib.reload(lxo_reader)
-    lxo_read = lxo_reader.LXOReader()
-    lxo = lxo_read.read_from_file(filepath)
+    # low memory reads the geometry while building
+    load_geometry = not (PROXY or LOW_MEMORY)
+    with profile.phase("parse", os.path.getsize(filepath)):
+        lxo_read = reader_session().traced(tracer)
+        item_filter = lxo_reader.ItemFilter.from_strings(ITEM_INCLUDE, ITEM_EXCLUDE)
+        if REGION is not None:
+            lxo = lxo_read.read_region(filepath, REGION, load_geometry=load_geometry,
+                                       item_filter=item_filter)
+        elif item_filter:
+            lxo = lxo_read.read_filtered(filepath, item_filter,
+                                         load_geometry=load_geometry)
+        else:
+            lxo = lxo_read.read_from_file(filepath, load_geometry=load_geometry)
 
     # lwo.resolve_clips()
     # lwo.validate_lwo()
-    build_objects(lxo, LOAD_MATERIALS, CLEAN_IMPORT, global_matrix)
+    build_objects(lxo, LOAD_MATERIALS, CLEAN_IMPORT, global_matrix,
+                  USE_EXISTING_MATERIALS, add_subd_mod=ADD_SUBD_MOD,
+                  share_meshes=SHARE_MESHES, profile=profile,
+                  stream_geometry=LOW_MEMORY and not PROXY,
+                  memory_budget=MEMORY_BUDGET * 1024 * 1024 or None,
+                  load_animation=LOAD_ANIMATION)
 
     del lxo
+    report_profile(operator, profile, WRITE_PROFILE)
     # With the data gathered, build the object(s).
     return {"FINISHED"}
+
+
+def report_profile(operator, profile: ImportProfile, write_json=False):
+    summary = profile.summary()
+    print(summary)
+    if operator is not None:
+        operator.report({'INFO'}, summary)
+    if write_json:
+        print(f"Wrote import profile {profile.write_json()}")
+    if profile.tracer is not None:
+        trace_path = profile.tracer.write(profile.filepath + ".trace.json")
+        print(f"Wrote import trace {trace_path}")
+
+
+# Run in every parse_files worker before the first task: registers the
+# add-on package (and its parents) as empty modules, so lxo_reader is
+# imported from addon_dir without running __init__, which needs bpy.
+# Nothing is added to sys.path, in Blender or in the workers.
+WORKER_SETUP = """
+import sys, types
+parts = package.split('.')
+for depth in range(1, len(parts) + 1):
+    name = '.'.join(parts[:depth])
+    module = sys.modules.setdefault(name, types.ModuleType(name))
+    if not hasattr(module, '__path__'):
+        module.__path__ = [addon_dir] if depth == len(parts) else []
+"""
+
+
+def parse_files(filepaths, workers=None, load_geometry=True, item_filter=None):
+    """Parse files in a process pool, yield (filepath, lxo or exception).
+
+    Results are yielded as they finish. If the pool can't be used, e.g.
+    because a worker can't start from a script run with --python, the
+    remaining files are parsed in this process.
+    """
+    import concurrent.futures
+    import multiprocessing
+
+    pending = list(filepaths)
+    if workers != 0 and len(pending) > 1:
+        context = multiprocessing.get_context('spawn')
+        # the workers import lxo_reader by its package path, the package is
+        # a stub there, see WORKER_SETUP
+        package = lxo_reader.__name__.rpartition('.')[0]
+        addon_dir = os.path.dirname(os.path.abspath(lxo_reader.__file__))
+        setup = {'package': package, 'addon_dir': addon_dir}
+        try:
+            with concurrent.futures.ProcessPoolExecutor(
+                    workers, mp_context=context, initializer=exec,
+                    initargs=(WORKER_SETUP, setup)) as pool:
+                futures = {pool.submit(lxo_reader.read_file, filepath,
+                                       load_geometry, item_filter): filepath
+                           for filepath in pending}
+                for future in concurrent.futures.as_completed(futures):
+                    filepath = futures[future]
+                    try:
+                        lxo = future.result()
+                    except concurrent.futures.process.BrokenProcessPool:
+                        raise
+                    except Exception as error:
+                        lxo = error
+                    pending.remove(filepath)
+                    yield filepath, lxo
+        except concurrent.futures.process.BrokenProcessPool:
+            print("LXO process pool failed, parsing remaining files here")
+
+    for filepath in pending:
+        try:
+            lxo = lxo_reader.read_file(filepath, load_geometry, item_filter,
+                                       reader=reader_session())
+        except Exception as error:
+            lxo = error
+        yield filepath, lxo
+
+
+def load_many(operator, context, filepaths,
+              workers=None,
+              axis_forward='-Z',
+              axis_up='Y',
+              global_scale=1.0,
+              ADD_SUBD_MOD=False,
+              LOAD_MATERIALS=False,
+              LOAD_HIDDEN=False,
+              CLEAN_IMPORT=False,
+              USE_EXISTING_MATERIALS=False,
+              SHARE_MESHES=True,
+              WRITE_PROFILE=False,
+              WRITE_TRACE=False,
+              PROXY=False,
+              ITEM_INCLUDE="",
+              ITEM_EXCLUDE="",
+              LOW_MEMORY=False,
+              MEMORY_BUDGET=0,
+              LOAD_ANIMATION=True):
+    """Import many files, each into its own collection.
+
+    Files are parsed in parallel (workers=0 parses in this process) and
+    built as they arrive. Materials are shared between all files.
+    """
+    filepaths = list(filepaths)
+    from bpy_extras.io_utils import axis_conversion
+    global_matrix = (Matrix.Scale(global_scale, 4) @
+                     axis_conversion(from_forward=axis_forward,
+                                     from_up=axis_up).to_4x4())
+
+    if CLEAN_IMPORT:
+        bpy.ops.wm.read_homefile(use_empty=True)
+    scene = bpy.context.scene
+    material_cache = {}
+    failed = 0
+    item_filter = lxo_reader.ItemFilter.from_strings(ITEM_INCLUDE, ITEM_EXCLUDE)
+    load_geometry = not (PROXY or LOW_MEMORY)
+    for filepath, lxo in parse_files(filepaths, workers, load_geometry, item_filter):
+        if isinstance(lxo, Exception):
+            failed += 1
+            message = f"Failed to read {filepath}: {lxo}"
+            if operator is not None:
+                operator.report({'WARNING'}, message)
+            print(message)
+            continue
+        collection_name = os.path.splitext(os.path.basename(filepath))[0]
+        collection = bpy.data.collections.new(collection_name)
+        scene.collection.children.link(collection)
+        # parsing happened in the pool, profile covers the build only
+        tracer = lxo_reader.ChromeTracer() if WRITE_TRACE else None
+        profile = ImportProfile(filepath, tracer)
+        build_objects(lxo, LOAD_MATERIALS, False, global_matrix,
+                      USE_EXISTING_MATERIALS, material_cache,
+                      add_subd_mod=ADD_SUBD_MOD, share_meshes=SHARE_MESHES,
+                      collection=collection, profile=profile,
+                      stream_geometry=LOW_MEMORY and not PROXY,
+                      memory_budget=MEMORY_BUDGET * 1024 * 1024 or None,
+                      load_animation=LOAD_ANIMATION)
+        del lxo
+        report_profile(operator, profile, WRITE_PROFILE)
+
+    if failed == len(filepaths):
+        return {"CANCELLED"}
+    return {"FINISHED"}
+
+
+def reimport(operator, context, filepath,
+             axis_forward='-Z',
+             axis_up='Y',
+             global_scale=1.0,
+             ADD_SUBD_MOD=False,
+             LOAD_MATERIALS=False,
+             USE_EXISTING_MATERIALS=True,
+             WRITE_PROFILE=False,
+             WRITE_TRACE=False,
+             MEMORY_BUDGET=0,
+             LOAD_ANIMATION=True,
+             **options):
+    """Update the objects of an earlier import of filepath.
+
+    Only layers whose chunks changed since the last import are decoded,
+    their meshes are rebuilt in place. Changed items are updated, new ones
+    added and objects of items gone from the file removed. Without objects
+    from an earlier import this is a normal load, other load options only
+    apply then.
+    """
+    from bpy_extras.io_utils import axis_conversion
+    filepath = os.path.abspath(filepath)
+    existing = {}
+    for ob in bpy.data.objects:
+        if ob.get("lxo_file") == filepath and "lxo_item" in ob:
+            existing[int(ob["lxo_item"])] = ob
+    if not existing:
+        return load(operator, context, filepath, axis_forward=axis_forward,
+                    axis_up=axis_up, global_scale=global_scale,
+                    ADD_SUBD_MOD=ADD_SUBD_MOD, LOAD_MATERIALS=LOAD_MATERIALS,
+                    USE_EXISTING_MATERIALS=USE_EXISTING_MATERIALS,
+                    WRITE_PROFILE=WRITE_PROFILE, WRITE_TRACE=WRITE_TRACE,
+                    MEMORY_BUDGET=MEMORY_BUDGET, LOAD_ANIMATION=LOAD_ANIMATION,
+                    **options)
+
+    global_matrix = (Matrix.Scale(global_scale, 4) @
+                     axis_conversion(from_forward=axis_forward,
+                                     from_up=axis_up).to_4x4())
+    tracer = lxo_reader.ChromeTracer() if WRITE_TRACE else None
+    profile = ImportProfile(filepath, tracer)
+    with profile.phase("parse", os.path.getsize(filepath)):
+        # geometry only for the changed layers, streamed by build_objects
+        lxo = reader_session().traced(tracer).read_from_file(filepath,
+                                                              load_geometry=False)
+
+    item_ids = {lxo_item.id for lxo_item in lxo.items}
+    collection = next(iter(existing.values())).users_collection[0]
+    for item_id, ob in list(existing.items()):
+        if item_id not in item_ids:
+            remove_children(ob, "lxo_prototype")
+            remove_children(ob, "lxo_curves")
+            bpy.data.objects.remove(ob)
+            del existing[item_id]
+        elif LOAD_ANIMATION and ob.animation_data is not None:
+            # the keys are written again from the envelopes
+            ob.animation_data_clear()
+
+    build_objects(lxo, LOAD_MATERIALS, False, global_matrix,
+                  USE_EXISTING_MATERIALS, add_subd_mod=ADD_SUBD_MOD,
+                  collection=collection, profile=profile,
+                  stream_geometry=True,
+                  memory_budget=MEMORY_BUDGET * 1024 * 1024 or None,
+                  load_animation=LOAD_ANIMATION, existing=existing)
+    del lxo
+    report_profile(operator, profile, WRITE_PROFILE)
+    return {"FINISHED"}
+
+
+# watched files and the mtime of their last reimport, see watch
+WATCHED = {}
+# timer function of each watched file
+WATCH_TIMERS = {}
+
+
+def watch(filepath, interval=1.0, **options):
+    """Reimport filepath whenever it changed, until unwatch.
+
+    A Blender timer checks the modification time every interval seconds
+    and waits for one more check without change, so a file still being
+    written is not read. options are passed on to reimport. The timer is
+    persistent, it keeps running when another .blend file is loaded. A
+    file already watched keeps its timer and options.
+    """
+    filepath = os.path.abspath(filepath)
+    timer = WATCH_TIMERS.get(filepath)
+    if timer is not None and bpy.app.timers.is_registered(timer):
+        return
+    WATCHED[filepath] = os.stat(filepath).st_mtime_ns
+    pending = [None]  # mtime seen at the last check
+
+    def check():
+        if filepath not in WATCHED:
+            return None
+        try:
+            mtime = os.stat(filepath).st_mtime_ns
+        except OSError:
+            return interval
+        if mtime == WATCHED[filepath] or mtime != pending[0]:
+            pending[0] = mtime
+            return interval
+        WATCHED[filepath] = mtime
+        try:
+            reimport(None, bpy.context, filepath, **options)
+        except Exception as error:
+            print(f"Reimport of {filepath} failed: {error}")
+        return interval
+
+    WATCH_TIMERS[filepath] = check
+    bpy.app.timers.register(check, first_interval=interval, persistent=True)
+
+
+def unwatch(filepath=None):
+    """Stop watching filepath, or all files."""
+    if filepath is None:
+        filepaths = list(WATCH_TIMERS)
+    else:
+        filepaths = [os.path.abspath(filepath)]
+    for filepath in filepaths:
+        WATCHED.pop(filepath, None)
+        timer = WATCH_TIMERS.pop(filepath, None)
+        if timer is not None and bpy.app.timers.is_registered(timer):
+            bpy.app.timers.unregister(timer)
@@ -0,0 +1,279 @@
+#!/usr/bin/python
+
+# MIT License
+
+# Copyright (c) 2020 Bernd Moeller
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# SQLite catalog of LXO file metadata, filled by LXOReader.probe.
+#
+#   python lxo_catalog.py library.db update /assets -j 8
+#   python lxo_catalog.py library.db query --type mesh --material "Wood*"
+
+import os
+import time
+import sqlite3
+import argparse
+import concurrent.futures
+
+try:
+    from . import lxo_reader
+except ImportError:
+    import lxo_reader
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    version INTEGER,
+    appversion TEXT,
+    probed REAL NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS layers (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    reference_id INTEGER,
+    name TEXT,
+    vert_count INTEGER,
+    poly_count INTEGER,
+    poly_count_estimate INTEGER,
+    min_x REAL, min_y REAL, min_z REAL,
+    max_x REAL, max_y REAL, max_z REAL
+);
+CREATE TABLE IF NOT EXISTS items (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    reference_id INTEGER,
+    name TEXT,
+    type TEXT,
+    parent_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS materials (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    tag TEXT
+);
+CREATE INDEX IF NOT EXISTS layers_file ON layers(file_id);
+CREATE INDEX IF NOT EXISTS items_file ON items(file_id);
+CREATE INDEX IF NOT EXISTS items_type ON items(type);
+CREATE INDEX IF NOT EXISTS items_name ON items(name);
+CREATE INDEX IF NOT EXISTS materials_file ON materials(file_id);
+CREATE INDEX IF NOT EXISTS materials_tag ON materials(tag);
+"""
+
+
+def probe_rows(filepath):
+    """Catalog rows of one file, (file, layers, items, materials).
+
+    Runs in the worker processes, so only plain tuples are returned.
+    Files that fail to parse get their error stored instead, any other
+    failure too, so one file can't stop a whole scan.
+    """
+    try:
+        lxo = lxo_reader.LXOReader().probe(filepath)
+    except (lxo_reader.LXOParseError, OSError, ValueError) as error:
+        return (None, None, str(error)), [], [], []
+    except Exception as error:
+        return (None, None, f"{type(error).__name__}: {error}"), [], [], []
+    layers = []
+    for layer in lxo.layers:
+        bbox_min, bbox_max = layer.bbox or ((None,) * 3, (None,) * 3)
+        layers.append((layer.reference_id, layer.name, layer.vert_count,
+                       layer.poly_count, layer.poly_count_estimate,
+                       *bbox_min, *bbox_max))
+    items = []
+    materials = []
+    for item in lxo.items:
+        items.append((item.id, item.vname or item.name, item.typename,
+                      item.graph_links.get('parent', (None, None))[0]))
+        if item.typename == 'mask' and item.channel.get('ptag'):
+            materials.append((item.channel['ptag'],))
+    return (lxo.version, lxo.appversion, None), layers, items, materials
+
+
+def scan(roots):
+    """(path, mtime_ns, size) of all .lxo files below roots."""
+    stack = [os.path.abspath(root) for root in roots]
+    while stack:
+        path = stack.pop()
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            yield path, stat.st_mtime_ns, stat.st_size
+            continue
+        try:
+            entries = os.scandir(path)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith('.lxo'):
+                    stat = entry.stat()
+                    yield entry.path, stat.st_mtime_ns, stat.st_size
+
+
+class LXOCatalog(object):
+    """Metadata of many LXO files, kept up to date incrementally.
+
+    update only probes files that are new or whose mtime or size changed
+    and drops files that are gone.
+    """
+
+    def __init__(self, db_path):
+        self.db = sqlite3.connect(db_path)
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def update(self, roots, workers: int = 0) -> tuple[int, int, int]:
+        """Scan roots for .lxo files and probe the changed ones.
+
+        workers is the number of probe processes, 0 probes in this
+        process, None uses all cores. Returns the counts of probed,
+        unchanged and removed files.
+        """
+        known = {path: (file_id, mtime_ns, size) for file_id, path, mtime_ns, size
+                 in self.db.execute("SELECT id, path, mtime_ns, size FROM files")}
+        roots = [os.path.abspath(root) for root in roots]
+        seen = set()
+        changed = []
+        for path, mtime_ns, size in scan(roots):
+            seen.add(path)
+            entry = known.get(path)
+            if entry is None or entry[1:] != (mtime_ns, size):
+                changed.append((path, mtime_ns, size))
+
+        if workers == 0 or len(changed) < 2:
+            results = map(probe_rows, [path for path, _, _ in changed])
+            self.__store(changed, results)
+        else:
+            with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+                results = pool.map(probe_rows, [path for path, _, _ in changed],
+                                   chunksize=32)
+                self.__store(changed, results)
+
+        gone = [(file_id,) for path, (file_id, _, _) in known.items()
+                if path not in seen and any(path.startswith(root + os.sep) or
+                                            path == root for root in roots)]
+        with self.db:
+            self.db.executemany("DELETE FROM files WHERE id = ?", gone)
+        return len(changed), len(seen) - len(changed), len(gone)
+
+    def __store(self, changed, results):
+        now = time.time()
+        with self.db:
+            for (path, mtime_ns, size), (header, layers, items, materials) in zip(changed, results):
+                self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+                file_id = self.db.execute(
+                    "INSERT INTO files (path, mtime_ns, size, version, appversion,"
+                    " probed, error) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (path, mtime_ns, size, *header[:2], now, header[2])).lastrowid
+                self.db.executemany("INSERT INTO layers VALUES (?, ?, ?, ?, ?, ?,"
+                                    " ?, ?, ?, ?, ?, ?)",
+                                    [(file_id, *row) for row in layers])
+                self.db.executemany("INSERT INTO items VALUES (?, ?, ?, ?, ?)",
+                                    [(file_id, *row) for row in items])
+                self.db.executemany("INSERT INTO materials VALUES (?, ?)",
+                                    [(file_id, *row) for row in set(materials)])
+
+    def find(self, name: str = None, item_type: str = None, material: str = None,
+             min_polys: int = None, max_polys: int = None) -> list[str]:
+        """Paths of the files matching all given conditions.
+
+        name, item_type and material are glob patterns (SQLite GLOB, case
+        sensitive), polygon limits apply to the sum over all layers.
+        """
+        query = ["SELECT path FROM files f WHERE error IS NULL"]
+        args = []
+        if name is not None or item_type is not None:
+            query.append("AND EXISTS (SELECT 1 FROM items i WHERE i.file_id = f.id")
+            if name is not None:
+                query.append("AND i.name GLOB ?")
+                args.append(name)
+            if item_type is not None:
+                query.append("AND i.type GLOB ?")
+                args.append(item_type)
+            query.append(")")
+        if material is not None:
+            query.append("AND EXISTS (SELECT 1 FROM materials m"
+                         " WHERE m.file_id = f.id AND m.tag GLOB ?)")
+            args.append(material)
+        if min_polys is not None or max_polys is not None:
+            query.append("AND (SELECT COALESCE(SUM(poly_count), 0) FROM layers l"
+                         " WHERE l.file_id = f.id) BETWEEN ? AND ?")
+            args += [min_polys or 0, max_polys if max_polys is not None else 2 ** 62]
+        query.append("ORDER BY path")
+        return [path for path, in self.db.execute(' '.join(query), args)]
+
+    def summary(self, path) -> dict:
+        """Everything the catalog knows about one file, None if unknown."""
+        row = self.db.execute("SELECT id, version, appversion, error FROM files"
+                              " WHERE path = ?", (os.path.abspath(path),)).fetchone()
+        if row is None:
+            return None
+        file_id, version, appversion, error = row
+        return {
+            'version': version, 'appversion': appversion, 'error': error,
+            'layers': [{'name': name, 'vert_count': verts, 'poly_count': polys,
+                        'poly_count_estimate': estimate}
+                       for name, verts, polys, estimate in self.db.execute(
+                           "SELECT name, vert_count, poly_count, poly_count_estimate"
+                           " FROM layers WHERE file_id = ?", (file_id,))],
+            'items': self.db.execute("SELECT type, COUNT(*) FROM items WHERE"
+                                     " file_id = ? GROUP BY type",
+                                     (file_id,)).fetchall(),
+            'materials': [tag for tag, in self.db.execute(
+                "SELECT tag FROM materials WHERE file_id = ? ORDER BY tag",
+                (file_id,))],
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Catalog of LXO file metadata.')
+    parser.add_argument("db", metavar="DB", help="SQLite catalog file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    update_parser = commands.add_parser("update", help="scan and probe changed files")
+    update_parser.add_argument("roots", nargs="+", metavar="PATH")
+    update_parser.add_argument("-j", "--workers", type=int, default=0,
+                               help="probe processes, -1 for all cores")
+    query_parser = commands.add_parser("query", help="list matching files")
+    query_parser.add_argument("--name")
+    query_parser.add_argument("--type", dest="item_type")
+    query_parser.add_argument("--material")
+    query_parser.add_argument("--min-polys", dest="min_polys", type=int)
+    query_parser.add_argument("--max-polys", dest="max_polys", type=int)
+    args = parser.parse_args()
+
+    catalog = LXOCatalog(args.db)
+    if args.command == "update":
+        start = time.perf_counter()
+        workers = None if args.workers < 0 else args.workers
+        probed, unchanged, removed = catalog.update(args.roots, workers)
+        print(f"probed {probed}, unchanged {unchanged}, removed {removed}"
+              f" in {time.perf_counter() - start:.2f}s")
+    else:
+        for path in catalog.find(args.name, args.item_type, args.material,
+                                 args.min_polys, args.max_polys):
+            print(path)
+    catalog.close()
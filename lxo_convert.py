@@ -0,0 +1,502 @@
+#!/usr/bin/python
+
+# MIT License
+
+# Copyright (c) 2020 Bernd Moeller
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Convert LXO files to binary glTF, OBJ or PLY without Blender.
+#
+#   python lxo_convert.py scene.lxo scene.glb
+#
+# or from python, with lxo_reader.py next to this file:
+#
+#   lxo_convert.convert("scene.lxo", "scene.obj", memory_budget=256 << 20)
+
+import os
+import sys
+import json
+import struct
+import shutil
+import tempfile
+import argparse
+from array import array
+from itertools import chain
+
+try:
+    from . import lxo_reader
+except ImportError:
+    import lxo_reader
+
+# glTF accessor component types and targets
+FLOAT = 5126
+UNSIGNED_INT = 5125
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+
+class MeshBuffers(object):
+    """Flat vertex arrays of a layer, ready to be written.
+
+    Points with discontinuous UVs or normals (VMAD) are split, so every
+    vertex has exactly one position, normal and UV. polygons index into
+    these vertices, material_index holds a slot of materials per polygon
+    (-1 for untagged).
+    """
+
+    def __init__(self, positions, normals, uvs, polygons, materials,
+                 material_index):
+        self.positions = positions
+        self.normals = normals
+        self.uvs = uvs
+        self.polygons = polygons
+        self.materials = materials
+        self.material_index = material_index
+
+    @property
+    def vertex_count(self):
+        return len(self.positions) // 3
+
+    def material_groups(self) -> dict[int, list]:
+        """Polygons per material slot, in slot order."""
+        groups = {}
+        for polygon, slot in zip(self.polygons, self.material_index):
+            groups.setdefault(slot, []).append(polygon)
+        return dict(sorted(groups.items()))
+
+
+def first_map(maps, disco_maps):
+    # like the importer, only the first map of each kind is used
+    names = sorted(set(maps) | set(disco_maps))
+    return names[0] if names else None
+
+
+def layer_buffers(lxo_layer: lxo_reader.LXOLayer, flip_z: bool = True) -> MeshBuffers:
+    """Vertex arrays of a layer with loaded geometry.
+
+    flip_z converts to the right-handed space the Blender importer uses,
+    z negated and the polygon winding reversed.
+    """
+    points = lxo_layer.points
+    count = len(points)
+    positions = array('f', chain.from_iterable(points))
+
+    uv_name = first_map(lxo_layer.uv_maps, lxo_layer.uv_maps_disco)
+    uvs = None
+    uv_disco = {}
+    if uv_name is not None:
+        uvs = array('f', bytes(8 * count))
+        for index, (u, v) in lxo_layer.uv_maps.get(uv_name, {}).items():
+            uvs[2 * index] = u
+            uvs[2 * index + 1] = v
+        uv_disco = lxo_layer.uv_maps_disco.get(uv_name, {})
+
+    normal_name = first_map(lxo_layer.vertex_normals,
+                            lxo_layer.vertex_normals_disco)
+    normals = None
+    normal_disco = {}
+    if normal_name is not None:
+        normals = array('f', bytes(12 * count))
+        for index, normal in lxo_layer.vertex_normals.get(normal_name, {}).items():
+            normals[3 * index:3 * index + 3] = array('f', normal)
+        normal_disco = lxo_layer.vertex_normals_disco.get(normal_name, {})
+
+    polygons = lxo_layer.polygons
+    if uv_disco or normal_disco:
+        polygons = list(polygons)
+        split = {}
+        for poly_index in sorted(set(uv_disco) | set(normal_disco)):
+            if poly_index >= len(polygons):
+                continue
+            uv_corners = uv_disco.get(poly_index, {})
+            normal_corners = normal_disco.get(poly_index, {})
+            polygon = polygons[poly_index] = list(polygons[poly_index])
+            for corner, point in enumerate(polygon):
+                uv = uv_corners.get(point)
+                normal = normal_corners.get(point)
+                if uv is None and normal is None:
+                    continue
+                key = (point, uv and tuple(uv), normal and tuple(normal))
+                vertex = split.get(key)
+                if vertex is None:
+                    vertex = split[key] = len(positions) // 3
+                    positions.extend(positions[3 * point:3 * point + 3])
+                    if uvs is not None:
+                        uvs.extend(uv if uv is not None else
+                                   uvs[2 * point:2 * point + 2])
+                    if normals is not None:
+                        normals.extend(normal if normal is not None else
+                                       normals[3 * point:3 * point + 3])
+                polygon[corner] = vertex
+
+    if flip_z:
+        positions[2::3] = array('f', [-z for z in positions[2::3]])
+        if normals is not None:
+            normals[2::3] = array('f', [-z for z in normals[2::3]])
+        polygons = [polygon[::-1] for polygon in polygons]
+
+    lxo_layer.generate_materials()
+    material_index = lxo_layer.material_index
+    if len(material_index) != len(polygons):
+        material_index = array('i', [-1]) * len(polygons)
+    return MeshBuffers(positions, normals, uvs, polygons,
+                       list(lxo_layer.materials), material_index)
+
+
+def flip_matrix(matrix):
+    # the same matrix in z flipped space, S @ matrix @ S with S = scale(1, 1, -1)
+    return tuple(-value if (index // 4 == 2) != (index % 4 == 2) else value
+                 for index, value in enumerate(matrix))
+
+
+def transform_points(matrix, values):
+    m = matrix
+    out = array('f', values)
+    xs, ys, zs = values[0::3], values[1::3], values[2::3]
+    for row in range(3):
+        a, b, c, d = m[row * 4:row * 4 + 4]
+        out[row::3] = array('f', [a * x + b * y + c * z + d
+                                  for x, y, z in zip(xs, ys, zs)])
+    return out
+
+
+def normal_matrix(matrix):
+    # cofactor of the upper 3x3, the inverse transpose up to a scale factor
+    (a, b, c, _, d, e, f, _, g, h, i, _) = matrix[:12]
+    cofactor = (e * i - f * h, f * g - d * i, d * h - e * g, 0.0,
+                c * h - b * i, a * i - c * g, b * g - a * h, 0.0,
+                b * f - c * e, c * d - a * f, a * e - b * d, 0.0,
+                0.0, 0.0, 0.0, 1.0)
+    if a * cofactor[0] + b * cofactor[1] + c * cofactor[2] < 0:
+        cofactor = tuple(-value for value in cofactor[:12]) + cofactor[12:]
+    return cofactor
+
+
+def little_endian(values: array) -> bytes:
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+class GLBWriter(object):
+    """Binary glTF with one mesh per layer and a node per locator.
+
+    The binary chunk is spooled to a temporary file, only the JSON part
+    is kept in memory.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.buffer = tempfile.TemporaryFile()
+        self.gltf = {'asset': {'version': '2.0', 'generator': 'lxo_convert'},
+                     'scenes': [{'nodes': []}], 'scene': 0, 'nodes': [],
+                     'meshes': [], 'materials': [], 'accessors': [],
+                     'bufferViews': []}
+        self.material_slots = {}
+        self.node_index = {}
+
+    def add_view(self, data: bytes, target):
+        offset = self.buffer.tell()
+        self.buffer.write(data)
+        self.buffer.write(b'\0' * (-len(data) % 4))
+        self.gltf['bufferViews'].append({'buffer': 0, 'byteOffset': offset,
+                                         'byteLength': len(data),
+                                         'target': target})
+        return len(self.gltf['bufferViews']) - 1
+
+    def add_accessor(self, values: array, component_type, accessor_type,
+                     target, bounds=False):
+        width = {'SCALAR': 1, 'VEC2': 2, 'VEC3': 3}[accessor_type]
+        accessor = {'bufferView': self.add_view(little_endian(values), target),
+                    'componentType': component_type,
+                    'count': len(values) // width, 'type': accessor_type}
+        if bounds and len(values):
+            accessor['min'] = [min(values[axis::width]) for axis in range(width)]
+            accessor['max'] = [max(values[axis::width]) for axis in range(width)]
+        self.gltf['accessors'].append(accessor)
+        return len(self.gltf['accessors']) - 1
+
+    def material(self, name):
+        slot = self.material_slots.get(name)
+        if slot is None:
+            slot = self.material_slots[name] = len(self.gltf['materials'])
+            self.gltf['materials'].append({'name': name})
+        return slot
+
+    def add_nodes(self, lxo: lxo_reader.LXOFile, items: dict, flip_z: bool):
+        local_matrices, _ = lxo.resolve_matrices()
+        nodes = self.gltf['nodes']
+        for item_id, parent_id in lxo.hierarchy():
+            item = items[item_id]
+            node = {'name': item.vname or item.name}
+            matrix = local_matrices.get(item_id, lxo_reader.IDENTITY_MATRIX)
+            if matrix != lxo_reader.IDENTITY_MATRIX:
+                if flip_z:
+                    matrix = flip_matrix(matrix)
+                # glTF matrices are column-major
+                node['matrix'] = [matrix[row * 4 + column]
+                                  for column in range(4) for row in range(4)]
+            self.node_index[item_id] = len(nodes)
+            nodes.append(node)
+            if parent_id is None:
+                self.gltf['scenes'][0]['nodes'].append(len(nodes) - 1)
+            else:
+                nodes[self.node_index[parent_id]].setdefault(
+                    'children', []).append(len(nodes) - 1)
+
+    def add_layer(self, lxo_layer: lxo_reader.LXOLayer, buffers: MeshBuffers,
+                  world_matrix):
+        attributes = {'POSITION': self.add_accessor(buffers.positions, FLOAT,
+                                                    'VEC3', ARRAY_BUFFER,
+                                                    bounds=True)}
+        if buffers.normals is not None:
+            attributes['NORMAL'] = self.add_accessor(buffers.normals, FLOAT,
+                                                     'VEC3', ARRAY_BUFFER)
+        if buffers.uvs is not None:
+            # glTF has the UV origin at the top left
+            uvs = array('f', buffers.uvs)
+            uvs[1::2] = array('f', [1.0 - v for v in uvs[1::2]])
+            attributes['TEXCOORD_0'] = self.add_accessor(uvs, FLOAT, 'VEC2',
+                                                         ARRAY_BUFFER)
+        primitives = []
+        for slot, polygons in buffers.material_groups().items():
+            # fan triangulation
+            indices = array('I', chain.from_iterable(
+                (polygon[0], polygon[corner], polygon[corner + 1])
+                for polygon in polygons for corner in range(1, len(polygon) - 1)))
+            if not indices:
+                continue
+            primitive = {'attributes': attributes,
+                         'indices': self.add_accessor(indices, UNSIGNED_INT,
+                                                      'SCALAR',
+                                                      ELEMENT_ARRAY_BUFFER)}
+            if slot >= 0:
+                primitive['material'] = self.material(buffers.materials[slot])
+            primitives.append(primitive)
+        if not primitives:
+            return
+        self.gltf['meshes'].append({'name': lxo_layer.name,
+                                    'primitives': primitives})
+        mesh_index = len(self.gltf['meshes']) - 1
+        node = self.node_index.get(lxo_layer.reference_id)
+        if node is None:
+            self.gltf['nodes'].append({'name': lxo_layer.name, 'mesh': mesh_index})
+            self.gltf['scenes'][0]['nodes'].append(len(self.gltf['nodes']) - 1)
+        elif 'mesh' in self.gltf['nodes'][node]:
+            # more than one layer for an item, add them as children
+            self.gltf['nodes'].append({'name': lxo_layer.name, 'mesh': mesh_index})
+            self.gltf['nodes'][node].setdefault('children', []).append(
+                len(self.gltf['nodes']) - 1)
+        else:
+            self.gltf['nodes'][node]['mesh'] = mesh_index
+
+    def finish(self):
+        bin_size = self.buffer.tell()
+        if bin_size:
+            self.gltf['buffers'] = [{'byteLength': bin_size}]
+        gltf = {key: value for key, value in self.gltf.items() if value != []}
+        json_data = json.dumps(gltf, separators=(',', ':')).encode()
+        json_data += b' ' * (-len(json_data) % 4)
+        total = 12 + 8 + len(json_data) + (8 + bin_size if bin_size else 0)
+        with open(self.filepath, 'wb') as out:
+            out.write(struct.pack('<4sII', b'glTF', 2, total))
+            out.write(struct.pack('<I4s', len(json_data), b'JSON'))
+            out.write(json_data)
+            if bin_size:
+                out.write(struct.pack('<I4s', bin_size, b'BIN\0'))
+                self.buffer.seek(0)
+                shutil.copyfileobj(self.buffer, out)
+        self.buffer.close()
+
+
+class OBJWriter(object):
+    """Wavefront OBJ, one object per layer in world space, with a .mtl."""
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.out = open(filepath, 'w')
+        self.materials = []
+        self.mtl_path = os.path.splitext(filepath)[0] + '.mtl'
+        self.out.write("# lxo_convert\nmtllib %s\n" % os.path.basename(self.mtl_path))
+        self.vertex_offset = 1
+
+    def add_nodes(self, lxo, items, flip_z):
+        pass
+
+    def add_layer(self, lxo_layer, buffers: MeshBuffers, world_matrix):
+        out = self.out
+        out.write("o %s\n" % lxo_layer.name.replace(' ', '_'))
+        positions = transform_points(world_matrix, buffers.positions)
+        out.write(''.join("v %.6g %.6g %.6g\n" % vertex for vertex in
+                          zip(positions[0::3], positions[1::3], positions[2::3])))
+        corner = "%d"
+        if buffers.uvs is not None:
+            out.write(''.join("vt %.6g %.6g\n" % uv for uv in
+                              zip(buffers.uvs[0::2], buffers.uvs[1::2])))
+            corner = "%d/%d"
+        if buffers.normals is not None:
+            normals = transform_points(normal_matrix(world_matrix), buffers.normals)
+            out.write(''.join("vn %.6g %.6g %.6g\n" % normal for normal in
+                              zip(normals[0::3], normals[1::3], normals[2::3])))
+            corner = "%d/%d/%d" if buffers.uvs is not None else "%d//%d"
+        width = corner.count('%d')
+        offset = self.vertex_offset
+        for slot, polygons in buffers.material_groups().items():
+            name = buffers.materials[slot] if slot >= 0 else 'Default'
+            if name not in self.materials:
+                self.materials.append(name)
+            out.write("usemtl %s\n" % name.replace(' ', '_'))
+            out.write(''.join(
+                "f %s\n" % ' '.join(corner % ((index + offset,) * width)
+                                    for index in polygon)
+                for polygon in polygons))
+        self.vertex_offset += buffers.vertex_count
+
+    def finish(self):
+        self.out.close()
+        with open(self.mtl_path, 'w') as mtl:
+            for name in self.materials:
+                mtl.write("newmtl %s\nKd 0.8 0.8 0.8\n" % name.replace(' ', '_'))
+
+
+class PLYWriter(object):
+    """Binary PLY, all layers merged in world space.
+
+    Every vertex has a normal and UV (zero where the layer has none), faces
+    carry the index into the material comments of the header.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.vertices = tempfile.TemporaryFile()
+        self.faces = tempfile.TemporaryFile()
+        self.vertex_count = 0
+        self.face_count = 0
+        self.materials = []
+
+    def add_nodes(self, lxo, items, flip_z):
+        pass
+
+    def add_layer(self, lxo_layer, buffers: MeshBuffers, world_matrix):
+        count = buffers.vertex_count
+        vertices = array('f', bytes(32 * count))
+        positions = transform_points(world_matrix, buffers.positions)
+        for axis in range(3):
+            vertices[axis::8] = positions[axis::3]
+        if buffers.normals is not None:
+            normals = transform_points(normal_matrix(world_matrix), buffers.normals)
+            for axis in range(3):
+                vertices[3 + axis::8] = normals[axis::3]
+        if buffers.uvs is not None:
+            vertices[6::8] = buffers.uvs[0::2]
+            vertices[7::8] = buffers.uvs[1::2]
+        self.vertices.write(little_endian(vertices))
+
+        slots = []
+        for name in buffers.materials:
+            if name not in self.materials:
+                self.materials.append(name)
+            slots.append(self.materials.index(name))
+        offset = self.vertex_count
+        faces = array('i', chain.from_iterable(
+            (len(polygon), *[index + offset for index in polygon],
+             slots[slot] if slot >= 0 else -1)
+            for polygon, slot in zip(buffers.polygons, buffers.material_index)))
+        self.faces.write(little_endian(faces))
+        self.vertex_count += count
+        self.face_count += len(buffers.polygons)
+
+    def finish(self):
+        header = ["ply", "format binary_little_endian 1.0", "comment lxo_convert"]
+        header += ["comment material %d %s" % material
+                   for material in enumerate(self.materials)]
+        header += ["element vertex %d" % self.vertex_count]
+        header += ["property float %s" % name
+                   for name in ('x', 'y', 'z', 'nx', 'ny', 'nz', 's', 't')]
+        header += ["element face %d" % self.face_count,
+                   "property list int int vertex_indices",
+                   "property int material_index", "end_header", ""]
+        with open(self.filepath, 'wb') as out:
+            out.write('\n'.join(header).encode())
+            for spool in (self.vertices, self.faces):
+                spool.seek(0)
+                shutil.copyfileobj(spool, out)
+                spool.close()
+
+
+WRITERS = {'glb': GLBWriter, 'obj': OBJWriter, 'ply': PLYWriter}
+
+
+def convert(filepath, out_path, out_format: str = None, memory_budget: int = None,
+            flip_z: bool = True, item_filter: lxo_reader.ItemFilter = None,
+            reader: lxo_reader.LXOReader = None):
+    """Convert a LXO file to glb, obj or ply, by default from the extension.
+
+    The geometry is read and written one layer at a time, memory_budget
+    (bytes) allows reading ahead like LXOReader.iter_layer_geometry.
+    """
+    out_format = (out_format or os.path.splitext(out_path)[1][1:]).lower()
+    if out_format not in WRITERS:
+        raise ValueError("unknown format %r, use one of %s"
+                         % (out_format, ', '.join(WRITERS)))
+    if reader is None:
+        reader = lxo_reader.LXOReader()
+    if item_filter:
+        lxo = reader.read_filtered(filepath, item_filter, load_geometry=False)
+    else:
+        lxo = reader.read_from_file(filepath, load_geometry=False)
+    items = {item.id: item for item in lxo.items}
+    _, world_matrices = lxo.resolve_matrices()
+    layers = [layer for layer in lxo.layers
+              if layer.reference_id not in lxo.skipped_items]
+
+    writer = WRITERS[out_format](out_path)
+    writer.add_nodes(lxo, items, flip_z)
+    for layer in reader.iter_layer_geometry(filepath, layers, memory_budget):
+        world_matrix = world_matrices.get(layer.reference_id,
+                                          lxo_reader.IDENTITY_MATRIX)
+        if flip_z:
+            world_matrix = flip_matrix(world_matrix)
+        writer.add_layer(layer, layer_buffers(layer, flip_z), world_matrix)
+    writer.finish()
+    return out_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert LXO to glTF (glb), OBJ or PLY.')
+    parser.add_argument("source_file", metavar="FILE")
+    parser.add_argument("out_file", metavar="OUT",
+                        help="output file, the extension picks the format")
+    parser.add_argument("-f", "--format", choices=sorted(WRITERS),
+                        help="output format if not given by the extension")
+    parser.add_argument("-m", "--memory-budget", dest="memory_budget", type=int,
+                        help="MB of geometry to read ahead")
+    parser.add_argument("--no-flip-z", dest="flip_z", action="store_false",
+                        help="keep the LXO coordinates and polygon winding")
+    parser.add_argument("--include", default="",
+                        help="comma separated item patterns to convert")
+    parser.add_argument("--exclude", default="",
+                        help="comma separated item patterns to leave out")
+    args = parser.parse_args()
+
+    budget = args.memory_budget << 20 if args.memory_budget else None
+    convert(args.source_file, args.out_file, args.format, budget, args.flip_z,
+            lxo_reader.ItemFilter.from_strings(args.include, args.exclude))
@@ -0,0 +1,167 @@
+#!/usr/bin/python
+
+# MIT License
+
+# Copyright (c) 2020 Bernd Moeller
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+# Fuzz driver for the validating parse modes of lxo_reader.
+#
+# Every seed file is truncated, byte flipped and given broken chunk sizes,
+# each variant is read with validate and with recover. validate may only
+# raise LXOParseError, recover only for a broken FORM header, and no read
+# may take longer than the timeout. Failing variants are written to the output directory.
+#
+#   python lxo_fuzz.py                      # seeds in fuzz_seeds/
+#   python lxo_fuzz.py scene.lxo -n 5000 --out fuzz_failures
+
+import os
+import sys
+import time
+import random
+import struct
+import argparse
+import tempfile
+import threading
+
+try:
+    from . import lxo_reader
+except ImportError:
+    import lxo_reader
+
+SEED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fuzz_seeds')
+
+
+def chunk_headers(data: bytes) -> list[int]:
+    # offsets of the size fields of the FORM and its top level chunks
+    offsets = [4]
+    offset = 12
+    while offset + 8 <= len(data):
+        offsets.append(offset + 4)
+        size = struct.unpack_from('>L', data, offset + 4)[0]
+        offset += 8 + size + (size & 1)
+    return offsets
+
+
+def truncate(data: bytes, rng: random.Random) -> bytes:
+    return data[:rng.randrange(len(data))]
+
+
+def flip_bytes(data: bytes, rng: random.Random) -> bytes:
+    mutated = bytearray(data)
+    for _ in range(rng.randint(1, 8)):
+        mutated[rng.randrange(len(mutated))] = rng.randrange(256)
+    return bytes(mutated)
+
+
+def break_size(data: bytes, rng: random.Random) -> bytes:
+    mutated = bytearray(data)
+    offset = rng.choice(chunk_headers(data))
+    size = struct.unpack_from('>L', mutated, offset)[0]
+    size = rng.choice((0, 1, size + 1, size - 2, size * 2, 0xFFFFFFFF,
+                       rng.randrange(1 << 32)))
+    struct.pack_into('>L', mutated, offset, max(size, 0) & 0xFFFFFFFF)
+    return bytes(mutated)
+
+
+MUTATIONS = (truncate, flip_bytes, break_size)
+
+
+def read_variant(filepath, mode: str):
+    """The exception a read raises that the mode does not allow, or None."""
+    try:
+        lxo_reader.LXOReader().read_from_file(filepath, validate=True,
+                                              recover=mode == 'recover')
+    except lxo_reader.LXOParseError as error:
+        # nothing to recover without a FORM header
+        if mode == 'recover' and error.chunk_path not in ('', 'FORM'):
+            return error
+    except Exception as error:
+        return error
+    return None
+
+
+def run_with_timeout(filepath, mode: str, timeout: float):
+    # (error, seconds), error 'timeout' if the read did not finish
+    result = []
+    start = time.perf_counter()
+    thread = threading.Thread(target=lambda: result.append(read_variant(filepath, mode)),
+                              daemon=True)
+    thread.start()
+    thread.join(timeout)
+    seconds = time.perf_counter() - start
+    if thread.is_alive():
+        return 'timeout', seconds
+    return result[0], seconds
+
+
+def fuzz(seeds, iterations: int = 500, seed: int = 0, timeout: float = 5.0,
+         out_dir: str = None) -> int:
+    """Read iterations variants of every seed file, return the failures."""
+    rng = random.Random(seed)
+    failures = 0
+    slowest = 0.0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        variant_path = os.path.join(tmp_dir, 'variant.lxo')
+        for seed_path in seeds:
+            with open(seed_path, 'rb') as seed_file:
+                data = seed_file.read()
+            for index in range(iterations):
+                mutation = rng.choice(MUTATIONS)
+                variant = mutation(data, rng) if data else data
+                with open(variant_path, 'wb') as variant_file:
+                    variant_file.write(variant)
+                for mode in ('validate', 'recover'):
+                    error, seconds = run_with_timeout(variant_path, mode, timeout)
+                    slowest = max(slowest, seconds)
+                    if error is None:
+                        continue
+                    failures += 1
+                    name = f"{os.path.basename(seed_path)}.{index}.{mutation.__name__}.lxo"
+                    print(f"{name} {mode}: {type(error).__name__ if error != 'timeout' else ''} {error}")
+                    if out_dir:
+                        os.makedirs(out_dir, exist_ok=True)
+                        with open(os.path.join(out_dir, name), 'wb') as failed_file:
+                            failed_file.write(variant)
+                    if error == 'timeout':
+                        # the reading thread can't be stopped
+                        print(f"{failures} failures, stopped at a hanging read")
+                        return failures
+    print(f"{len(seeds)} seeds, {iterations} variants each, {failures} failures, "
+          f"slowest read {slowest * 1000:.1f} ms")
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fuzz the validating LXO parse modes.')
+    parser.add_argument("seeds", nargs='*', metavar="FILE",
+                        help="seed files, default all files in fuzz_seeds/")
+    parser.add_argument("-n", "--iterations", type=int, default=500,
+                        help="variants per seed file")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--timeout", type=float, default=5.0,
+                        help="seconds after which a read counts as hanging")
+    parser.add_argument("--out", metavar="DIR", help="write failing variants to DIR")
+    args = parser.parse_args()
+
+    seeds = args.seeds or sorted(os.path.join(SEED_DIR, name)
+                                 for name in os.listdir(SEED_DIR))
+    sys.exit(1 if fuzz(seeds, args.iterations, args.seed, args.timeout, args.out) else 0)
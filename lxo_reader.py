@@ -23,19 +23,43 @@
 # SOFTWARE.
 
 import os
+import sys
+import copy
+import math
+import time
 import struct
-import pprint
-import argparse
-
-try:
-    from termcolor import colored
-except ModuleNotFoundError:
-    def colored(out, color):
-        return out
+import functools
+import queue
+import threading
+import hashlib
+from array import array
+from itertools import accumulate, chain, islice, repeat
 
 global DEBUG
 DEBUG = False
 
+# limits of the caches of a LXOReader
+STRING_POOL_SIZE = 65536
+ITEM_INDEX_CACHE_SIZE = 32
+
+# decoders of the fixed size types, compiled once
+U1 = struct.Struct('>B')
+U14 = struct.Struct('>4B')
+U2 = struct.Struct('>H')
+U4 = struct.Struct('>L')
+I2 = struct.Struct('>h')
+I4 = struct.Struct('>l')
+F4 = struct.Struct('>f')
+
+
+def colored(out, color):
+    # termcolor is only needed for debug output, so it is imported here
+    try:
+        from termcolor import colored as termcolor_colored
+    except ModuleNotFoundError:
+        return out
+    return termcolor_colored(out, color)
+
 # The following website was used to get nearly all information
 # about the LXO file format:
 # https://modosdk.foundry.com/wiki/File_Formats
@@ -44,6 +68,94 @@ sENCODINGS = ['System Default', 'ANSI', 'UTF-8', 'Shift-JIS (Japanese)',
               'EUC-JP (Japanese)', 'EUC-KR (Korea KS C 5601)',
               'GB2312 (Simplified Chinese)', 'BIG5 (Traditional Chinese)']
 
+# chunks following a LAYR chunk that belong to that layer
+GEOMETRY_CHUNKS = {'PNTS', 'POLS', 'VMAP', 'VMAD', 'PTAG', 'BBOX'}
+# metadata chunks and ITEM subchunks read by LXOReader.probe, geometry
+# chunks are only counted
+PROBE_CHUNKS = {'VRSN', 'APPV', 'ENCO', 'TAGS', 'LAYR', 'BBOX', 'ITEM',
+                'ITEMLINK', 'ITEMLAYR', 'ITEMVNAM', 'ITEMCHNS'}
+# rough size of decoded geometry (python lists) relative to its chunk size
+DECODED_SIZE_FACTOR = 10
+
+
+class LXOParseError(Exception):
+    """A malformed or truncated file, offset is the start of the chunk."""
+
+    def __init__(self, message, offset=None, chunk_path=()):
+        self.message = message
+        self.offset = offset
+        self.chunk_path = '/'.join(chunk_path)
+        super().__init__(self.message)
+
+    def __str__(self):
+        return "%s at offset %s in %s" % (self.message, self.offset,
+                                          self.chunk_path or 'FORM')
+
+
+# errors of malformed data while decoding a chunk
+PARSE_ERRORS = (struct.error, IndexError, KeyError, LXOParseError)
+
+# 4x4 matrices are row-major flat tuples, translation in the last column
+IDENTITY_MATRIX = (1.0, 0.0, 0.0, 0.0,
+                   0.0, 1.0, 0.0, 0.0,
+                   0.0, 0.0, 1.0, 0.0,
+                   0.0, 0.0, 0.0, 1.0)
+
+
+def matrix_multiply(a, b):
+    return tuple(a[r] * b[c] + a[r + 1] * b[c + 4] +
+                 a[r + 2] * b[c + 8] + a[r + 3] * b[c + 12]
+                 for r in (0, 4, 8, 12) for c in (0, 1, 2, 3))
+
+
+def channel_vector(lxo_item, name, default):
+    try:
+        data = lxo_item.CHNV[name]
+    except KeyError:
+        # TODO: verify this fix
+        return default
+    return (data[0][1], data[1][1], data[2][1])
+
+
+def transform_matrix(lxo_item):
+    """Matrix of a translation, rotation or scale item."""
+    if lxo_item.typename == "translation":
+        x, y, z = channel_vector(lxo_item, 'pos', (0.0, 0.0, 0.0))
+        return (1.0, 0.0, 0.0, x,
+                0.0, 1.0, 0.0, y,
+                0.0, 0.0, 1.0, z,
+                0.0, 0.0, 0.0, 1.0)
+    elif lxo_item.typename == "scale":
+        x, y, z = channel_vector(lxo_item, 'scl', (1.0, 1.0, 1.0))
+        return (x, 0.0, 0.0, 0.0,
+                0.0, y, 0.0, 0.0,
+                0.0, 0.0, z, 0.0,
+                0.0, 0.0, 0.0, 1.0)
+    elif lxo_item.typename == "rotation":
+        # TODO read euler order from item, ZXY means Ry @ Rx @ Rz
+        x, y, z = channel_vector(lxo_item, 'rot', (0.0, 0.0, 0.0))
+        cx, sx = math.cos(x), math.sin(x)
+        cy, sy = math.cos(y), math.sin(y)
+        cz, sz = math.cos(z), math.sin(z)
+        rot_x = (1.0, 0.0, 0.0, 0.0, 0.0, cx, -sx, 0.0,
+                 0.0, sx, cx, 0.0, 0.0, 0.0, 0.0, 1.0)
+        rot_y = (cy, 0.0, sy, 0.0, 0.0, 1.0, 0.0, 0.0,
+                 -sy, 0.0, cy, 0.0, 0.0, 0.0, 0.0, 1.0)
+        rot_z = (cz, -sz, 0.0, 0.0, sz, cz, 0.0, 0.0,
+                 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0)
+        return matrix_multiply(rot_y, matrix_multiply(rot_x, rot_z))
+    return IDENTITY_MATRIX
+
+
+def transform_bbox(matrix, bbox):
+    """Axis aligned box around the transformed corners of bbox."""
+    (x0, y0, z0), (x1, y1, z1) = bbox
+    corners = [(x, y, z) for x in (x0, x1) for y in (y0, y1) for z in (z0, z1)]
+    transformed = [[matrix[r] * x + matrix[r + 1] * y + matrix[r + 2] * z + matrix[r + 3]
+                    for x, y, z in corners] for r in (0, 4, 8)]
+    return ([min(values) for values in transformed],
+            [max(values) for values in transformed])
+
 
 class LXOLayer(object):
     def __init__(self, parent, name, subd_level, psub_level, id):
@@ -54,30 +166,268 @@ class LXOLayer(object):
         self.psub_level = psub_level
         self.vert_count = 0
         self.poly_count = 0
-        self.vmaps = None
+        # polygons of poly_count that are guessed from a POLS chunk size,
+        # for files read without geometry, see LXOReader.count_polygons
+        self.poly_count_estimate = 0
+        # VertexMaps of all other types, by type and name
+        self.vmaps: dict[str, dict[str, VertexMap]] = {}
+        self.vmads: dict[str, dict[str, VertexMap]] = {}
         self.reference_id = id
         self.points = []
         self.polygons = []
-        self.ptags = {}
-        self.materials: dict[str, list] = {}
+        # first polygon index of the most recent POLS chunk, PTAG polygon
+        # indices are relative to it. None for unsupported polygon types.
+        self.pols_offset = 0
+        # per polygon tag indices (-1 for untagged) for each PTAG type
+        self.ptags: dict[str, array] = {}
+        # material slot names and per polygon slot index
+        self.materials: list[str] = []
+        self.material_index = array('i')
         self.uv_maps = {}
         self.uv_maps_disco = {}
         self.vertex_normals = {}
         self.vertex_normals_disco = {}
+        # CurveSets of the non-face polygon types, by type
+        self.curves: dict[str, CurveSet] = {}
+        self.bbox = None  # (min_xyz, max_xyz)
+        self.points_span = None  # (offset, size) of PNTS, if not loaded
+        # file offsets [start, end] of the geometry chunks of this layer
+        self.geometry_span = None
+        self.geometry_loaded = True
 
     @property
     def parent(self):
         return self.__parent
 
+    def add_ptags(self, tag_type: str, poly_indices: array, tag_indices: array):
+        if self.pols_offset is None:
+            # tags for polygon types we don't read
+            return
+        tags = self.ptags.get(tag_type)
+        if tags is None:
+            tags = self.ptags[tag_type] = array('i')
+        missing = len(self.polygons) - len(tags)
+        if missing > 0:
+            tags.extend(repeat(-1, missing))
+        offset = self.pols_offset
+        for poly_index, tag_index in zip(poly_indices, tag_indices):
+            tags[poly_index + offset] = tag_index
+
+    def ptag_table(self, tag_type: str) -> tuple[list[str], array]:
+        """Remap the tags of a PTAG type to a layer local list of names.
+
+        Returns the names in order of first use and an array with the index
+        into that list for every polygon, -1 for untagged polygons.
+        """
+        names = []
+        indices = array('i', repeat(-1, len(self.polygons)))
+        tags = self.ptags.get(tag_type)
+        if tags is None:
+            return names, indices
+        remap = {}
+        tagnames = self.parent.tagnames
+        for poly_index, tag_index in enumerate(tags):
+            if tag_index < 0:
+                continue
+            local_index = remap.get(tag_index)
+            if local_index is None:
+                local_index = remap[tag_index] = len(names)
+                names.append(tagnames[tag_index])
+            indices[poly_index] = local_index
+        return names, indices
+
+    def fingerprint(self) -> str:
+        """Hash of the decoded geometry, equal for layers with equal content.
+
+        Covers points, polygons, all vertex maps, polygon tags (by name) and
+        the SubD flag.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(b'SUBD' if self.is_subd else b'FACE')
+        digest.update(array('f', chain.from_iterable(self.points)).tobytes())
+        digest.update(array('L', map(len, self.polygons)).tobytes())
+        digest.update(array('L', chain.from_iterable(self.polygons)).tobytes())
+        for vmaps in (self.uv_maps, self.vertex_normals):
+            for name in sorted(vmaps):
+                digest.update(name.encode())
+                values = vmaps[name]
+                digest.update(array('L', values.keys()).tobytes())
+                digest.update(array('f', chain.from_iterable(values.values())).tobytes())
+        for vmads in (self.uv_maps_disco, self.vertex_normals_disco):
+            for name in sorted(vmads):
+                digest.update(name.encode())
+                for poly_index, values in vmads[name].items():
+                    digest.update(array('L', (poly_index, *values.keys())).tobytes())
+                    digest.update(array('f', chain.from_iterable(values.values())).tobytes())
+        for vmaps in (self.vmaps, self.vmads):
+            for map_type in sorted(vmaps):
+                for name, vmap in sorted(vmaps[map_type].items()):
+                    digest.update((map_type + name).encode())
+                    digest.update(vmap.indices.tobytes())
+                    digest.update(vmap.values.tobytes())
+                    if vmap.poly_indices is not None:
+                        digest.update(vmap.poly_indices.tobytes())
+        for tag_type in sorted(self.ptags):
+            names, indices = self.ptag_table(tag_type)
+            digest.update(tag_type.encode() + '\0'.join(names).encode())
+            digest.update(indices.tobytes())
+        for poly_type in sorted(self.curves):
+            curves = self.curves[poly_type]
+            digest.update(poly_type.encode())
+            digest.update(curves.offsets.tobytes())
+            digest.update(curves.indices.tobytes())
+            digest.update(curves.flags.tobytes())
+        return digest.hexdigest()
+
+    def release_geometry(self):
+        """Drop the decoded geometry, it can be read again with
+        LXOReader.read_layer_geometry."""
+        self.points = []
+        self.polygons = []
+        self.ptags = {}
+        self.material_index = array('i')
+        self.uv_maps = {}
+        self.uv_maps_disco = {}
+        self.vertex_normals = {}
+        self.vertex_normals_disco = {}
+        self.vmaps = {}
+        self.vmads = {}
+        self.curves = {}
+        self.geometry_loaded = False
+
     def generate_materials(self):
         if 'MATR' not in self.ptags:
             return
-        for data in self.ptags['MATR']:
-            poly_index, tag_index = data
-            material_name = self.parent.tagnames[tag_index]
-            if material_name not in self.materials:
-                self.materials[material_name] = []
-            self.materials[material_name].append(poly_index)
+        self.materials, self.material_index = self.ptag_table('MATR')
+
+
+class VertexMap(object):
+    """A VMAP or VMAD of any type (WGHT, MORF, SPOT, RGB, RGBA, PICK, ...).
+
+    values holds dimension floats per entry of indices, VMADs also have the
+    polygon of each entry in poly_indices.
+    """
+
+    def __init__(self, map_type, name, dimension, indices: array,
+                 values: array, poly_indices: array = None):
+        self.map_type = map_type
+        self.name = name
+        self.dimension = dimension
+        self.indices = indices
+        self.values = values
+        self.poly_indices = poly_indices
+
+    def rows(self):
+        return zip(*[iter(self.values)] * self.dimension)
+
+    def as_dict(self) -> dict:
+        # {point: values}, the layout of uv_maps and vertex_normals
+        return dict(zip(self.indices, self.rows()))
+
+    def disco_dict(self) -> dict:
+        # {polygon: {point: values}}, see uv_maps_disco
+        values = {}
+        for poly_index, vert_index, row in zip(self.poly_indices, self.indices,
+                                               self.rows()):
+            if poly_index in values:
+                values[poly_index][vert_index] = row
+            else:
+                values[poly_index] = {vert_index: row}
+        return values
+
+
+class CurveSet(object):
+    """The polygons of a non-face type (CURV, BEZR, LINE, ...) of a layer.
+
+    Flat arrays instead of a list per curve: the point indices of curve n
+    are indices[offsets[n]:offsets[n + 1]], flags holds the high 6 bits of
+    its vertex count (the continuity flags of CURV).
+    """
+
+    def __init__(self, poly_type):
+        self.poly_type = poly_type
+        self.offsets = array('i', [0])
+        self.indices = array('i')
+        self.flags = array('H')
+
+    def __len__(self):
+        return len(self.flags)
+
+    def extend(self, counts: array, indices: array, flags: array):
+        self.offsets.fromlist(list(accumulate(counts, initial=self.offsets[-1]))[1:])
+        self.indices.extend(indices)
+        self.flags.extend(flags)
+
+    def curve(self, index) -> array:
+        return self.indices[self.offsets[index]:self.offsets[index + 1]]
+
+
+class Envelope(object):
+    """Keys of an animated channel (ENVL), one array per column.
+
+    Times are in seconds, slopes in value per second. Tangents of keys
+    without TANI/TANO stay 0, has_tangents tells if there were any. pre
+    and post are the behaviors before the first and after the last key:
+    0 reset, 1 constant, 2 repeat, 3 oscillate, 4 offset repeat, 5 linear.
+    """
+
+    def __init__(self, index, envl_type):
+        self.index = index
+        self.type = envl_type  # 1 for integer channels
+        self.pre = 1
+        self.post = 1
+        self.flags = 0
+        self.times = array('f')
+        self.values = array('f')
+        self.slope_in = array('f')
+        self.slope_out = array('f')
+        self.weight_in = array('f')
+        self.weight_out = array('f')
+        self.breaks = array('H')
+        self.has_tangents = False
+
+    def unpack(self, data: bytes):
+        # subchunks with ID4 and U2 size, tangents belong to the last KEY
+        value_format = '>fi' if self.type == 1 else '>ff'
+        i = 0
+        end = len(data)
+        while i < end:
+            if i + 6 > end:
+                raise LXOParseError("truncated envelope subchunk")
+            subchunk_id = data[i:i + 4]
+            size = data[i + 4] << 8 | data[i + 5]
+            body = data[i + 6:i + 6 + size]
+            i += 6 + size
+            if len(body) < size:
+                raise LXOParseError("truncated envelope subchunk")
+            if subchunk_id == b'KEY ' and size >= 8:
+                time, value = struct.unpack_from(value_format, body)
+                self.times.append(time)
+                self.values.append(value)
+                for column in (self.slope_in, self.slope_out,
+                               self.weight_in, self.weight_out):
+                    column.append(0.0)
+                self.breaks.append(0)
+            elif subchunk_id == b'TANI' and size >= 16 and self.times:
+                _, _, slope, weight, _ = struct.unpack_from('>HHfff', body)
+                self.slope_in[-1] = slope
+                self.weight_in[-1] = weight
+                if not self.breaks[-1]:
+                    self.slope_out[-1] = slope
+                    self.weight_out[-1] = weight
+                self.has_tangents = True
+            elif subchunk_id == b'TANO' and size >= 18 and self.times:
+                breaks, _, _, slope, weight, _ = struct.unpack_from('>HHHfff', body)
+                self.breaks[-1] = breaks
+                self.slope_out[-1] = slope
+                self.weight_out[-1] = weight
+                self.has_tangents = True
+            elif subchunk_id == b'PRE ' and size >= 2:
+                self.pre = struct.unpack_from('>H', body)[0]
+            elif subchunk_id == b'POST' and size >= 2:
+                self.post = struct.unpack_from('>H', body)[0]
+            elif subchunk_id == b'FLAG' and size >= 4:
+                self.flags = struct.unpack_from('>I', body)[0]
 
 
 class ActionLayer(object):
@@ -122,11 +472,17 @@ class LXOItem(object):
         self.CHNC = []
         self.CLNK = []
         self.graph_links = {}
+        # all (graph name, item id, link index), graph_links keeps only
+        # the first link of each graph
+        self.links = []
         self.LAYR = None
+        # file offsets [start, end] of the ITEM chunk, see content_hashes
+        self.chunk_span = None
 
 
 class LXOFile(object):
     def __init__(self):
+        self.filepath = None
         self.version = None
         self.appversion = None
         self.encoding = None
@@ -136,10 +492,17 @@ class LXOFile(object):
         self.__items: list[LXOItem] = []
         self.__layers: list[LXOLayer] = []
         self.__action_layers: list[ActionLayer] = []
-        self.channel_names = None
+        self.channel_names = []
         self.data = []
         self.tagnames = None
         self.IASS = dict()
+        # ids of items left out by a read filter, see read_region
+        self.skipped_items: set[int] = set()
+        # LXOParseErrors of chunks skipped when reading with recover
+        self.parse_errors: list[LXOParseError] = []
+        # Envelopes by index, see animated_channels
+        self.envelopes: dict[int, Envelope] = {}
+        self.__shader_tree = None
 
     def add_layer(self, name, subd_level, psub_level, id):
         layer = LXOLayer(self, name, subd_level, psub_level, id)
@@ -171,7 +534,265 @@ class LXOFile(object):
         for layer in self.__action_layers:
             yield layer
 
+    def animated_channels(self):
+        """(action layer, item id, channel name, Envelope) of every
+        action layer channel that has an envelope."""
+        for action_layer in self.__action_layers:
+            for item_id, channels, _ in action_layer.item_iter():
+                for name, _, index_envl, _ in channels:
+                    envelope = self.envelopes.get(index_envl)
+                    if envelope is not None and envelope.times:
+                        yield action_layer, item_id, name, envelope
+
+    def graph_neighbours(self, graphname: str) -> dict[int, list[int]]:
+        """Ids of the items linked to each item in a graph, either direction."""
+        neighbours: dict[int, list[int]] = {}
+        for item in self.__items:
+            for name, item_index, _ in item.links:
+                if name == graphname:
+                    neighbours.setdefault(item.id, []).append(item_index)
+                    neighbours.setdefault(item_index, []).append(item.id)
+        return neighbours
+
+    def instance_sources(self) -> dict[int, int]:
+        """Source mesh id of every meshInst item whose source is known."""
+        meshes = {item.id for item in self.__items if item.typename == 'mesh'}
+        neighbours = self.graph_neighbours('meshInst')
+        sources = {}
+        for item in self.__items:
+            if item.typename != 'meshInst':
+                continue
+            for source_id in neighbours.get(item.id, ()):
+                if source_id in meshes:
+                    sources[item.id] = source_id
+                    break
+        return sources
+
+    def replicators(self) -> dict[int, tuple[int, list[int]]]:
+        """(point source id, prototype ids) of every replicator item.
+
+        The point source is None if the replicator has none.
+        """
+        point_sources = self.graph_neighbours('particle')
+        prototypes = self.graph_neighbours('source')
+        replicators = {}
+        for item in self.__items:
+            if item.typename != 'replicator':
+                continue
+            point_source = point_sources.get(item.id, [None])[0]
+            replicators[item.id] = (point_source, prototypes.get(item.id, []))
+        return replicators
+
+    def shader_tree(self) -> 'ShaderTree':
+        """The resolved shader tree, built once per file."""
+        if self.__shader_tree is None:
+            self.__shader_tree = ShaderTree(self)
+        return self.__shader_tree
+
+    def transform_stacks(self) -> dict[int, list[LXOItem]]:
+        """Transform items of each locator, in xfrmCore link order."""
+        stacks: dict[int, dict[int, LXOItem]] = {}
+        for item in self.__items:
+            if item.typename not in ('translation', 'rotation', 'scale'):
+                continue
+            item_index, link_index = item.graph_links.get('xfrmCore', (-1, -1))
+            if item_index == -1:
+                # seems to be some issue with texture locators
+                continue
+            stacks.setdefault(item_index, {})[link_index] = item
+        return {item_index: [stack[key] for key in sorted(stack)]
+                for item_index, stack in stacks.items()}
+
+    def hierarchy(self) -> list[tuple[int, int]]:
+        """(item id, parent id) of all locators, parents before children.
+
+        The parent id is None for root items and for items whose parent is
+        not a locator.
+        """
+        locators = {item.id: item for item in self.__items
+                    if item.LAYR is not None}
+        parents = {}
+        for item_id, item in locators.items():
+            parent_id = item.graph_links.get('parent', (None, None))[0]
+            # 0 is itemIndex, 1 is linkIndex
+            # TODO: handle linkIndex, not sure if super important
+            parents[item_id] = parent_id if parent_id in locators else None
+
+        depths = {}
+        for item_id in parents:
+            chain = []
+            visited = set()
+            current = item_id
+            while current is not None and current not in depths:
+                if current in visited:
+                    # broken file with a parent cycle, cut it here
+                    parents[chain[-1]] = None
+                    current = None
+                    break
+                chain.append(current)
+                visited.add(current)
+                current = parents[current]
+            depth = depths.get(current, -1) if current is not None else -1
+            for chain_id in reversed(chain):
+                depth += 1
+                depths[chain_id] = depth
+        order = sorted(parents, key=depths.__getitem__)
+        return [(item_id, parents[item_id]) for item_id in order]
+
+    def resolve_matrices(self) -> tuple[dict[int, tuple], dict[int, tuple]]:
+        """Local and world matrix of every locator in one pass.
+
+        The local matrix is the product of the transform stack with link
+        index 0 outermost, e.g. translation @ rotation @ scale for the
+        default stack.
+        """
+        local_matrices = {}
+        for item_index, stack in self.transform_stacks().items():
+            matrix = IDENTITY_MATRIX
+            for item in stack:
+                matrix = matrix_multiply(matrix, transform_matrix(item))
+            local_matrices[item_index] = matrix
+
+        world_matrices = {}
+        for item_id, parent_id in self.hierarchy():
+            local = local_matrices.setdefault(item_id, IDENTITY_MATRIX)
+            if parent_id is None:
+                world_matrices[item_id] = local
+            else:
+                world_matrices[item_id] = matrix_multiply(
+                    world_matrices[parent_id], local)
+        return local_matrices, world_matrices
+
+    def layer_bounds(self) -> dict[int, tuple]:
+        """World space bounding box of every layer that has one."""
+        _, world_matrices = self.resolve_matrices()
+        bounds = {}
+        for layer in self.__layers:
+            if layer.bbox is None:
+                continue
+            matrix = world_matrices.get(layer.reference_id, IDENTITY_MATRIX)
+            bounds[layer.reference_id] = transform_bbox(matrix, layer.bbox)
+        return bounds
+
+    def column_tables(self, geometry: bool = False) -> dict[str, dict]:
+        """The file as tables of equally long columns, see export_columns.
+
+        items, channels (a row per value, vector channels a row per
+        component), layers and tags. With geometry also points, polygons
+        and corners of the layers with loaded geometry. layer columns hold
+        the item id of the layer, first_point, first_polygon and
+        first_corner the first row of a layer or polygon in those tables.
+        Numbers are arrays, strings lists.
+        """
+        items = {'id': array('q'), 'name': [], 'vname': [], 'typename': [],
+                 'parent': array('q'), 'layer_index': array('q'),
+                 'skipped': array('b')}
+        channels = {'item': array('q'), 'name': [], 'number': array('d'),
+                    'text': []}
+
+        def add_channel(item_id, name, value):
+            channels['item'].append(item_id)
+            channels['name'].append(name)
+            if isinstance(value, (int, float)):
+                channels['number'].append(value)
+                channels['text'].append('')
+            else:
+                channels['number'].append(math.nan)
+                channels['text'].append(str(value))
+
+        for item in self.__items:
+            items['id'].append(item.id)
+            items['name'].append(item.name or '')
+            items['vname'].append(item.vname or '')
+            items['typename'].append(item.typename)
+            parent_id = item.graph_links.get('parent', (-1, -1))[0]
+            items['parent'].append(parent_id if parent_id is not None else -1)
+            items['layer_index'].append(item.LAYR[0] if item.LAYR is not None else -1)
+            items['skipped'].append(item.id in self.skipped_items)
+            for name, value in item.channel.items():
+                add_channel(item.id, name, value)
+            for name, _, value in item.CHNL:
+                add_channel(item.id, name, value)
+            for name, components in item.CHNV.items():
+                for component, value in components:
+                    add_channel(item.id, f"{name}.{component}", value)
+
+        layers = {'id': array('q'), 'name': [], 'points': array('q'),
+                  'polygons': array('q'), 'poly_count_estimate': array('q'),
+                  'curves': array('q'), 'subd': array('b'),
+                  'subd_level': array('d'), 'psub_level': array('q')}
+        for axis in ('min_x', 'min_y', 'min_z', 'max_x', 'max_y', 'max_z'):
+            layers['bbox_' + axis] = array('d')
+        if geometry:
+            layers['first_point'] = array('q')
+            layers['first_polygon'] = array('q')
+            points = {'layer': array('q'), 'x': array('f'), 'y': array('f'),
+                      'z': array('f')}
+            polygons = {'layer': array('q'), 'count': array('i'),
+                        'first_corner': array('q'), 'material': array('i')}
+            corners = {'point': array('i')}
+        for layer in self.__layers:
+            if layer.geometry_loaded:
+                point_count = len(layer.points)
+            elif layer.points_span is not None:
+                point_count = layer.points_span[1] // 12
+            else:
+                point_count = layer.vert_count
+            layers['id'].append(layer.reference_id)
+            layers['name'].append(layer.name or '')
+            layers['points'].append(point_count)
+            layers['polygons'].append(layer.poly_count)
+            layers['poly_count_estimate'].append(layer.poly_count_estimate)
+            layers['curves'].append(sum(map(len, layer.curves.values())))
+            layers['subd'].append(layer.is_subd)
+            layers['subd_level'].append(layer.subd_level or 0)
+            layers['psub_level'].append(layer.psub_level or 0)
+            bbox = layer.bbox or ((math.nan,) * 3,) * 2
+            for axis, value in zip(('min_x', 'min_y', 'min_z', 'max_x', 'max_y', 'max_z'),
+                                   chain(*bbox)):
+                layers['bbox_' + axis].append(value)
+            if not geometry:
+                continue
+            layers['first_point'].append(len(points['layer']))
+            layers['first_polygon'].append(len(polygons['layer']))
+            if not layer.geometry_loaded:
+                continue
+            points['layer'].extend(repeat(layer.reference_id, len(layer.points)))
+            for axis, name in enumerate(('x', 'y', 'z')):
+                points[name].extend(point[axis] for point in layer.points)
+            counts = array('i', map(len, layer.polygons))
+            polygons['layer'].extend(repeat(layer.reference_id, len(counts)))
+            polygons['first_corner'].extend(
+                accumulate(counts[:-1], initial=len(corners['point']))
+                if counts else ())
+            polygons['count'].extend(counts)
+            tags = layer.ptags.get('MATR', array('i'))[:len(counts)]
+            polygons['material'].extend(tags)
+            polygons['material'].extend(repeat(-1, len(counts) - len(tags)))
+            corners['point'].extend(chain.from_iterable(layer.polygons))
+
+        tables = {'items': items, 'channels': channels, 'layers': layers,
+                  'tags': {'name': list(self.tagnames or ())}}
+        if geometry:
+            tables.update(points=points, polygons=polygons, corners=corners)
+        return tables
+
+    def export_columns(self, filepath, geometry: bool = False) -> list[str]:
+        """Write column_tables for analytics without parsing the file again.
+
+        A .npz path writes one NumPy archive, columns named table.column.
+        Any other path is a directory that gets an Arrow IPC file per table
+        (needs pyarrow), memory mapped by pyarrow, Polars or pandas.
+        Returns the written files.
+        """
+        tables = self.column_tables(geometry)
+        if str(filepath).endswith('.npz'):
+            return write_npz(tables, filepath)
+        return write_arrow(tables, filepath)
+
     def pprint(self):
+        import pprint
+
         for key, val in list(vars(self).items()):
             if key == 'channelNames' or key.startswith('_LXOFile_'):
                 continue
@@ -205,11 +826,390 @@ class LXOFile(object):
                 print(" ", ch, val)
 
 
-class LXOReader(object):
+class ShaderTree(object):
+    """Materials of the polygon tags, resolved from the shader tree.
+
+    Siblings are ordered by their parent link index, later ones are higher
+    up in the tree and override earlier ones. A material applies to the
+    tags all masks above it let through, masks without a tag (groups) let
+    through all of them. Masks of part or selection set tags can't be
+    resolved per material tag, materials below them are left out, as are
+    disabled items.
+    """
+
+    SHADER_TYPES = frozenset(('polyRender', 'mask', 'advancedMaterial'))
+    # conditions of a mask, besides a single tag name
+    ALL_TAGS = None
+    NO_TAGS = False
+
+    def __init__(self, lxo_file: LXOFile):
+        items = {item.id: item for item in lxo_file.items
+                 if item.typename in self.SHADER_TYPES}
+        self.children: dict[int, list[LXOItem]] = {}
+        roots = []
+        for item in items.values():
+            parent_id, link_index = item.graph_links.get('parent', (None, 0))
+            if parent_id in items:
+                self.children.setdefault(parent_id, []).append((link_index, item))
+            elif item.typename != 'advancedMaterial':
+                roots.append(item)
+        for item_id, children in self.children.items():
+            children.sort(key=lambda child: child[0])
+            self.children[item_id] = [item for _, item in children]
+        # condition of each mask including the masks above it
+        self.conditions: dict[int, str] = {}
+        # last material over all tags and the ones of single tags after it
+        self.default: LXOItem = None
+        self.tag_materials: dict[str, LXOItem] = {}
+        self.__resolve(roots)
+        self.tagnames = list(lxo_file.tagnames or ())
+
+    @staticmethod
+    def mask_condition(item: LXOItem):
+        if item.typename != 'mask':
+            return ShaderTree.ALL_TAGS
+        ptag = item.channel.get('ptag')
+        if not ptag:
+            return ShaderTree.ALL_TAGS
+        if item.channel.get('ptyp', 'Material') not in ('', 'Material'):
+            return ShaderTree.NO_TAGS
+        return ptag
+
+    @staticmethod
+    def combine(outer, inner):
+        if outer is ShaderTree.ALL_TAGS:
+            return inner
+        if inner is ShaderTree.ALL_TAGS or inner == outer:
+            return outer
+        return ShaderTree.NO_TAGS
+
+    def __resolve(self, roots):
+        # depth first in evaluation order, every item is visited once and
+        # a later material simply replaces what it overrides
+        stack = [(item, self.ALL_TAGS) for item in reversed(roots)]
+        while stack:
+            item, outer = stack.pop()
+            if not item.channel.get('enable', 1):
+                continue
+            if item.typename == 'advancedMaterial':
+                if outer is self.ALL_TAGS:
+                    self.default = item
+                    self.tag_materials.clear()
+                else:
+                    self.tag_materials[outer] = item
+                continue
+            condition = self.combine(outer, self.mask_condition(item))
+            self.conditions[item.id] = condition
+            if condition is self.NO_TAGS:
+                continue
+            stack.extend((child, condition)
+                         for child in reversed(self.children.get(item.id, ())))
+
+    def material(self, tag: str) -> LXOItem:
+        """advancedMaterial of polygons with the material tag, or None."""
+        return self.tag_materials.get(tag, self.default)
+
+    def materials(self) -> dict[str, LXOItem]:
+        """Material tags of the file and the masked ones to their material."""
+        return {tag: material for tag in chain(self.tagnames, self.tag_materials)
+                if (material := self.material(tag)) is not None}
+
+
+class BoxRegion(object):
+    """Axis aligned box for LXOReader.read_region."""
+
+    def __init__(self, min_xyz, max_xyz):
+        self.min_xyz = min_xyz
+        self.max_xyz = max_xyz
+
+    def intersects(self, min_xyz, max_xyz):
+        return all(min_xyz[axis] <= self.max_xyz[axis] and
+                   max_xyz[axis] >= self.min_xyz[axis] for axis in range(3))
+
+
+class PlanesRegion(object):
+    """Convex region for LXOReader.read_region, e.g. a camera frustum.
+
+    planes are (normal, distance) pairs, a point p is inside if
+    dot(normal, p) + distance >= 0 for all planes.
+    """
+
+    def __init__(self, planes):
+        self.planes = planes
+
+    def intersects(self, min_xyz, max_xyz):
+        for normal, distance in self.planes:
+            # corner of the box furthest along the normal
+            corner = [max_xyz[axis] if normal[axis] >= 0 else min_xyz[axis]
+                      for axis in range(3)]
+            if sum(n * c for n, c in zip(normal, corner)) + distance < 0:
+                return False
+        return True
+
+
+class ItemFilter(object):
+    """Which items to read, see LXOReader.read_filtered.
+
+    include and exclude are fnmatch patterns on the item name, "type:"
+    patterns match the typename and "root:" patterns match an item and all
+    items below it. Without include patterns all locators are included.
+    Items outside the item tree (shader tree, lightMaterials...) are always
+    read, transforms only for the locators read.
+    """
+
+    def __init__(self, include=(), exclude=()):
+        self.include = list(include)
+        self.exclude = list(exclude)
+
+    @classmethod
+    def from_strings(cls, include="", exclude=""):
+        """Filter from comma separated pattern lists."""
+        def split(patterns):
+            return [pattern.strip() for pattern in patterns.split(",")
+                    if pattern.strip()]
+        return cls(split(include), split(exclude))
+
+    def __bool__(self):
+        return bool(self.include or self.exclude)
+
+    @staticmethod
+    def __matches(patterns, item, names):
+        import fnmatch
+
+        for pattern in patterns:
+            if pattern.startswith("type:"):
+                if fnmatch.fnmatchcase(item.typename, pattern[5:]):
+                    return True
+            elif pattern.startswith("root:"):
+                if any(fnmatch.fnmatchcase(name, pattern[5:]) for name in names):
+                    return True
+            elif fnmatch.fnmatchcase(names[0], pattern):
+                return True
+        return False
+
+    def resolve(self, items: list[LXOItem]) -> tuple[set[int], set[int]]:
+        """(ids of items to read, ids read but not to be built)."""
+        by_id = {item.id: item for item in items}
+        locators = {item.id for item in items if item.LAYR is not None}
+
+        def ancestors(item):
+            parent_id = item.graph_links.get('parent', (None, None))[0]
+            seen = {item.id}
+            while parent_id in locators and parent_id not in seen:
+                seen.add(parent_id)
+                yield by_id[parent_id]
+                parent_id = by_id[parent_id].graph_links.get('parent', (None, None))[0]
+
+        selected = set()
+        for item_id in locators:
+            item = by_id[item_id]
+            # own name first, then the ancestors for root: patterns
+            names = [item.vname or item.name or item.typename]
+            names += [parent.vname or parent.name or parent.typename
+                      for parent in ancestors(item)]
+            if self.include and not self.__matches(self.include, item, names):
+                continue
+            if self.__matches(self.exclude, item, names):
+                continue
+            selected.add(item_id)
+
+        # ancestors are needed for the world transforms, but not built
+        skipped = set()
+        for item_id in selected:
+            for parent in ancestors(by_id[item_id]):
+                if parent.id not in selected:
+                    skipped.add(parent.id)
+        needed = selected | skipped
+        for item in items:
+            if item.id in locators:
+                continue
+            if item.typename in ('translation', 'rotation', 'scale'):
+                if item.graph_links.get('xfrmCore', (-1, -1))[0] not in needed:
+                    continue
+            needed.add(item.id)
+        return needed, skipped
+
+
+class LayerBVH(object):
+    """Bounding volume hierarchy over layer bounds, see LXOFile.layer_bounds.
+
+    Nodes are (min_xyz, max_xyz, entries, children), leaves have entries,
+    inner nodes two children.
+    """
+
+    def __init__(self, bounds: dict[int, tuple], leaf_size: int = 4):
+        self.leaf_size = leaf_size
+        entries = list(bounds.items())
+        self.root = self.__build(entries) if entries else None
+
+    def __build(self, entries):
+        min_xyz = [min(bbox[0][axis] for _, bbox in entries) for axis in range(3)]
+        max_xyz = [max(bbox[1][axis] for _, bbox in entries) for axis in range(3)]
+        if len(entries) <= self.leaf_size:
+            return (min_xyz, max_xyz, entries, None)
+        # split at the median along the longest axis
+        axis = max(range(3), key=lambda axis: max_xyz[axis] - min_xyz[axis])
+        entries.sort(key=lambda entry: entry[1][0][axis] + entry[1][1][axis])
+        half = len(entries) // 2
+        return (min_xyz, max_xyz, None,
+                (self.__build(entries[:half]), self.__build(entries[half:])))
+
+    def query(self, region) -> set[int]:
+        """Reference ids of all layers intersecting the region."""
+        found = set()
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            min_xyz, max_xyz, entries, children = stack.pop()
+            if not region.intersects(min_xyz, max_xyz):
+                continue
+            if children is not None:
+                stack.extend(children)
+                continue
+            for reference_id, (entry_min, entry_max) in entries:
+                if region.intersects(entry_min, entry_max):
+                    found.add(reference_id)
+        return found
+
+
+class Tracer(object):
+    """Receives the events of a read, see LXOReader(tracer=...).
+
+    Readers without tracer pick the untraced chunk loop once per read, the
+    chunk and subchunk decoding makes no tracing checks. Only the per file
+    and per layer events and parse errors test for a tracer. Subchunks and
+    decoded values are reported after their chunk. Subclasses override the
+    events they need, import_lxo reports its phases and objects as well.
+    """
+
+    def begin(self, name, category, args: dict = None):
+        # start of a span, ended by end with the same name on the same thread
+        pass
+
+    def end(self, name, category):
+        pass
+
+    def chunk_enter(self, chunk_id, offset, size):
+        self.begin(chunk_id, 'chunk', {'offset': offset, 'size': size})
+
+    def chunk_exit(self, chunk_id):
+        self.end(chunk_id, 'chunk')
+
+    def subchunk(self, chunk_id, subchunk_id, size):
+        pass
+
+    def layer_decoded(self, layer: LXOLayer):
+        pass
+
+    def object_built(self, name, object_type, seconds):
+        pass
+
+    def parse_error(self, error: LXOParseError):
+        pass
+
+    def detail(self, *values):
+        # decoded values, only interesting for the debug output
+        pass
+
+
+class PrintTracer(Tracer):
+    """The debug output of the reader, chunk ids and decoded values."""
+
+    def chunk_enter(self, chunk_id, offset, size):
+        print(colored(chunk_id, 'green'), end=" ")
+
+    def chunk_exit(self, chunk_id):
+        pass
+
+    def subchunk(self, chunk_id, subchunk_id, size):
+        print("", colored(subchunk_id, 'yellow'), end=" ")
+
+    def parse_error(self, error: LXOParseError):
+        print(colored(str(error), 'red'))
+
+    def detail(self, *values):
+        print(*values)
+
+
+class ChromeTracer(Tracer):
+    """Records the events as Chrome trace JSON.
+
+    Open the file written by write in ui.perfetto.dev or chrome://tracing.
+    Events of several threads go into one tracer, each thread gets its
+    own track.
+    """
+
     def __init__(self):
+        self.events = []
+        self.pid = os.getpid()
+        self.start = time.perf_counter_ns()
+
+    def __event(self, phase, name, category, args=None, **fields):
+        event = {'name': name, 'cat': category, 'ph': phase,
+                 'ts': (time.perf_counter_ns() - self.start) / 1000,
+                 'pid': self.pid, 'tid': threading.get_ident()}
+        if args:
+            event['args'] = args
+        event.update(fields)
+        # list.append is atomic, no lock needed for threads
+        self.events.append(event)
+        return event
+
+    def begin(self, name, category, args: dict = None):
+        self.__event('B', name, category, args)
+
+    def end(self, name, category):
+        self.__event('E', name, category)
+
+    def subchunk(self, chunk_id, subchunk_id, size):
+        self.__event('i', chunk_id + subchunk_id, 'subchunk', {'size': size}, s='t')
+
+    def layer_decoded(self, layer: LXOLayer):
+        self.__event('i', layer.name or str(layer.reference_id), 'layer',
+                     {'points': len(layer.points), 'polygons': len(layer.polygons),
+                      'reference_id': layer.reference_id}, s='t')
+
+    def object_built(self, name, object_type, seconds):
+        event = self.__event('X', name, 'object', {'type': object_type},
+                             dur=seconds * 1e6)
+        event['ts'] -= event['dur']
+
+    def parse_error(self, error: LXOParseError):
+        self.__event('i', 'parse error', 'error', {'message': str(error)}, s='t')
+
+    def write(self, filepath):
+        import json
+
+        with open(filepath, 'w') as trace_file:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'},
+                      trace_file)
+        return filepath
+
+
+class ChunkReader(object):
+    """Parse state of a single read.
+
+    LXOReader creates one for every call, nothing is shared between
+    calls, so one LXOReader can be used from several threads at once.
+    """
+
+    def __init__(self, tags_to_read=frozenset(), load_geometry: bool = True,
+                 validate: bool = False, recover: bool = False,
+                 tracer: 'Tracer' = None, strings: dict = None):
         self.file = None
         self.mod_size = 0
-        self.tags_to_read = set()
+        self.tags_to_read = tags_to_read  # chunks to read, empty reads all
+        self.load_geometry = load_geometry
+        self.item_filter = None  # ids of the items to read, None reads all
+        self.layer_filter = None  # same for layers, by item reference
+        self.pols_estimate = None  # guessed size of the last POLS chunk
+        self.validate = validate or recover  # bounds check every chunk and subchunk
+        self.recover = recover  # skip broken chunks instead of failing
+        self.tracer = tracer
+        self.strings = {} if strings is None else strings  # decoded S0 by bytes
+        self.chunk_path = []
+        # item and vertex map of the last ITEM and VMAP/VMAD, for the tracer
+        self.item = None
+        self.vmap = None
 
     def read_id4(self):
         # 4-byte identifier encapsulated in a long.
@@ -217,17 +1217,17 @@ class LXOReader(object):
         # some bit-shifting and bitwise or'ing like so:
         # ('T' << 24 | 'E' << 16 | 'S' << 8 | 'T').
         self.mod_size -= 4
-        val = struct.unpack(">1l", self.file.read(4))[0]
+        val = U4.unpack(self.file.read(4))[0]
         return (chr(val >> 24) + chr(val >> 16 & 255) +
                 chr(val >> 8 & 255) + chr(val & 255))
 
     def read_u1(self):
         self.mod_size -= 1
-        return struct.unpack(">1B", self.file.read(1))[0]
+        return U1.unpack(self.file.read(1))[0]
 
     def read_u14(self):
         self.mod_size -= 4
-        return [struct.unpack(">1B", self.file.read(1))[0] for _ in range(4)]
+        return list(U14.unpack(self.file.read(4)))
 
     def read_u1s(self):
         size = self.mod_size
@@ -237,17 +1237,17 @@ class LXOReader(object):
     def read_u2(self):
         # unsigned short
         self.mod_size -= 2
-        return struct.unpack(">1H", self.file.read(2))[0]
+        return U2.unpack(self.file.read(2))[0]
 
     def read_u4(self):
         # unsigned long
         self.mod_size -= 4
-        return struct.unpack(">1L", self.file.read(4))[0]
+        return U4.unpack(self.file.read(4))[0]
 
     def read_vx(self):
         # U2 if smaller than 0xFF00 otherwise U4
         val = self.file.read(2)
-        out = struct.unpack(">1H", val)[0]
+        out = U2.unpack(val)[0]
         if out < int('FF00', 16):
             self.mod_size -= 2
             return out
@@ -255,34 +1255,41 @@ class LXOReader(object):
             val += self.file.read(2)
             val = b'\x00' + val[1:]  # discard first byte, feels hacky...
             self.mod_size -= 4
-            return struct.unpack(">1L", val)[0]
+            return U4.unpack(val)[0]
 
     def read_i2(self):
         self.mod_size -= 2
-        return struct.unpack(">1h", self.file.read(2))[0]
+        return I2.unpack(self.file.read(2))[0]
 
     def read_i4(self):
         self.mod_size -= 4
-        return struct.unpack(">1l", self.file.read(4))[0]
+        return I4.unpack(self.file.read(4))[0]
 
     def read_f4(self):
         self.mod_size -= 4
-        return struct.unpack(">1f", self.file.read(4))[0]
+        return F4.unpack(self.file.read(4))[0]
 
     def read_s0(self):
         # NULL-terminated ASCII string. The string is padded to an even number
-        # of bytes with a NULL where necessary.
+        # of bytes with a NULL where necessary, so it is read in pairs.
         s0: bytes = b''
         while True:
-            s0 += struct.unpack(">1s", self.file.read(1))[0]
-            self.mod_size -= 1
-            if len(s0) % 2 == 0 and s0.endswith(b'\0'):
-                s0 = s0.rstrip(b'\0')
-                return s0.decode("utf-8", "ignore")
+            pair = self.file.read(2)
+            self.mod_size -= 2
+            if len(pair) < 2:
+                raise LXOParseError("string runs past the end of the file")
+            s0 += pair
+            if b'\0' in pair:
+                s0 = s0[:s0.index(b'\0')]
+                # names repeat in every item and file, keep one copy of each
+                string = self.strings.get(s0)
+                if string is None:
+                    string = self.strings[s0] = s0.decode("utf-8", "ignore")
+                return string
 
     def read_int(self):
         self.mod_size -= 4
-        return struct.unpack(">1i", self.file.read(4))[0]
+        return I4.unpack(self.file.read(4))[0]
 
     def read_float(self):
         return self.read_f4()
@@ -294,11 +1301,126 @@ class LXOReader(object):
     def readblob(self, size=None) -> bytes:
         if size is None:
             raise Exception('need blob size')
+        if size < 0:
+            raise LXOParseError("read %d bytes past the end of the chunk" % -size)
         self.mod_size -= size
-        cc = b''
-        for _ in range(size):
-            cc += struct.unpack(">1c", self.file.read(1))[0]
-        return cc
+        return self.file.read(size)
+
+    def check_size(self, size, parent_rest):
+        # validating mode: a (sub)chunk has to fit into its parent and the file
+        if size > parent_rest:
+            raise LXOParseError("size %d exceeds the %d bytes left in the parent"
+                                % (size, parent_rest))
+        position = self.file.tell()
+        file_size = os.fstat(self.file.fileno()).st_size
+        if position + size > file_size:
+            raise LXOParseError("size %d exceeds the %d bytes left in the file"
+                                % (size, file_size - position))
+
+    def skip_rest(self, rest):
+        # validating mode: step over unread bytes at the end of a (sub)chunk
+        if rest < 0:
+            raise LXOParseError("read %d bytes past the end of the chunk" % -rest)
+        self.mod_size -= rest
+        self.file.seek(rest, 1)
+
+    def parse_failed(self, lxo_file: LXOFile, error, offset):
+        if not isinstance(error, LXOParseError) or error.offset is None:
+            message = error.message if isinstance(error, LXOParseError) else (
+                "%s: %s" % (type(error).__name__, error))
+            error = LXOParseError(message, offset, self.chunk_path)
+        if not self.recover:
+            raise error
+        if self.tracer:
+            self.tracer.parse_error(error)
+        if lxo_file is not None:
+            lxo_file.parse_errors.append(error)
+
+    @staticmethod
+    def unpack_ptags(data: bytes) -> tuple[array, array]:
+        # PTAG body: pairs of VX polygon index and U2 tag index
+        poly_indices = array('i')
+        tag_indices = array('i')
+        i = 0
+        end = len(data)
+        while i < end:
+            if data[i] == 0xFF:
+                poly_indices.append(int.from_bytes(data[i + 1:i + 4], 'big'))
+                i += 4
+            else:
+                poly_indices.append(data[i] << 8 | data[i + 1])
+                i += 2
+            tag_indices.append(data[i] << 8 | data[i + 1])
+            i += 2
+        return poly_indices, tag_indices
+
+    @staticmethod
+    def unpack_pols(data: bytes) -> tuple[array, array, array]:
+        # POLS body: U2 vertex count (low 10 bits, the high 6 are flags) and
+        # VX point indices per polygon. Polygons with only U2 indices are
+        # converted in one go.
+        counts = array('i')
+        flags = array('H')
+        indices = array('i')
+        i = 0
+        end = len(data)
+        while i < end:
+            word = data[i] << 8 | data[i + 1]
+            i += 2
+            count = word & 0x03FF
+            counts.append(count)
+            flags.append(word >> 10)
+            run = data[i:i + 2 * count]
+            if len(run) == 2 * count and 0xFF not in run[::2]:
+                short = array('H', run)
+                if sys.byteorder == 'little':
+                    short.byteswap()
+                indices.fromlist(short.tolist())
+                i += 2 * count
+                continue
+            for _ in range(count):
+                if data[i] == 0xFF:
+                    indices.append(int.from_bytes(data[i + 1:i + 4], 'big'))
+                    i += 4
+                else:
+                    indices.append(data[i] << 8 | data[i + 1])
+                    i += 2
+        return counts, indices, flags
+
+    @staticmethod
+    def unpack_vmap(data: bytes, dimension: int, disco: bool = False):
+        # VMAP body: VX point index and dimension F4 values per entry, VMAD
+        # has a VX polygon index after the point index. The values are
+        # gathered as raw bytes and converted in one go.
+        indices = array('i')
+        poly_indices = array('i') if disco else None
+        raw = bytearray()
+        width = 4 * dimension
+        i = 0
+        end = len(data)
+        while i < end:
+            if data[i] == 0xFF:
+                indices.append(int.from_bytes(data[i + 1:i + 4], 'big'))
+                i += 4
+            else:
+                indices.append(data[i] << 8 | data[i + 1])
+                i += 2
+            if disco:
+                if data[i] == 0xFF:
+                    poly_indices.append(int.from_bytes(data[i + 1:i + 4], 'big'))
+                    i += 4
+                else:
+                    poly_indices.append(data[i] << 8 | data[i + 1])
+                    i += 2
+            raw += data[i:i + width]
+            i += width
+        if i != end:
+            raise LXOParseError("vertex map entries don't fill the chunk")
+        values = array('f')
+        values.frombytes(raw)
+        if sys.byteorder == 'little':
+            values.byteswap()
+        return indices, values, poly_indices
 
     def read_value(self, datatype):
         datatype = int(datatype) & ~0x20  # 33, 34, 35 exist as well...
@@ -310,361 +1432,567 @@ class LXOReader(object):
         elif datatype == 3 or datatype == 19:
             value = self.read_s0()
         else:
-            raise Exception("unknown datatype")
+            raise LXOParseError("unknown datatype %s" % datatype)
             # blobsize = subchunkSize - (subsizeSnap - self.modSize)
             # value = self.readblob(blobsize)
         return value
 
-    def read_from_file(self, filepath, load_lights: bool = True, load_meshes: bool = True, load_materials: bool = True, load_cameras: bool = True) -> LXOFile:
-        if not filepath or not os.path.isfile(filepath):
-            raise Exception('not a file')
-        file_size = os.stat(filepath).st_size
-        if DEBUG:
-            print(file_size)
+    def read_file(self, filepath, bbox_samples: int = 4096) -> LXOFile:
+        if self.tracer:
+            self.tracer.begin(os.path.basename(filepath), 'file',
+                              {'path': filepath, 'size': os.stat(filepath).st_size})
         lxo_file = LXOFile()
+        lxo_file.filepath = filepath
         with open(filepath, 'rb') as srcfile:
             self.file = srcfile
-            # read main FORM chunkID and size
+            lxo_file.size, lxo_file.type = self.__read_form(lxo_file)
+
+            last_layer = self.__read_chunks(lxo_file)
+            if self.tracer:
+                if last_layer is not None and self.load_geometry:
+                    self.tracer.layer_decoded(last_layer)
+                self.tracer.end(os.path.basename(filepath), 'file')
+            if not self.load_geometry:
+                for layer in lxo_file.layers:
+                    layer.geometry_loaded = False
+                    if layer.bbox is None and layer.points_span is not None:
+                        layer.bbox = self.points_bbox(*layer.points_span,
+                                                      samples=bbox_samples)
+            self.file = None
+        return lxo_file
+
+    def __read_form(self, lxo_file: LXOFile = None):
+        # read main FORM chunkID and size
+        self.chunk_path = ['FORM']
+        try:
             form = struct.unpack(">4s", self.file.read(4))[0]
             size = struct.unpack(">1L", self.file.read(4))[0]
             self.mod_size = size
             scene_type = self.read_id4()
-            # throw an error if it's not FORM
-            if form != b'FORM':
-                raise Exception('not a valid file')
-
-            lxo_file.size = size
-            lxo_file.type = scene_type
-
-            self.__read_chunks(lxo_file)
+        except struct.error:
+            raise LXOParseError('not a valid file', 0, self.chunk_path)
+        # throw an error if it's not FORM
+        if form != b'FORM':
+            raise LXOParseError('not a valid file', 0, self.chunk_path)
+        if self.validate:
+            try:
+                self.check_size(self.mod_size, self.mod_size)
+            except LXOParseError as error:
+                # truncated file, read what is there
+                self.parse_failed(lxo_file, error, 0)
+                self.mod_size = (os.fstat(self.file.fileno()).st_size
+                                 - self.file.tell())
+        return size, scene_type
+
+    def read_item_index(self, filepath) -> list[LXOItem]:
+        items = []
+        with open(filepath, 'rb') as srcfile:
+            self.file = srcfile
+            self.__read_form()
+            while self.mod_size > 0:
+                chunk_offset = self.file.tell()
+                try:
+                    item = self.__read_index_chunk()
+                except PARSE_ERRORS as error:
+                    # the items up to a broken chunk are good enough to filter
+                    self.parse_failed(None, error, chunk_offset)
+                    break
+                if item is not None:
+                    items.append(item)
             self.file = None
-        return lxo_file
+        return items
+
+    def __read_index_chunk(self):
+        self.chunk_path = ['FORM']
+        chunk_id = self.read_id4()
+        self.chunk_path.append(chunk_id)
+        chunk_size = self.read_u4()
+        size_snap = self.mod_size
+        if self.validate:
+            self.check_size(chunk_size, size_snap)
+        if chunk_id != 'ITEM':
+            self.mod_size -= chunk_size
+            self.file.seek(chunk_size, 1)
+            return None
+        typename = self.read_s0()
+        name = self.read_s0()
+        reference_id = self.read_u4()
+        item = LXOItem(name, reference_id, typename)
+        while (size_snap - self.mod_size) < chunk_size:
+            subchunk_id = self.read_id4()
+            self.chunk_path[2:] = [subchunk_id]
+            subchunk_size = self.read_u2()
+            subsize_snap = self.mod_size
+            if self.validate:
+                self.check_size(subchunk_size,
+                                chunk_size - (size_snap - self.mod_size))
+            if subchunk_id == 'LINK':
+                graphname = self.read_s0()
+                item_index = self.read_i4()
+                link_index = self.read_i4()
+                item.graph_links.setdefault(graphname, (item_index, link_index))
+                item.links.append((graphname, item_index, link_index))
+            elif subchunk_id == 'VNAM':
+                item.vname = self.read_s0()
+            elif subchunk_id == 'LAYR':
+                item.LAYR = (self.read_u4(), self.read_u4(), self.read_u14())
+            self.skip_rest(subchunk_size - (subsize_snap - self.mod_size))
+        return item
 
-    def __read_chunks(self, lxo_file: LXOFile):
-        # read all other chunks
-        current_layer = None
+    def read_layer_geometry(self, filepath, lxo_layer: LXOLayer):
+        start, end = lxo_layer.geometry_span
+        lxo_layer.poly_count = 0
+        lxo_layer.poly_count_estimate = 0
+        with open(filepath, 'rb') as srcfile:
+            self.file = srcfile
+            self.file.seek(start)
+            self.mod_size = end - start
+            self.__read_chunks(lxo_layer.parent, lxo_layer)
+            self.file = None
+        lxo_layer.geometry_loaded = True
+        if self.tracer:
+            self.tracer.layer_decoded(lxo_layer)
+        return lxo_layer
+
+    def count_polygons(self, lxo_layer: LXOLayer, chunk_id, chunk_type, size):
+        # polygon count without decoding POLS. Modo tags every polygon with
+        # a material in order, so the size of the MATR PTAG chunk gives the
+        # count: 4 bytes per entry, 6 from index 0xFF00 on. Without it the
+        # count is guessed for quads with 2 byte point indices.
+        if chunk_id == 'POLS':
+            # curves and other polygon types are not counted, nor their tags
+            self.pols_estimate = None
+            if chunk_type in ('FACE', 'SUBD', 'PSUB'):
+                estimate = size // 10
+                lxo_layer.poly_count += estimate
+                lxo_layer.poly_count_estimate += estimate
+                self.pols_estimate = estimate
+        elif chunk_type == 'MATR' and self.pols_estimate is not None:
+            if size <= 4 * 0xFF00:
+                count = size // 4
+            else:
+                count = 0xFF00 + (size - 4 * 0xFF00) // 6
+            lxo_layer.poly_count += count - self.pols_estimate
+            lxo_layer.poly_count_estimate -= self.pols_estimate
+            self.pols_estimate = None
+
+    def points_bbox(self, offset, size, samples=4096):
+        # bounding box from the PNTS chunk for layers without BBOX chunk,
+        # from a sample of the points, or all of them if samples is None
+        count = size // 12
+        if count == 0:
+            return None
+        coords = array('f')
+        if samples is None or count <= samples:
+            self.file.seek(offset)
+            coords.frombytes(self.file.read(count * 12))
+        else:
+            for index in range(0, count, count // samples):
+                self.file.seek(offset + index * 12)
+                coords.frombytes(self.file.read(12))
+        if sys.byteorder == 'little':
+            coords.byteswap()
+        return ([min(coords[axis::3]) for axis in range(3)],
+                [max(coords[axis::3]) for axis in range(3)])
+
+    def __read_chunks(self, lxo_file: LXOFile, current_layer: LXOLayer = None):
+        # read all other chunks, the traced variant is picked once per read
+        if self.tracer is None:
+            read_chunk = self.__read_chunk
+        else:
+            read_chunk = self.__traced_chunk
         while self.mod_size > 0:
-            chunk_id = self.read_id4()
-            chunk_size = self.read_u4()
-            size_snap = self.mod_size
-
-            # only read the tags specified
-            if self.tags_to_read and chunk_id not in self.tags_to_read:
-                self.mod_size -= chunk_size
-                self.file.seek(chunk_size, 1)
-                continue
+            chunk_offset = self.file.tell()
+            self.chunk_path = ['FORM']
+            try:
+                chunk_id = self.read_id4()
+                self.chunk_path.append(chunk_id)
+                chunk_size = self.read_u4()
+                size_snap = self.mod_size
+                if self.validate:
+                    self.check_size(chunk_size, size_snap)
+            except (struct.error, LXOParseError) as error:
+                # a broken chunk header, there is no next chunk to go on with
+                self.parse_failed(lxo_file, error, chunk_offset)
+                return current_layer
+            try:
+                current_layer = read_chunk(lxo_file, chunk_id, chunk_size,
+                                           size_snap, current_layer)
+                if self.validate:
+                    self.skip_rest(chunk_size - (size_snap - self.mod_size))
+            except PARSE_ERRORS as error:
+                self.parse_failed(lxo_file, error, chunk_offset)
+                # skip the rest of the chunk, its size was checked already
+                self.file.seek(chunk_offset + 8 + chunk_size)
+                self.mod_size = size_snap - chunk_size
+        return current_layer
+
+    def __traced_chunk(self, lxo_file: LXOFile, chunk_id, chunk_size, size_snap,
+                       current_layer: LXOLayer = None):
+        # subchunks and decoded values are reported after the chunk is read,
+        # so __read_chunk makes no tracing checks
+        chunk_offset = self.file.tell() - 8
+        self.item = None
+        self.tracer.chunk_enter(chunk_id, chunk_offset, chunk_size)
+        try:
+            layer = self.__read_chunk(lxo_file, chunk_id, chunk_size, size_snap,
+                                      current_layer)
+            if chunk_id == 'ITEM' and self.item is not None or (
+                    chunk_id == 'ACTN' and
+                    (not self.tags_to_read or chunk_id in self.tags_to_read)):
+                self.__trace_subchunks(chunk_id, chunk_offset + 8, chunk_size)
+            self.tracer.detail(*self.__chunk_details(lxo_file, chunk_id, layer))
+        finally:
+            self.tracer.chunk_exit(chunk_id)
+        if (layer is not current_layer and current_layer is not None
+                and self.load_geometry):
+            # the next LAYR chunk ends the geometry of the current layer
+            self.tracer.layer_decoded(current_layer)
+        return layer
 
-            if DEBUG:
-                print(colored(chunk_id, 'green'), end=" ")
-
-            if chunk_id == 'DESC':
-                preset_type = self.read_s0()
-                preset_description = self.read_s0()
-                if DEBUG:
-                    print(preset_type, preset_description)
-            elif chunk_id == 'VRSN':
-                major = self.read_u4()
-                minor = self.read_u4()
-                app = self.read_s0()
-                lxo_file.version = major
-                lxo_file.appversion = app
-                if DEBUG:
-                    print(major, minor, app)
-            elif chunk_id == 'APPV':
-                major = self.read_u4()
-                minor = self.read_u4()
-                unknown = self.read_u4()
-                build = self.read_u4()
-                level = self.read_s0()
-                if DEBUG:
-                    print(major, minor, unknown, build, level)
-            elif chunk_id == 'ENCO':
-                encoding = self.read_u4()
-                lxo_file.encoding = encoding
-                if DEBUG:
-                    print(sENCODINGS[encoding])
-            elif chunk_id == 'TAGS':
-                tags = []
-                while (size_snap - self.mod_size) < chunk_size:
-                    tags.append(self.read_s0())
-                lxo_file.tagnames = tags
-                if DEBUG:
-                    print(tags)
-            elif chunk_id == 'CHNM':
-                count = self.read_u4()
-                names = []
-                for _ in range(count):
-                    names.append(self.read_s0())
-                lxo_file.channel_names = names
-                if DEBUG:
-                    print(names)
-            elif chunk_id == 'LAYR':
-                index_legacy = self.read_u2()
-                flags = self.read_u2()
-                rot_pivot = self.read_vec12()
-                name = self.read_s0()
-                parent_legacy = self.read_i2()
-                refine_subd = self.read_f4()
-                refine_crvs = self.read_f4()
-                scl_pivot = self.read_vec12()
-                for i in range(6):
-                    unused = self.read_u4()
-                item_reference = self.read_u4()
-                refine_spl_ptch = self.read_u2()
-                for i in range(4):
-                    unused = self.read_u2()
-                cc_renderlvl = self.read_u2()
-                cc_previewlvl = self.read_u2()
-                subd_renderlvl = self.read_u2()
+    def __trace_subchunks(self, chunk_id, start, chunk_size):
+        # the subchunk headers of an ITEM or ACTN chunk, read again
+        position = self.file.tell()
+        self.file.seek(start)
+        data = self.file.read(chunk_size)
+        self.file.seek(position)
+        i = 0
+        for _ in range(2):
+            # two S0 strings, padded to an even size, and a U4
+            i = data.find(b'\0', i) + 1
+            if not i:
+                # a broken chunk, its error is reported already
+                return
+            i += i % 2
+        i += 4
+        while i + 6 <= len(data):
+            subchunk_id = data[i:i + 4].decode('ascii', 'replace')
+            subchunk_size = U2.unpack_from(data, i + 4)[0]
+            if (not self.tags_to_read or
+                    chunk_id + subchunk_id in self.tags_to_read):
+                self.tracer.subchunk(chunk_id, subchunk_id, subchunk_size)
+            i += 6 + subchunk_size
+
+    def __chunk_details(self, lxo_file: LXOFile, chunk_id, layer: LXOLayer):
+        # decoded values of a chunk for the tracer, none for skipped chunks
+        if self.tags_to_read and chunk_id not in self.tags_to_read:
+            return ()
+        if chunk_id in GEOMETRY_CHUNKS:
+            if layer is None or (not self.load_geometry and chunk_id != 'BBOX'):
+                return ()
+            if chunk_id == 'PNTS':
+                return len(layer.points),
+            if chunk_id == 'POLS':
+                return len(layer.polygons), {poly_type: len(curves)
+                                             for poly_type, curves in layer.curves.items()}
+            if chunk_id in ('VMAP', 'VMAD'):
+                vmap = self.vmap
+                return vmap.map_type, vmap.dimension, vmap.name, len(vmap.indices)
+            if chunk_id == 'PTAG':
+                return sorted(layer.ptags),
+            return layer.bbox or ()
+        if chunk_id == 'LAYR':
+            return () if layer is None else ("", layer.name, layer.reference_id)
+        if chunk_id == 'VRSN':
+            return lxo_file.version, lxo_file.appversion
+        if chunk_id == 'ENCO':
+            if lxo_file.encoding < len(sENCODINGS):
+                return sENCODINGS[lxo_file.encoding],
+            return lxo_file.encoding,
+        if chunk_id == 'TAGS':
+            return lxo_file.tagnames,
+        if chunk_id == 'CHNM':
+            return lxo_file.channel_names,
+        if chunk_id == 'ENVL':
+            envelope = next(reversed(lxo_file.envelopes.values()))
+            return envelope.index, envelope.type, len(envelope.times)
+        if chunk_id == 'ITEM':
+            item = self.item
+            if item is None:
+                return ()
+            return (item.typename, item.name, item.id, item.vname, item.links,
+                    item.channel)
+        if chunk_id == 'ACTN':
+            *_, action_layer = lxo_file.action_layers
+            return action_layer.name, action_layer.type, action_layer.index
+        if chunk_id in ('DESC', 'APPV'):
+            return ()
+        return colored("BLOB skipped", "red"),
+
+    def __read_chunk(self, lxo_file: LXOFile, chunk_id, chunk_size, size_snap,
+                     current_layer: LXOLayer = None):
+        if current_layer is None and chunk_id in GEOMETRY_CHUNKS:
+            # layer left out by the item filter
+            self.mod_size -= chunk_size
+            self.file.seek(chunk_size, 1)
+            return current_layer
+        elif chunk_id in GEOMETRY_CHUNKS:
+            chunk_start = self.file.tell()
+            current_layer.geometry_span[1] = chunk_start + chunk_size
+            if not self.load_geometry and chunk_id != 'BBOX':
+                skip = chunk_size
+                if chunk_id == 'PNTS':
+                    current_layer.points_span = (chunk_start, chunk_size)
+                    current_layer.vert_count += chunk_size // 12
+                elif chunk_id in ('POLS', 'PTAG') and chunk_size >= 4:
+                    self.count_polygons(current_layer, chunk_id,
+                                        self.read_id4(), chunk_size - 4)
+                    skip -= 4
+                self.mod_size -= skip
+                self.file.seek(skip, 1)
+                return current_layer
+
+        # only read the tags specified
+        if self.tags_to_read and chunk_id not in self.tags_to_read:
+            self.mod_size -= chunk_size
+            self.file.seek(chunk_size, 1)
+            return current_layer
+
+        if chunk_id == 'DESC':
+            preset_type = self.read_s0()
+            preset_description = self.read_s0()
+        elif chunk_id == 'VRSN':
+            major = self.read_u4()
+            minor = self.read_u4()
+            app = self.read_s0()
+            lxo_file.version = major
+            lxo_file.appversion = app
+        elif chunk_id == 'APPV':
+            major = self.read_u4()
+            minor = self.read_u4()
+            unknown = self.read_u4()
+            build = self.read_u4()
+            level = self.read_s0()
+        elif chunk_id == 'ENCO':
+            encoding = self.read_u4()
+            lxo_file.encoding = encoding
+        elif chunk_id == 'TAGS':
+            tags = []
+            while (size_snap - self.mod_size) < chunk_size:
+                tags.append(self.read_s0())
+            lxo_file.tagnames = tags
+        elif chunk_id == 'CHNM':
+            count = self.read_u4()
+            names = []
+            for _ in range(count):
+                names.append(self.read_s0())
+            lxo_file.channel_names = names
+        elif chunk_id == 'LAYR':
+            index_legacy = self.read_u2()
+            flags = self.read_u2()
+            rot_pivot = self.read_vec12()
+            name = self.read_s0()
+            parent_legacy = self.read_i2()
+            refine_subd = self.read_f4()
+            refine_crvs = self.read_f4()
+            scl_pivot = self.read_vec12()
+            for i in range(6):
+                unused = self.read_u4()
+            item_reference = self.read_u4()
+            refine_spl_ptch = self.read_u2()
+            for i in range(4):
+                unused = self.read_u2()
+            cc_renderlvl = self.read_u2()
+            cc_previewlvl = self.read_u2()
+            subd_renderlvl = self.read_u2()
+            blobsize = chunk_size - (size_snap - self.mod_size)
+            blob = self.readblob(blobsize)
+            if (self.layer_filter is not None and
+                    item_reference not in self.layer_filter):
+                current_layer = None
+                return current_layer
+            # add layer to lxoFile
+            # TODO: add all properties to layer
+            current_layer = lxo_file.add_layer(name, refine_subd,
+                                            cc_previewlvl,
+                                            item_reference)
+            current_layer.geometry_span = [self.file.tell(), self.file.tell()]
+        elif chunk_id == 'POLS':
+            poly_type = self.read_id4()
+            if poly_type in ['SUBD', 'PSUB']:
+                current_layer.is_subd = True
+            blobsize = chunk_size - (size_snap - self.mod_size)
+            counts, indices, flags = self.unpack_pols(self.readblob(blobsize))
+            poly_count = len(counts)
+            if poly_type in ['FACE', 'SUBD', 'PSUB']:
+                current_layer.pols_offset = len(current_layer.polygons)
+                # the point lists are sliced off the flat index array
+                points = iter(indices.tolist())
+                current_layer.polygons.extend([list(islice(points, count))
+                                               for count in counts])
+                current_layer.poly_count += poly_count
+            else:
+                # curves and the other types, their tags are not read
+                current_layer.pols_offset = None
+                curves = current_layer.curves.get(poly_type)
+                if curves is None:
+                    curves = current_layer.curves[poly_type] = CurveSet(poly_type)
+                curves.extend(counts, indices, flags)
+        elif chunk_id == 'PNTS':
+            points = []
+            while (size_snap - self.mod_size) < chunk_size:
+                points.append(self.read_vec12())
+            current_layer.points = points
+            current_layer.vert_count = len(points)
+        elif chunk_id in ('VMAP', 'VMAD'):
+            disco = chunk_id == 'VMAD'
+            map_type = self.read_id4()
+            dimension = self.read_u2()
+            name = self.read_s0()
+            blobsize = chunk_size - (size_snap - self.mod_size)
+            vmap = self.vmap = VertexMap(map_type, name, dimension,
+                             *self.unpack_vmap(self.readblob(blobsize),
+                                               dimension, disco))
+            if map_type == 'TXUV' and disco:
+                current_layer.uv_maps_disco[name] = vmap.disco_dict()
+            elif map_type == 'TXUV':
+                current_layer.uv_maps[name] = vmap.as_dict()
+            elif map_type == 'NORM' and disco:
+                current_layer.vertex_normals_disco[name] = vmap.disco_dict()
+            elif map_type == 'NORM':
+                current_layer.vertex_normals[name] = vmap.as_dict()
+            elif disco:
+                current_layer.vmads.setdefault(map_type, {})[name] = vmap
+            else:
+                current_layer.vmaps.setdefault(map_type, {})[name] = vmap
+        elif chunk_id == 'PTAG':
+            # MATR, PART, PICK, FONT, JUST, TEXT, SMGP
+            tag_type = self.read_id4()
+            blobsize = chunk_size - (size_snap - self.mod_size)
+            poly_indices, tag_indices = self.unpack_ptags(self.readblob(blobsize))
+            current_layer.add_ptags(tag_type, poly_indices, tag_indices)
+        elif chunk_id == 'ENVL':
+            index = self.read_vx()
+            envl_type = self.read_u4()
+            blobsize = chunk_size - (size_snap - self.mod_size)
+            envelope = Envelope(index, envl_type)
+            envelope.unpack(self.readblob(blobsize))
+            lxo_file.envelopes[index] = envelope
+        elif chunk_id == 'BBOX':
+            min_xyz = self.read_vec12()
+            max_xyz = self.read_vec12()
+            current_layer.bbox = (min_xyz, max_xyz)
+        elif chunk_id == 'ITEM':
+            typename = self.read_s0()
+            name = self.read_s0()
+            reference_id = self.read_u4()
+            if (self.item_filter is not None and
+                    reference_id not in self.item_filter):
                 blobsize = chunk_size - (size_snap - self.mod_size)
-                blob = self.readblob(blobsize)
-                # add layer to lxoFile
-                # TODO: add all properties to layer
-                current_layer = lxo_file.add_layer(name, refine_subd,
-                                                cc_previewlvl,
-                                                item_reference)
-                if DEBUG:
-                    print("", name, item_reference)
-            elif chunk_id == 'POLS':
-                poly_type = self.read_id4()
-                if poly_type in ['SUBD', 'PSUB']:
-                    current_layer.is_subd = True
-                # TODO figure this out
-                if poly_type in ['FACE', 'SUBD', 'PSUB']:
-                    poly_count = 0
-                    while (size_snap - self.mod_size) < chunk_size:
-                        # TODO make this proper code
-                        vert_count = self.read_u2()
-                        poly_points = []
-                        for i in range(vert_count):
-                            vert_index = self.read_vx()
-                            poly_points.append(vert_index)
-                        current_layer.polygons.append(poly_points)
-                    current_layer.poly_count += poly_count
-                else:
-                    blobsize = chunk_size - (size_snap - self.mod_size)
-                    polygons = self.readblob(blobsize)
-                if DEBUG:
-                    print(poly_type, poly_count)
-            elif chunk_id == 'PNTS':
-                points = []
-                while (size_snap - self.mod_size) < chunk_size:
-                    points.append(self.read_vec12())
-                current_layer.points = points
-                if DEBUG:
-                    print(len(points))
-            elif chunk_id == 'VMAP':
-                map_type = self.read_id4()
-                dimension = self.read_u2()
-                name = self.read_s0()
-                values = {}
-                while (size_snap - self.mod_size) < chunk_size:
+                self.mod_size -= blobsize
+                self.file.seek(blobsize, 1)
+                return current_layer
+            item = self.item = lxo_file.add_item(name, reference_id, typename)
+            chunk_start = self.file.tell() - (size_snap - self.mod_size)
+            item.chunk_span = [chunk_start, chunk_start + chunk_size]
+
+            while (size_snap - self.mod_size) < chunk_size:
+                subchunk_id = self.read_id4()
+                self.chunk_path[2:] = [subchunk_id]
+                subchunk_size = self.read_u2()
+                subsize_snap = self.mod_size
+                if self.validate:
+                    self.check_size(subchunk_size,
+                                    chunk_size - (size_snap - self.mod_size))
+
+                # only read the tags specified
+                if (self.tags_to_read and
+                        chunk_id + subchunk_id not in self.tags_to_read):
+                    self.mod_size -= subchunk_size
+                    self.file.seek(subchunk_size, 1)
+                    continue
+
+                if subchunk_id == 'PAKG':
+                    package_name = self.read_s0()
+                    reserved = self.read_u4()
+                    item.packages.append(package_name)
+                elif subchunk_id == 'XREF':
+                    index_sub_scene = self.read_u4()
+                    filename = self.read_s0()
+                    item_id = self.read_s0()
+                elif subchunk_id == 'LAYR':
+                    index = self.read_u4()
+                    flags = self.read_u4()
+                    rgbs = self.read_u14()
+                    item.LAYR = (index, flags, rgbs)
+                elif subchunk_id == 'LINK':
+                    graphname = self.read_s0()
+                    item_index = self.read_i4()
+                    link_index = self.read_i4()
+                    # more links of a graph are kept in links only
+                    item.links.append((graphname, item_index, link_index))
+                    item.graph_links.setdefault(graphname, (item_index, link_index))
+                elif subchunk_id == 'CHNL':
+                    name = self.read_s0()
+                    datatype = self.read_u2()
+                    value = self.read_value(datatype)
+                    item.CHNL.append((name, datatype, value))
+                elif False and subchunk_id == 'GRAD':
+                    # TODO:
+                    blobsize = subchunk_size - (subsize_snap - self.mod_size)
+                    blob = self.readblob(blobsize)
+                    item.GRAD.append(blob)
+                elif False and subchunk_id == 'CLNK':
+                    # TODO:
+                    blobsize = subchunk_size - (subsize_snap - self.mod_size)
+                    blob = self.readblob(blobsize)
+                    item.CLNK.append(blob)
+                elif False and subchunk_id == 'UCHN':
+                    # TODO:
+                    blobsize = subchunk_size - (subsize_snap - self.mod_size)
+                    blob = self.readblob(blobsize)
+                    item.CLNK.append(blob)
+                elif subchunk_id == 'CHNS':
+                    name = self.read_s0()
+                    value = self.read_s0()
+                    item.channel[name] = value
+                elif subchunk_id == 'CHAN':
                     index = self.read_vx()
-                    vv = []
-                    for _ in range(dimension):
-                        vv.append(self.read_float())
-                    values[index] = vv
-                if map_type == 'TXUV':
-                    current_layer.uv_maps[name] = values
-                elif map_type == 'NORM':
-                    current_layer.vertex_normals[name] = values
-                if DEBUG:
-                    print(map_type, dimension, name, len(values))
-            elif chunk_id == 'VMAD':
-                map_type = self.read_id4()
-                dimension = self.read_u2()
-                name = self.read_s0()
-                values = {}
-                while (size_snap - self.mod_size) < chunk_size:
-                    vert_index = self.read_vx()
-                    poly_index = self.read_vx()
-                    vv = []
-                    for _ in range(dimension):
-                        vv.append(self.read_float())
-                    if poly_index in values:
-                        values[poly_index][vert_index] = vv
-                    else:
-                        values[poly_index] = {vert_index: vv}
-                if map_type == 'TXUV':
-                    current_layer.uv_maps_disco[name] = values
-                elif map_type == 'NORM':
-                    current_layer.vertex_normals_disco[name] = values
-                if DEBUG:
-                    print(map_type, dimension, name, len(values))
-            elif chunk_id == 'PTAG':
-                # MATR, PART, PICK, FONT, JUST, TEXT, SMGP
-                tag_type = self.read_id4()
-                ptags = []
-                while (size_snap - self.mod_size) < chunk_size:
-                    pols_index = self.read_vx()
-                    tags_index = self.read_u2()
-                    ptags.append((pols_index, tags_index))
-                current_layer.ptags[tag_type] = ptags
-                if DEBUG:
-                    print(tag_type, ptags)
-            elif chunk_id == 'ENVL':
-                index = self.read_vx()
-                envl_type = self.read_u4()
-                blobsize = chunk_size - (size_snap - self.mod_size)
-                subchunks = self.readblob(blobsize)  # TODO
-                if DEBUG:
-                    print(index, envl_type)
-            elif chunk_id == 'BBOX':
-                min_xyz = self.read_vec12()
-                max_xyz = self.read_vec12()
-                if DEBUG:
-                    print(min_xyz, max_xyz)
-            elif chunk_id == 'ITEM':
-                typename = self.read_s0()
-                name = self.read_s0()
-                reference_id = self.read_u4()
-                item = lxo_file.add_item(name, reference_id, typename)
-
-                if DEBUG:
-                    print(typename, name, reference_id)
-
-                while (size_snap - self.mod_size) < chunk_size:
-                    subchunk_id = self.read_id4()
-                    subchunk_size = self.read_u2()
-                    subsize_snap = self.mod_size
-
-                    # only read the tags specified
-                    if (self.tags_to_read and
-                            chunk_id + subchunk_id not in self.tags_to_read):
-                        self.mod_size -= subchunk_size
-                        self.file.seek(subchunk_size, 1)
-                        continue
-
-                    if DEBUG:
-                        print("", colored(subchunk_id, 'yellow'), end=" ")
-
-                    if subchunk_id == 'PAKG':
-                        package_name = self.read_s0()
-                        reserved = self.read_u4()
-                        item.packages.append(package_name)
-                        if DEBUG:
-                            print(package_name, reserved)
-                    elif subchunk_id == 'XREF':
-                        index_sub_scene = self.read_u4()
-                        filename = self.read_s0()
-                        item_id = self.read_s0()
-                        if DEBUG:
-                            print(index_sub_scene, filename, item_id)
-                    elif subchunk_id == 'LAYR':
-                        index = self.read_u4()
-                        flags = self.read_u4()
-                        rgbs = self.read_u14()
-                        item.LAYR = (index, flags, rgbs)
-                        if DEBUG:
-                            print(index, flags, rgbs)
-                    elif subchunk_id == 'LINK':
-                        graphname = self.read_s0()
-                        item_index = self.read_i4()
-                        link_index = self.read_i4()
-                        # TODO handle properly
-                        if graphname not in item.graph_links:
-                            item.graph_links[graphname] = (item_index, link_index)
-                        else:
-                            if DEBUG:
-                                print(colored("ERROR duplicate graph link",
-                                              'red'),)
-                                print(graphname, item_index, link_index)
-                        if DEBUG:
-                            print(graphname, item_index, link_index)
-                    elif subchunk_id == 'CHNL':
-                        name = self.read_s0()
-                        datatype = self.read_u2()
-                        value = self.read_value(datatype)
-                        item.CHNL.append((name, datatype, value))
-                        if DEBUG:
-                            print(name, datatype, value)
-                    elif False and subchunk_id == 'GRAD':
-                        # TODO:
-                        blobsize = subchunk_size - (subsize_snap - self.mod_size)
-                        blob = self.readblob(blobsize)
-                        item.GRAD.append(blob)
-                    elif False and subchunk_id == 'CLNK':
-                        # TODO:
-                        blobsize = subchunk_size - (subsize_snap - self.mod_size)
-                        blob = self.readblob(blobsize)
-                        item.CLNK.append(blob)
-                    elif False and subchunk_id == 'UCHN':
-                        # TODO:
-                        blobsize = subchunk_size - (subsize_snap - self.mod_size)
-                        blob = self.readblob(blobsize)
-                        item.CLNK.append(blob)
-                    elif subchunk_id == 'CHNS':
-                        name = self.read_s0()
-                        value = self.read_s0()
-                        item.channel[name] = value
-                        if DEBUG:
-                            print(name, value)
-                    elif subchunk_id == 'CHAN':
-                        index = self.read_vx()
-                        datatype = self.read_u2()
+                    datatype = self.read_u2()
+                    value = self.read_value(datatype)
+                    item.channel[lxo_file.channel_names[index]] = value
+                elif subchunk_id == 'CHNV':
+                    name = self.read_s0()
+                    datatype = self.read_u2()
+                    vectorcount = self.read_u2()
+                    vec = []
+                    for i in range(vectorcount):
+                        cname = self.read_s0()
                         value = self.read_value(datatype)
-                        item.channel[lxo_file.channel_names[index]] = value
-                        if DEBUG:
-                            print(lxo_file.channel_names[index], datatype, value)
-                    elif subchunk_id == 'CHNV':
-                        name = self.read_s0()
-                        datatype = self.read_u2()
-                        vectorcount = self.read_u2()
-                        vec = []
-                        for i in range(vectorcount):
-                            cname = self.read_s0()
-                            value = self.read_value(datatype)
-                            vec.append((cname, value))
-                        item.CHNV[name] = vec  # datatype?
-                        if DEBUG:
-                            print(name, vec)
-                    elif subchunk_id == 'ITAG':
-                        itag_type = self.read_id4()
-                        value = self.read_s0()
-                        item.item_tags.append((itag_type, value))
-                        if DEBUG:
-                            print(itag_type, value)
-                    elif subchunk_id == 'VNAM':
-                        name = self.read_s0()
-                        item.vname = name
-                        if DEBUG:
-                            print(name)
-                    elif subchunk_id == 'UNIQ':
-                        identifier = self.read_s0()
-                        if DEBUG:
-                            print(identifier)
-                    elif subchunk_id == 'UIDX':
-                        index = self.read_u4()
-                        if DEBUG:
-                            print(index)
-                    elif subchunk_id == 'CHNC':
-                        size = self.read_u2()
-                        data = ""
-                        for i in range(size):
-                            data += self.read_u1()
-                        item.CHNC.append(data)
-                        if size % 2:
-                            # if uneven length read one more byte
-                            self.read_u1()
-                        if DEBUG:
-                            print(data)
-                    elif subchunk_id == 'BCHN':
-                        operation_type = self.read_s0()
-                        data = self.read_u4()
-                        if DEBUG:
-                            print(operation_type, data)
-                    else:
-                        blobsize = subchunk_size - (subsize_snap - self.mod_size)
-                        blob = self.readblob(blobsize)
-                        if DEBUG:
-                            print(colored("BLOB", "red"), blob)
-            elif chunk_id == 'ACTN':  # action layers: edit, scene, setup
-                self.__read_actn(lxo_file, size_snap, chunk_size)
-            else:
-                self.mod_size -= chunk_size
-                self.file.seek(chunk_size, 1)  # skipping chunk
-                if DEBUG:
-                    print(colored("BLOB skipped", "red"))
+                        vec.append((cname, value))
+                    item.CHNV[name] = vec  # datatype?
+                elif subchunk_id == 'ITAG':
+                    itag_type = self.read_id4()
+                    value = self.read_s0()
+                    item.item_tags.append((itag_type, value))
+                elif subchunk_id == 'VNAM':
+                    name = self.read_s0()
+                    item.vname = name
+                elif subchunk_id == 'UNIQ':
+                    identifier = self.read_s0()
+                elif subchunk_id == 'UIDX':
+                    index = self.read_u4()
+                elif subchunk_id == 'CHNC':
+                    size = self.read_u2()
+                    data = self.readblob(size)
+                    item.CHNC.append(data)
+                    if size % 2:
+                        # if uneven length read one more byte
+                        self.read_u1()
+                elif subchunk_id == 'BCHN':
+                    operation_type = self.read_s0()
+                    data = self.read_u4()
+                else:
+                    blobsize = subchunk_size - (subsize_snap - self.mod_size)
+                    blob = self.readblob(blobsize)
+                if self.validate:
+                    self.skip_rest(subchunk_size - (subsize_snap - self.mod_size))
+        elif chunk_id == 'ACTN':  # action layers: edit, scene, setup
+            self.__read_actn(lxo_file, size_snap, chunk_size)
+        else:
+            self.mod_size -= chunk_size
+            self.file.seek(chunk_size, 1)  # skipping chunk
+        return current_layer
 
     def __read_actn(self, lxo_file: LXOFile, size_snnap, chunk_size):
         actionlayername = self.read_s0()
@@ -675,28 +2003,26 @@ class LXOReader(object):
                                              actionlayerindex)
         current_action_item = None
 
-        if DEBUG:
-            print(actionlayername, actionlayertype, actionlayerindex)
-
         while (size_snnap - self.mod_size) < chunk_size:
             subchunk_id = self.read_id4()
+            self.chunk_path[2:] = [subchunk_id]
             subchunk_size = self.read_u2()
             subsize_snap = self.mod_size
+            if self.validate:
+                self.check_size(subchunk_size,
+                                chunk_size - (size_snnap - self.mod_size))
 
             if (self.tags_to_read and
-                    chunk_id + subchunk_id not in self.tags_to_read):
+                    'ACTN' + subchunk_id not in self.tags_to_read):
                 self.mod_size -= subchunk_size
                 self.file.seek(subchunk_size, 1)
                 continue
 
-            if DEBUG:
-                print("", colored(subchunk_id, 'yellow'), end=" ")
-
             if subchunk_id == 'ITEM':
                 item_reference_id = self.read_u4()
                 current_action_item = action_layer.add_item(item_reference_id)
-                if DEBUG:
-                    print(item_reference_id)
+            elif current_action_item is None and subchunk_id in ('CHAN', 'GRAD', 'CHNS'):
+                raise LXOParseError("%s before the first ITEM" % subchunk_id)
             elif subchunk_id == 'CHAN':
                 index = self.read_vx()
                 datatype = self.read_u2()
@@ -705,48 +2031,390 @@ class LXOReader(object):
                 data = (lxo_file.channel_names[index], datatype, index_envl,
                         value)
                 current_action_item.CHAN.append(data)
-                if DEBUG:
-                    print(lxo_file.channel_names[index], datatype,
-                          index_envl, value)
             elif subchunk_id == 'GRAD':
                 # TODO:
                 blobsize = subchunk_size - (subsize_snap - self.mod_size)
                 blob = self.readblob(blobsize)
                 current_action_item.GRAD.append(blob)
-                if DEBUG:
-                    print(blob)
             elif subchunk_id == 'CHNS':
                 name = self.read_s0()
                 index = self.read_vx()
                 value = self.read_s0()
                 data = (name, lxo_file.channel_names[index], value)
                 current_action_item.string_channels.append(data)
-                if DEBUG:
-                    print(lxo_file.channel_names[index], value, name)
             else:
                 # TODO figure out what PRNT subchunk is for
                 blobsize = subchunk_size - (subsize_snap - self.mod_size)
                 blob = self.readblob(blobsize)
-                if DEBUG:
-                    print(colored("BLOB", "red"), blob)
+            if self.validate:
+                self.skip_rest(subchunk_size - (subsize_snap - self.mod_size))
+
+
+class LXOReader(object):
+    """Reads LXO files.
+
+    The reader only holds options and caches, the parse state of every
+    call lives in its own ChunkReader, so one reader can be shared between
+    threads. tags_to_read limits the chunks read, empty reads all.
+    validate and recover apply to all calls. tracer receives the parse
+    events, debug prints them (None follows the module DEBUG). Keep a reader
+    around (as the add-on does) to reuse its string pool and the item
+    indices of unchanged files.
+    """
+
+    def __init__(self, tags_to_read=(), validate: bool = False,
+                 recover: bool = False, debug: bool = None,
+                 tracer: Tracer = None):
+        self.tags_to_read = set(tags_to_read)
+        self.validate = validate
+        self.recover = recover
+        self.debug = debug
+        self.tracer = tracer
+        self.strings = {}  # S0 strings of all reads, see ChunkReader.read_s0
+        self.item_indices = {}  # (path, mtime, size, validate, recover) -> items
+        # the item index cache is shared by the threads of read_many
+        self.item_indices_lock = threading.Lock()
+
+    def chunk_reader(self, load_geometry: bool = True, validate: bool = False,
+                     recover: bool = False, tags_to_read=None) -> ChunkReader:
+        """Fresh parse state for one call with the options of this reader."""
+        if tags_to_read is None:
+            tags_to_read = self.tags_to_read
+        if len(self.strings) > STRING_POOL_SIZE:
+            self.strings.clear()
+        tracer = self.tracer
+        if tracer is None and (DEBUG if self.debug is None else self.debug):
+            tracer = PrintTracer()
+        return ChunkReader(frozenset(tags_to_read), load_geometry,
+                           validate or self.validate, recover or self.recover,
+                           tracer, self.strings)
+
+    def traced(self, tracer: Tracer) -> 'LXOReader':
+        """Reader with the options and caches of this one, reporting to tracer."""
+        reader = copy.copy(self)
+        reader.tracer = tracer
+        return reader
+
+    def read_from_file(self, filepath, load_lights: bool = True, load_meshes: bool = True, load_materials: bool = True, load_cameras: bool = True,
+                       load_geometry: bool = True, bbox_samples: int = 4096,
+                       validate: bool = False, recover: bool = False) -> LXOFile:
+        """Read a LXO file.
+
+        With load_geometry False only the layer bounding boxes are read, the
+        geometry can be read later with read_layer_geometry. Layers without
+        BBOX chunk get a box from bbox_samples points, None uses all points.
+
+        Malformed data raises LXOParseError. With validate every chunk and
+        subchunk size is checked against its parent and the end of the file,
+        with recover (implies validate) broken chunks are skipped and
+        collected in parse_errors of the returned file.
+        """
+        if not filepath or not os.path.isfile(filepath):
+            raise Exception('not a file')
+        chunk_reader = self.chunk_reader(load_geometry, validate, recover)
+        return chunk_reader.read_file(filepath, bbox_samples)
+
+    def read_item_index(self, filepath, validate: bool = False,
+                        recover: bool = False) -> list[LXOItem]:
+        """All items with only names, graph links and LAYR read.
+
+        Everything else, including all geometry, is skipped. The index is
+        cached until the file changes.
+        """
+        stat = os.stat(filepath)
+        key = (os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size,
+               validate or self.validate, recover or self.recover)
+        with self.item_indices_lock:
+            items = self.item_indices.get(key)
+        if items is None:
+            chunk_reader = self.chunk_reader(False, validate, recover)
+            items = chunk_reader.read_item_index(filepath)
+            with self.item_indices_lock:
+                while len(self.item_indices) >= ITEM_INDEX_CACHE_SIZE:
+                    self.item_indices.pop(next(iter(self.item_indices)), None)
+                self.item_indices[key] = items
+        return list(items)
+
+    def probe(self, filepath, bbox_samples: int = 256,
+              validate: bool = True) -> LXOFile:
+        """Read only the metadata of a file, for catalogs and browsers.
+
+        Items come with names, types, links and string channels (e.g. the
+        ptag of masks), layers with bounding box and point and polygon
+        counts taken from the chunk sizes. No geometry or animation is
+        decoded. The counts come from the chunk sizes, so they are
+        validated by default.
+        """
+        chunk_reader = self.chunk_reader(load_geometry=False, validate=validate,
+                                         tags_to_read=PROBE_CHUNKS)
+        return chunk_reader.read_file(filepath, bbox_samples)
+
+    def read_filtered(self, filepath, item_filter: ItemFilter,
+                      load_geometry: bool = True, bbox_samples: int = 4096,
+                      validate: bool = False, recover: bool = False) -> LXOFile:
+        """Read only the items matched by item_filter and their layers.
+
+        Ancestors of matched locators are read for their transforms but
+        end up in skipped_items.
+        """
+        needed, skipped = item_filter.resolve(
+            self.read_item_index(filepath, validate, recover))
+        chunk_reader = self.chunk_reader(load_geometry, validate, recover)
+        chunk_reader.item_filter = needed
+        chunk_reader.layer_filter = needed - skipped
+        lxo_file = chunk_reader.read_file(filepath, bbox_samples)
+        lxo_file.skipped_items |= skipped
+        return lxo_file
+
+    def read_region(self, filepath, region, load_geometry: bool = True,
+                    item_filter: ItemFilter = None) -> LXOFile:
+        """Read a file, but only the geometry of layers inside the region.
+
+        region is a BoxRegion or PlanesRegion in world space. Layers outside
+        of it are not decoded and their items end up in skipped_items.
+        """
+        if item_filter:
+            lxo_file = self.read_filtered(filepath, item_filter,
+                                          load_geometry=False, bbox_samples=None)
+        else:
+            lxo_file = self.read_from_file(filepath, load_geometry=False,
+                                           bbox_samples=None)
+        inside = LayerBVH(lxo_file.layer_bounds()).query(region)
+        for layer in lxo_file.layers:
+            if layer.reference_id not in inside:
+                lxo_file.skipped_items.add(layer.reference_id)
+            elif load_geometry:
+                self.read_layer_geometry(filepath, layer)
+        return lxo_file
+
+    def read_layer_geometry(self, filepath, lxo_layer: LXOLayer):
+        """Read the geometry of a layer from a file read without geometry."""
+        chunk_reader = self.chunk_reader(tags_to_read=GEOMETRY_CHUNKS)
+        return chunk_reader.read_layer_geometry(filepath, lxo_layer)
+
+    def iter_layer_geometry(self, filepath, layers, memory_budget=None):
+        """Read the geometry of layers read without it, one after another.
+
+        Each layer is yielded with its geometry and released when the next
+        one is requested. With a memory_budget (bytes) a thread reads ahead
+        as long as the estimated decoded size of the waiting layers fits,
+        without one the next layer is read only when it is requested.
+        """
+        if memory_budget is None:
+            for layer in layers:
+                yield self.read_layer_geometry(filepath, layer)
+                layer.release_geometry()
+            return
+
+        def decoded_size(layer):
+            start, end = layer.geometry_span
+            return (end - start) * DECODED_SIZE_FACTOR
+
+        ready = queue.Queue()
+        budget = threading.Condition()
+        stop = threading.Event()
+        in_flight = [0]
+
+        def read_ahead():
+            try:
+                for layer in layers:
+                    size = decoded_size(layer)
+                    with budget:
+                        while (in_flight[0] and in_flight[0] + size > memory_budget
+                               and not stop.is_set()):
+                            budget.wait(0.1)
+                        in_flight[0] += size
+                    if stop.is_set():
+                        return
+                    ready.put(self.read_layer_geometry(filepath, layer))
+            except Exception as error:
+                ready.put(error)
+            ready.put(None)
+
+        thread = threading.Thread(target=read_ahead, daemon=True)
+        thread.start()
+        try:
+            while True:
+                layer = ready.get()
+                if layer is None:
+                    break
+                if isinstance(layer, Exception):
+                    raise layer
+                yield layer
+                layer.release_geometry()
+                with budget:
+                    in_flight[0] -= decoded_size(layer)
+                    budget.notify()
+        finally:
+            stop.set()
+            thread.join()
+
+    def content_hashes(self, lxo_file: LXOFile, item_ids=None,
+                       layer_ids=None) -> tuple[dict[int, str], dict[int, str]]:
+        """Digests of the raw chunk bytes of the items and layers of a file.
+
+        Items by id over their ITEM chunk, layers by reference id over their
+        geometry chunks. Nothing is decoded, equal digests in two versions
+        of a file mean the item or layer did not change. item_ids and
+        layer_ids limit what is hashed, None hashes all of them.
+        """
+        def digest(srcfile, start, end):
+            srcfile.seek(start)
+            hasher = hashlib.blake2b(digest_size=16)
+            while start < end:
+                block = srcfile.read(min(end - start, 1 << 20))
+                if not block:
+                    break
+                hasher.update(block)
+                start += len(block)
+            return hasher.hexdigest()
+
+        with open(lxo_file.filepath, 'rb') as srcfile:
+            if item_ids is not None:
+                item_ids = set(item_ids)
+            if layer_ids is not None:
+                layer_ids = set(layer_ids)
+            items = {item.id: digest(srcfile, *item.chunk_span)
+                     for item in lxo_file.items if item.chunk_span is not None and
+                     (item_ids is None or item.id in item_ids)}
+            layers = {layer.reference_id: digest(srcfile, *layer.geometry_span)
+                      for layer in lxo_file.layers
+                      if layer.geometry_span is not None and
+                      (layer_ids is None or layer.reference_id in layer_ids)}
+        return items, layers
+
+    def read_many(self, filepaths, workers: int = None, processes: bool = False,
+                  load_geometry: bool = True, item_filter: ItemFilter = None,
+                  validate: bool = False, recover: bool = False):
+        """Read several files at once, yield (filepath, lxo or exception).
+
+        Results are yielded as they finish. Threads overlap the file I/O,
+        the decoding holds the GIL though, processes decode in parallel at
+        the cost of pickling the results. Threads share this reader, the
+        processes get only its options and read with a fresh reader each,
+        so the tracer and the caches of this one are not used there.
+        workers None uses the pool default. Files not started yet are
+        dropped when the caller stops iterating.
+        """
+        import concurrent.futures
+
+        if processes:
+            task = functools.partial(read_file, load_geometry=load_geometry,
+                                     item_filter=item_filter,
+                                     validate=validate or self.validate,
+                                     recover=recover or self.recover,
+                                     tags_to_read=tuple(self.tags_to_read))
+            pool = concurrent.futures.ProcessPoolExecutor(workers)
+        else:
+            task = functools.partial(read_file, load_geometry=load_geometry,
+                                     item_filter=item_filter, validate=validate,
+                                     recover=recover, reader=self)
+            pool = concurrent.futures.ThreadPoolExecutor(workers)
+        try:
+            futures = {pool.submit(task, filepath): filepath
+                       for filepath in filepaths}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    lxo = future.result()
+                except Exception as error:
+                    lxo = error
+                yield futures[future], lxo
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+
+def read_file(filepath, load_geometry: bool = True,
+              item_filter: ItemFilter = None, validate: bool = False,
+              recover: bool = False, reader: LXOReader = None,
+              tags_to_read=()) -> LXOFile:
+    """Read one file, used as pool task.
+
+    Without reader a fresh one reading tags_to_read is used.
+    """
+    if reader is None:
+        reader = LXOReader(tags_to_read)
+    if item_filter:
+        return reader.read_filtered(filepath, item_filter,
+                                    load_geometry=load_geometry,
+                                    validate=validate, recover=recover)
+    return reader.read_from_file(filepath, load_geometry=load_geometry,
+                                 validate=validate, recover=recover)
+
+
+def column_array(values):
+    # NumPy array of a column_tables column, strings as unicode arrays and
+    # the 'b' columns as booleans
+    import numpy as np
+
+    if isinstance(values, list):
+        return np.array(values, dtype=str)
+    column = np.frombuffer(values, values.typecode)
+    return column.astype(bool) if values.typecode == 'b' else column
+
+
+def write_npz(tables: dict[str, dict], filepath) -> list[str]:
+    """Write column_tables into one uncompressed .npz, see export_columns."""
+    import numpy as np
+
+    np.savez(filepath, **{f"{table}.{column}": column_array(values)
+                          for table, columns in tables.items()
+                          for column, values in columns.items()})
+    return [str(filepath)]
+
+
+def write_arrow(tables: dict[str, dict], directory) -> list[str]:
+    """Write column_tables as <table>.arrow IPC files, see export_columns."""
+    import pyarrow as pa
+
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for table, columns in tables.items():
+        arrow_table = pa.table({column: pa.array(values, pa.string())
+                                if isinstance(values, list)
+                                else pa.array(column_array(values))
+                                for column, values in columns.items()})
+        path = os.path.join(directory, table + '.arrow')
+        with pa.ipc.new_file(path, arrow_table.schema) as writer:
+            writer.write_table(arrow_table)
+        paths.append(path)
+    return paths
 
 
 if __name__ == '__main__':
+    import argparse
+
     desc = 'Read (specific) stuff from LXO.'
     parser = argparse.ArgumentParser(description=desc)
     parser.add_argument("--source-file", dest="source_file", help="source FILE", metavar="FILE")
     parser.add_argument("-d", "--debug", action="store_true")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="write a Chrome trace JSON of the read to FILE")
     parser.add_argument("-p", "--pretty-print", dest="pretty_print", action="store_true")
+    parser.add_argument("--columns", metavar="PATH",
+                        help="export the item, channel, layer and geometry tables "
+                             "to PATH, a .npz file or a directory of Arrow files")
+    parser.add_argument("--validate", action="store_true",
+                        help="bounds check all chunks, fail on the first broken one")
+    parser.add_argument("--recover", action="store_true",
+                        help="bounds check all chunks, skip broken ones")
 
     args = parser.parse_args()
     if args.debug:
         print('enabled DEBUG print')
         DEBUG = True
 
-    lxoRead = LXOReader()
+    tracer = ChromeTracer() if args.trace else None
+    lxoRead = LXOReader(tracer=tracer)
     # lxoRead.tagsToRead = []
 
-    lxo = lxoRead.read_from_file(args.source_file)
+    lxo = lxoRead.read_from_file(args.source_file, validate=args.validate,
+                                 recover=args.recover)
+    for error in lxo.parse_errors:
+        print(colored(str(error), 'red'))
+    if tracer is not None:
+        print('wrote trace', tracer.write(args.trace))
+    if args.columns:
+        print('wrote columns', *lxo.export_columns(args.columns, geometry=True))
 
     if args.pretty_print:
         print('### pprint ###')
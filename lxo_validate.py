@@ -0,0 +1,266 @@
+#!/usr/bin/python
+
+# MIT License
+
+# Copyright (c) 2020 Bernd Moeller
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Validation and repair of decoded layers before Blender builds them.
+#
+# Point indices out of range crash from_pydata, repeated points in a
+# polygon and polygons with less than three points end up in slow
+# mesh.validate fixups, vertex map entries of missing points or polygons
+# fail in the map import. repair_layer fixes all of them with NumPy, the
+# polygons are only touched by vectorized operations. needs_repair tells
+# cheaply if a layer needs it at all. NumPy is imported by the functions,
+# it is not loaded before the first layer is repaired.
+
+import gc
+from array import array
+from itertools import chain
+
+
+class RepairReport(object):
+    """What repair_layer changed, all counts 0 for a valid layer."""
+
+    def __init__(self):
+        self.bad_index_faces = 0  # dropped, a point index out of range
+        self.repeated_points = 0  # corners removed, point already in the polygon
+        self.degenerate_faces = 0  # dropped, less than three points left
+        self.dropped_map_entries = 0  # vertex map values of missing points or polygons
+        self.dropped_curves = 0  # a point index out of range or less than two points
+
+    def __bool__(self):
+        return any(vars(self).values())
+
+    def summary(self) -> str:
+        return ", ".join(f"{name.replace('_', ' ')} {count}"
+                         for name, count in vars(self).items() if count)
+
+
+def needs_repair(lxo_layer) -> bool:
+    """Quick test of a layer for the problems repair_layer fixes.
+
+    Only checks the polygon sizes and the index ranges of the polygons,
+    vertex maps and curves, without NumPy. Repeated points in a polygon and
+    VMAD entries of points not in their polygon are not looked for.
+    """
+    point_count = len(lxo_layer.points)
+    poly_count = len(lxo_layer.polygons)
+    # VX indices are unsigned, only the upper bound needs a check
+    if lxo_layer.polygons and (
+            min(map(len, lxo_layer.polygons)) < 3 or
+            max(chain.from_iterable(lxo_layer.polygons)) >= point_count):
+        return True
+    for vmaps in (lxo_layer.uv_maps, lxo_layer.vertex_normals):
+        if any(values and max(values) >= point_count for values in vmaps.values()):
+            return True
+    for vmads in (lxo_layer.uv_maps_disco, lxo_layer.vertex_normals_disco):
+        if any(values and max(values) >= poly_count for values in vmads.values()):
+            return True
+    for vmaps in lxo_layer.vmaps.values():
+        if any(vmap.indices and max(vmap.indices) >= point_count
+               for vmap in vmaps.values()):
+            return True
+    for vmads in lxo_layer.vmads.values():
+        if any(vmad.indices and (max(vmad.indices) >= point_count or
+                                 max(vmad.poly_indices) >= poly_count)
+               for vmad in vmads.values()):
+            return True
+    for curves in lxo_layer.curves.values():
+        offsets = curves.offsets
+        if (curves.indices and max(curves.indices) >= point_count or
+                any(end - start < 2 for start, end in zip(offsets, offsets[1:]))):
+            return True
+    return False
+
+
+def repair_layer(lxo_layer) -> RepairReport:
+    """Drop or fix invalid polygons and map entries of a layer, in place.
+
+    Polygons with a point index out of range are dropped, repeated points
+    of a polygon are removed (the first one stays) and polygons left with
+    less than three points dropped. Polygon tags and all vertex maps follow
+    the remaining polygons. Map entries of missing points or polygons are
+    dropped, as are VMAD entries of points not in their polygon (UV and
+    normal VMADs are only checked for the polygon). Curves with a point
+    index out of range or less than two points are dropped.
+    """
+    import numpy as np
+
+    report = RepairReport()
+    point_count = len(lxo_layer.points)
+    poly_count = len(lxo_layer.polygons)
+    counts = np.fromiter(map(len, lxo_layer.polygons), np.int64, poly_count)
+    corners = np.fromiter(chain.from_iterable(lxo_layer.polygons), np.int64,
+                          int(counts.sum()))
+    faces = np.repeat(np.arange(poly_count), counts)  # polygon of each corner
+
+    bad_corners = (corners < 0) | (corners >= point_count)
+    bad_faces = np.zeros(poly_count, bool)
+    bad_faces[faces[bad_corners]] = True
+    report.bad_index_faces = int(bad_faces.sum())
+
+    # equal (polygon, point) keys end up next to each other, the stable sort
+    # keeps the first corner of a point in front
+    keys = faces * max(point_count, 1) + np.clip(corners, 0, max(point_count - 1, 0))
+    order = np.argsort(keys, kind='stable')
+    repeated = np.zeros(len(corners), bool)
+    repeated[order[1:]] = keys[order[1:]] == keys[order[:-1]]
+    repeated &= ~bad_faces[faces]
+    report.repeated_points = int(repeated.sum())
+
+    left = np.bincount(faces[~repeated], minlength=poly_count)
+    degenerate = (left < 3) & ~bad_faces
+    report.degenerate_faces = int(degenerate.sum())
+    keep_faces = ~(bad_faces | degenerate)
+
+    poly_map = np.arange(poly_count)  # old to new polygon index, -1 dropped
+    if report.bad_index_faces or report.repeated_points or report.degenerate_faces:
+        keep_corners = ~repeated & keep_faces[faces]
+        corners = corners[keep_corners]
+        faces = faces[keep_corners]
+        counts = left[keep_faces]
+        ends = np.cumsum(counts)
+        flat = corners.tolist()
+        # the garbage collector would scan again and again while the new
+        # lists pile up, slicing runs without it
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            lxo_layer.polygons = list(map(flat.__getitem__,
+                                          map(slice, (ends - counts).tolist(),
+                                              ends.tolist())))
+        finally:
+            if gc_enabled:
+                gc.enable()
+        lxo_layer.poly_count = len(lxo_layer.polygons)
+        poly_map = np.full(poly_count, -1)
+        poly_map[keep_faces] = np.arange(int(keep_faces.sum()))
+        faces = poly_map[faces]
+        for tag_type, tags in lxo_layer.ptags.items():
+            lxo_layer.ptags[tag_type] = keep_rows(tags, keep_faces[:len(tags)])
+        if len(lxo_layer.material_index) == poly_count:
+            lxo_layer.material_index = keep_rows(lxo_layer.material_index, keep_faces)
+
+    for vmaps in (lxo_layer.uv_maps, lxo_layer.vertex_normals):
+        for values in vmaps.values():
+            report.dropped_map_entries += drop_keys(values, point_count)
+    for vmads in (lxo_layer.uv_maps_disco, lxo_layer.vertex_normals_disco):
+        for name, values in vmads.items():
+            vmads[name], dropped = remap_keys(values, poly_map)
+            report.dropped_map_entries += dropped
+    # (polygon, point) keys of all corners, for the VMAD entries
+    corner_keys = faces * max(point_count, 1) + corners
+    for vmaps in lxo_layer.vmaps.values():
+        for vmap in vmaps.values():
+            indices = np.frombuffer(vmap.indices, np.int32)
+            report.dropped_map_entries += filter_map(
+                vmap, (indices >= 0) & (indices < point_count))
+    for vmads in lxo_layer.vmads.values():
+        for vmad in vmads.values():
+            indices = np.frombuffer(vmad.indices, np.int32)
+            polys = np.frombuffer(vmad.poly_indices, np.int32)
+            new_polys = remap(poly_map, polys)
+            valid = (indices >= 0) & (indices < point_count) & (new_polys >= 0)
+            valid &= np.isin(new_polys * max(point_count, 1) + indices, corner_keys)
+            vmad.poly_indices = array('i', new_polys.astype(np.int32).tobytes())
+            report.dropped_map_entries += filter_map(vmad, valid)
+    for curves in lxo_layer.curves.values():
+        report.dropped_curves += filter_curves(curves, point_count)
+    return report
+
+
+def keep_rows(values: array, keep) -> array:
+    # per polygon array with the rows of the kept polygons
+    import numpy as np
+
+    kept = np.frombuffer(values, np.int32)[:len(keep)][keep]
+    return array('i', kept.astype(np.int32).tobytes())
+
+
+def remap(poly_map, indices):
+    # new polygon indices, -1 for dropped polygons and indices out of range
+    import numpy as np
+
+    valid = (indices >= 0) & (indices < len(poly_map))
+    new_indices = np.full(len(indices), -1)
+    new_indices[valid] = poly_map[indices[valid]]
+    return new_indices
+
+
+def drop_keys(values: dict, point_count: int) -> int:
+    # {point: values} map, removes the points out of range
+    import numpy as np
+
+    keys = np.fromiter(values.keys(), np.int64, len(values))
+    bad = keys[(keys < 0) | (keys >= point_count)].tolist()
+    for key in bad:
+        del values[key]
+    return len(bad)
+
+
+def remap_keys(values: dict, poly_map) -> tuple[dict, int]:
+    # {polygon: {point: values}} map with the polygons renumbered
+    import numpy as np
+
+    keys = np.fromiter(values.keys(), np.int64, len(values))
+    new_keys = remap(poly_map, keys)
+    valid = new_keys >= 0
+    if valid.all() and (new_keys == keys).all():
+        return values, 0
+    kept = dict(zip(new_keys[valid].tolist(),
+                    map(values.__getitem__, keys[valid].tolist())))
+    return kept, len(values) - len(kept)
+
+
+def filter_map(vmap, valid) -> int:
+    # VertexMap with only the entries where valid is set
+    import numpy as np
+
+    dropped = len(valid) - int(valid.sum())
+    if not dropped:
+        return 0
+    vmap.indices = array('i', np.frombuffer(vmap.indices, np.int32)[valid].tobytes())
+    values = np.frombuffer(vmap.values, np.float32).reshape(-1, vmap.dimension)
+    vmap.values = array('f', values[valid].tobytes())
+    if vmap.poly_indices is not None:
+        vmap.poly_indices = array(
+            'i', np.frombuffer(vmap.poly_indices, np.int32)[valid].tobytes())
+    return dropped
+
+
+def filter_curves(curves, point_count: int) -> int:
+    # CurveSet without the curves that can't be built
+    import numpy as np
+
+    counts = np.diff(np.frombuffer(curves.offsets, np.int32))
+    indices = np.frombuffer(curves.indices, np.int32)
+    curve_of = np.repeat(np.arange(len(counts)), counts)
+    keep = counts >= 2
+    keep[curve_of[(indices < 0) | (indices >= point_count)]] = False
+    dropped = len(counts) - int(keep.sum())
+    if not dropped:
+        return 0
+    offsets = np.concatenate(([0], np.cumsum(counts[keep])))
+    curves.offsets = array('i', offsets.astype(np.int32).tobytes())
+    curves.indices = array('i', indices[keep[curve_of]].tobytes())
+    curves.flags = array('H', np.frombuffer(curves.flags, np.uint16)[keep].tobytes())
+    return dropped